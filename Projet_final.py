@@ -1,559 +1,358 @@
-import pandas as pd
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import warnings
 import numpy as np
-from bokeh.io import output_notebook
-from bokeh.plotting import figure, show, ColumnDataSource, output_file
-from bokeh.models import Dropdown, CustomJS, BasicTicker, PrintfTickFormatter, TabPanel, Tabs, Div, Select, HoverTool, FactorRange, Switch
-from bokeh.layouts import row, column
-from datetime import datetime
-from bokeh.palettes import Category20c, Reds8
-from bokeh.transform import cumsum, linear_cmap
-from math import pi
-from shapely.geometry import Point, Polygon
+import re
+from agregats import USAGERS, agreger, agreger_par_blocs, index_annees
+from carte import MAX_POINTS_BRUTS, coor_wgs84_to_web_mercator, coor_wgs84_to_web_mercator_float32, points_couche, pyramide_grille
+from chargement import FICHIER_ACCIDENTS, FILTRES, TAILLE_BLOC, charger_accidents, pic_memoire_mo
+from entrepot import agreger_entrepot
+from instrumentation import Instrumentation
+from pipeline import Etape, Pipeline
+from points_chauds import NB_POINTS_CHAUDS, detecter_points_chauds
+from tables import FORMATS, exporter_tables, tables_agregats
+from validation import ajouter_options_validation, options_validation
 
-##### Importation des données #####
-accident = pd.read_csv("accidents_corporels.csv", sep = ";", decimal = ".")
-# accident.head()
-
-# Séparer la date en annee et mois : 
-accident[['annee', 'mois']] = accident['date'].str.split('-', expand=True)[[0, 1]]
-
-# Séparer la colonne heure en heure et minute
-accident[["heure", "minute"]] = accident.heure.str.split(":", expand = True)
-
-
-# Ordonner par année croissante :
-accident = accident.sort_values(by = 'date')
-
-# Modification des classes d'accident : 
-def map_classes(classe_specifique):
-    if classe_specifique in ['VL', 'Véhicule de tourisme (VT)', 'Voiturette']:
-        return 'Voiture'
-    elif classe_specifique in ['cyclomoteur', 'Scooter <= 50 cm3', 'motocyclette > 125 cm3', 'motocyclette >50<=125 cm3', 'Scooter  > 50 <= 125 cm3', 'Scooter > 125 cm3', 'Moto ou sidecar > 125 cm3', 'Moto ou sidecar  > 50 <= 125 cm3', 'Cyclomoteur <=50 cm3', '3 RM > 125 cm3', '3 RM  > 50 <= 125 cm3']:
-        return 'Deux-roues motorisé'
-    elif classe_specifique in ['Autobus', 'Autocar']:
-        return 'Transport en commun'
-    elif classe_specifique in ['VU seul 1,5T < PTAC <=3,5T', 'PL seul PTAC > 7,5T', 'PL + remorque(s)', 'PL seul 3,5 < PTAC <=7,5t', 'Tracteur routier + semi-remorque', 'tracteur routier seul', 'PL > 3,5T + remorque']:
-        return 'Poids lourd'
-    elif classe_specifique in ['Bicyclette', 'Vélo par assistance électrique']:
-        return 'Vélo'
-    elif classe_specifique in ['Tracteur agricole', 'Autre engin de déplacement personnel (EDP) sans moteur', 'Indéterminable', 'Autre véhicule']:
-        return 'Autre'
-    elif classe_specifique in ['quad léger <=50 cm3', 'Nouvel engin de déplacement personnel (EDP) à moteur', 'voiturette / quad à moteur carrossé', 'quad lourd > 50 cm3']:
-        return 'Engin personnel motorisé'
-    elif classe_specifique == 'Engin spécial':
-        return 'Engin spécial'
-    else:
-        return 'Non spécifié'
-
-# Appliquer la fonction de mapping pour créer une nouvelle colonne 'classe_generale'
-for i in range(1, 7):
-    col_name = f'classe_vehicule{i}'
-    veh_col_name = f'vehicule{i}'
-    accident[col_name] = accident[veh_col_name].apply(map_classes)
-
-
-
-# Nom des colonnes à sélectionner
-colonnes_selectionnees = accident.filter(regex=r'^classe_vehicule', axis=1).columns.tolist()
-type_vehicule = ['Deux-roues motorisé', 'Non spécifié', 'Voiture', 'Vélo', 'Poids lourd', 'Transport en commun', 'Engin personnel motorisé', 'Autre', 'Engin spécial']
-# Calculer le nombre total d'accidents par type de vehicule
-d_accidents = dict()
-for col in colonnes_selectionnees:
-    for vehicule in accident[col]:
-        d_accidents[vehicule] = d_accidents.get(vehicule, 0) + 1
-
-# On supprime les non specifies du dictionnaire car trop nombreux et mauvaise visualisation des resultats par la suite
-d_accidents.pop('Non spécifié')
-
-# Convertir le dictionnaire en un DataFrame
-data = pd.Series(d_accidents).reset_index(name='nb_accident').rename(columns={'index': 'type_vehicule'})
-
-
-#############################################################################################################################################
-################################################################# PIE CHART #################################################################
-#############################################################################################################################################
-
-#####################
-##### PIE CHART #####
-#####################
-
-# Calculer les angles et les couleurs
-data['angle'] = data['nb_accident'] / data['nb_accident'].sum() * 2 * pi
-data['color'] = Reds8
-
-# Créer un graphique en secteurs (pie chart)
-p_pie = figure(title = "Accidents en fonction du véhicule", 
-               x_range=(-0.5, 1.0),
-               height = 500, 
-               toolbar_location = None,
-               tools = "hover", 
-               tooltips = "@type_vehicule: @nb_accident")
-
-# Dessiner les secteurs
-p_pie.wedge(x = 0, y = 1, radius = 0.4,
-        start_angle = cumsum('angle', include_zero=True), end_angle = cumsum('angle'),
-        line_color = "white", fill_color = 'color', legend_field = 'type_vehicule', source = data)
-
-# Paramètres du graphique
-p_pie.axis.axis_label = None
-p_pie.axis.visible = False
-p_pie.grid.grid_line_color = None
-
-####################
-##### BARPLOT #####
-###################
-
-# Créer un graphique en barplot
-p_barre = figure(title = "Accidents en fonction du véhicule", 
-            x_range = data['type_vehicule'], y_axis_label = 'Nombre d\'accidents', 
-            height = 500,
-            toolbar_location = None, 
-            tools = "")
-
-# Ajouter les barres
-p_barre.vbar(x = 'type_vehicule', top = 'nb_accident', width = 0.9, color = '#922B21', source=data)
-
-#Création de l'outil
-outilsurvol = HoverTool(tooltips = [('Véhicule','@type_vehicule'), ( 'Nombre', '@nb_accident' )])
-p_barre.add_tools(outilsurvol)
-
-# Paramètres du graphique
-p_barre.xgrid.grid_line_color = None
-p_barre.y_range.start = 0
-p_barre.y_range.end = 10000
-
-# Modifier l'orientation des noms sur l'axe des x
-p_barre.xaxis.major_label_orientation = 45  # Angle de 45 degrés
-
-################################################
-##### Pouvoir choisir le type de graphique #####
-################################################
-
-# Masquer le barplot par défaut
-p_barre.visible = False
-
-# Créer un Select pour choisir entre pie chart et barplot
-select = Select(title="Choisir le type de graphique", options=["Pie Chart", "Barplot"], value="Pie Chart")
-
-# Callback JavaScript pour changer le type de graphique en fonction de la sélection
-callback = CustomJS(args=dict(p_pie=p_pie, p_barre=p_barre), code="""
-    if (cb_obj.value === "Pie Chart") {
-        p_pie.visible = true;
-        p_barre.visible = false;
-    } else {
-        p_pie.visible = false;
-        p_barre.visible = true;
-    }
-""")
-
-# Associer la fonction JavaScript à la sélection du Select
-select.js_on_change('value', callback)
-
-# Afficher les graphiques et le Select dans une mise en page
-pie_barre = column(select, p_pie, p_barre)
-
-#### Commentaire
-
-## Commentaire graphique croisières ---
-text_p_barre = Div(text="""<h1> Analyse </h1> 
-        <p> Les voitures sont le type de véhicule le plus impliqué dans les accidents à Rennes, avec une partition de 60% des accuidents globaux.
-            Elles sont ensuite suivies des deux-roues motorisés et des vélos qui sont impliqués dans 20% des accidents.
-            Les autres types de véhicules sont beaucoup moins impliqués dans les accidents.<br><br>
-           
-            En revanche, le graphique ne montre pas la gravité des accidents ni les facteurs qui y contribuent.
-            Il est possible que les accidents impliquant des deux-roues motorisés soient plus graves que les accidents impliquant des voitures.
-            Ou que les véhicules soient plus susceptibles d'être impliqués dans des accidents en raison de facteurs tels
-            que la vitesse, la distraction au volant ou l'état des routes.
-        </p>""", styles={'text-align':'justify','color':'black','background-color':'lavender','padding':'15px','border-radius':'10px', 'max-width':'500px'})
-
-
-
-##########################################################################################################################################
-################################################################ HEAT MAP ################################################################
-##########################################################################################################################################
-# Regroupez les données par 'jsem' et 'heure' et comptez le nombre d'accidents
-heatmap_data = accident.groupby(['jsem', 'heure']).size().reset_index(name='nb')
-
-# Convertir en ColumnDataSource
-heatmap_data_cvs = ColumnDataSource(heatmap_data)
-
-# Définir l'ordre des jours de la semaine selon votre préférence
-ordre_jours_semaine = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
-
-# Utiliser FactorRange pour spécifier l'ordre des jours de la semaine sur l'axe Y
-x_range = FactorRange(factors=ordre_jours_semaine)
-
-# Créer une palette de couleurs
-colors = ["#75968f", "#a5bab7", "#c9d9d3", "#e2e2e2", "#dfccce", "#ddb7b1", "#cc7878", "#933b41", "#550b1d"]
-
-# Liste des outils
-TOOLS = "hover,save,pan,box_zoom,reset,wheel_zoom"
-
-# Créer un graphique de type heatmap
-heat_map = figure(title="Accident de la route par jour de la semaine et heure",
-        x_range = x_range, 
-        y_range = list(reversed(np.unique(heatmap_data.heure))),
-        x_axis_location="above", width=600, height=600,
-        tools=TOOLS, toolbar_location='below',
-        tooltips=[('Heure/Jour', '@heure @jsem'), ('Nombre', '@nb')])
-
-# Supprimer les axes
-heat_map.grid.grid_line_color = None
-heat_map.axis.axis_line_color = None
-heat_map.axis.major_tick_line_color = None
-heat_map.axis.major_label_text_font_size = "7px"
-heat_map.axis.major_label_standoff = 0
-heat_map.xaxis.major_label_orientation = 0
-
-# Réalisation de la heatmap avec les axes inversés
-r = heat_map.rect(x="jsem", y="heure", width=1, height=1, source=heatmap_data_cvs,
-        fill_color=linear_cmap("nb", colors, low=heatmap_data.nb.min(), high=heatmap_data.nb.max()),
-        line_color=None)
-
-# Ajouter une légende
-heat_map.add_layout(r.construct_color_bar(
-    major_label_text_font_size="7px",
-    ticker=BasicTicker(desired_num_ticks=len(colors)),
-    formatter=PrintfTickFormatter(format="%d"),
-    label_standoff=6,
-    border_line_color=None,
-    padding=5,), 'right')
- 
-
-#### Commentaire
-text_t_map = Div(text=""" <h1> Analyse du heat map </h1> 
-        <p> Le heat map présenté met en lumière une tendance claire concernant les accidents de la route : les journées les plus accidentogènes sont les vendredis,
-                  avec un pic notable à 8h du matin. Cette observation s'accompagne d'une corrélation avec les heures de pointe, indiquant une concentration des
-                  accidents durant les trajets domicile-travail. En revanche, les week-ends sont globalement moins marqués par les accidents, avec une absence totale
-                  d'incidents sur certains créneaux horaires du dimanche. <br><br>
-                 
-                 Ces informations précieuses pourraient servir à cibler des campagnes de sensibilisation et des mesures préventives en vue de réduire le nombre d'accidents,
-                  en particulier durant les heures et les jours identifiés comme les plus à risque.
-
-Ces informations précieuses pourraient servir à cibler des campagnes de sensibilisation et des mesures préventives en vue de réduire le nombre d'accidents, en particulier durant les heures et les jours identifiés comme les plus à risque.
-        </p>""",styles={'text-align':'justify','color':'black','background-color':'lavender','padding':'15px','border-radius':'10px', 'max-width':'600px'})
-
-
-
-########################################################################################################################
-############################################### CARTE ##################################################################
-########################################################################################################################
-
-# Converts decimal longitude/latitude to Web Mercator format
-def coor_wgs84_to_web_mercator(lon, lat):
-    k = 6378137
-    x = lon * (k * np.pi/180.0)
-    y = np.log(np.tan((90 + lat) * np.pi/360.0)) * k
-    return (x,y)
+# Région par défaut : nom affiché dans les titres et centre (latitude, longitude) des cartes
+REGION = "Rennes"
+CENTRE = (48.1119800, -1.6742900)
 
-x_rennes,y_rennes = coor_wgs84_to_web_mercator(-1.6742900,48.1119800)
-
-
-# Séparer la colonne Geo Point en longitude et latitude
-accident[["latitude", "longitude"]] = accident["Geo Point"].str.split(",", expand = True)
-
-# Supprimer les espaces éventuels dans les colonnes de latitude et de longitude
-accident["latitude"] = accident["latitude"].str.strip()
-accident["longitude"] = accident["longitude"].str.strip()
-
-# Créer un df pour les vélo
-data_accident_velo = accident[accident.velo == "Oui"]
-
-# Créer un df pour les piétons
-data_accident_pieton = accident[accident.pieton == "Oui"]
-
-################################
-##### Carte pour les vélos #####
-################################
-
-# Appliquer la fonction de conversion à toutes les coordonnées de latitude et de longitude
-data_accident_velo['x'], data_accident_velo['y'] = coor_wgs84_to_web_mercator(data_accident_velo['longitude'].astype(float), data_accident_velo['latitude'].astype(float))
-
-# Créer une source de données pour les points d'accident
-source_velo = ColumnDataSource(data=dict(
-    x = data_accident_velo['x'],
-    y = data_accident_velo['y'],
-    annee = data_accident_velo['annee'],
-))
-
-# Création de la figure avec axes géographiques
-p_carte_velo = figure(title = "Cartographie des accidents de vélo à Rennes", 
-           x_axis_type = "mercator",
-           y_axis_type = "mercator",
-           x_range=(x_rennes - 10000, x_rennes + 10000),
-           y_range=(y_rennes - 10000, y_rennes + 10000),
-           active_scroll = "wheel_zoom")
-
-#Ajout d'un arrière plan de carte
-p_carte_velo.add_tile("CartoDB Positron")
-
-# Ajouter les points d'accident à la carte
-p_carte_velo.circle(x='x', y='y', size=5, color='#922B21', alpha=1, source=source_velo)
-
-p_carte_velo.visible = True
-
-##################################
-##### Carte pour les piétons #####
-##################################
-
-# Appliquer la fonction de conversion à toutes les coordonnées de latitude et de longitude
-data_accident_pieton['x'], data_accident_pieton['y'] = coor_wgs84_to_web_mercator(data_accident_pieton['longitude'].astype(float), data_accident_pieton['latitude'].astype(float))
-
-# Créer une source de données pour les points d'accident
-source_pieton = ColumnDataSource(data=dict(
-    x = data_accident_pieton['x'],
-    y = data_accident_pieton['y'],
-    annee = data_accident_pieton['annee'],
-))
-
-# Création de la figure avec axes géographiques
-p_carte_pieton = figure(title = "Cartographie des accidents de piéton à Rennes", 
-           x_axis_type = "mercator",
-           y_axis_type = "mercator",
-           x_range=(x_rennes - 10000, x_rennes + 10000),
-           y_range=(y_rennes - 10000, y_rennes + 10000),
-           active_scroll = "wheel_zoom")
-
-#Ajout d'un arrière plan de carte
-p_carte_pieton.add_tile("CartoDB Positron")
-
-# Ajouter les points d'accident à la carte
-p_carte_pieton.circle(x='x', y='y', size=5, color='#922B21', alpha=1, source=source_pieton)
-
-p_carte_pieton.visible = False
-
-#############################################
-##### Pouvoir switch entre les 2 cartes #####
-#############################################
-
-# Texte d'information
-info_text = Div(text="<b>Pouvoir switch entre les cartes des vélos et des piétons</b>")
-
-# Création du widget Switch
-switch = Switch(active=True)
-
-# Définition de la fonction de rappel JavaScript pour basculer entre les cartes
-callback = CustomJS(args=dict(p_carte_velo=p_carte_velo, p_carte_pieton=p_carte_pieton), code="""
-    if (this.active) {
-        p_carte_velo.visible = true;
-        p_carte_pieton.visible = false;
-    } else {
-        p_carte_velo.visible = false;
-        p_carte_pieton.visible = true;
-    }
-""")
-switch.js_on_change("active", callback)
-
-##### Menu pour choisir l'année #####
-
-# Labels pour les années
-LABELS = ["Total", "2012", "2013", "2014", "2015", "2016", "2017", "2018", "2019", "2020", "2021", "2022"]
-
-# Création du menu déroulant pour choisir l'année
-annee_menu = Dropdown(label="Choix de l'année", menu=[(str(year), str(year)) for year in LABELS])
-
-# Définition de la fonction de rappel JavaScript pour sélectionner l'année
-callback_annee = CustomJS(args=dict(source_velo=source_velo, source_pieton=source_pieton, p_carte_velo=p_carte_velo, p_carte_pieton=p_carte_pieton, annee_menu=annee_menu), code="""
-    const selected_year = cb_obj.item;
-    const data_velo = source_velo.data;
-    const data_pieton = source_pieton.data;
-                          
-    // Filtrer les données pour l'année sélectionnée
-    const indices_velo = [];
-    const indices_pieton = [];
-    
-    // Vérifier si "Total" est sélectionné
-    if (selected_year === "Total") {
-        for (let i = 0; i < data_velo['annee'].length; i++) {
-            indices_velo.push(i);
-        }
-        
-        for (let i = 0; i < data_pieton['annee'].length; i++) {
-            indices_pieton.push(i);
-        }
-    } else {
-        for (let i = 0; i < data_velo['annee'].length; i++) {
-            if (data_velo['annee'][i] === selected_year) {
-                indices_velo.push(i);
-            }
-        }
-        
-        for (let i = 0; i < data_pieton['annee'].length; i++) {
-            if (data_pieton['annee'][i] === selected_year) {
-                indices_pieton.push(i);
-            }
-        }
-    }
-
-    // Mettre à jour les sources de données pour les points d'accident
-    source_velo.selected.indices = indices_velo;
-    source_pieton.selected.indices = indices_pieton;
-    
-    // Mettre à jour les sources de données
-    source_velo.change.emit();
-    source_pieton.change.emit();
-
-    // Mettre à jour le titre de la carte
-    if (selected_year === "Total") {
-        p_carte_velo.title.text = "Cartographie des accidents de vélo à Rennes (Total)";
-        p_carte_pieton.title.text = "Cartographie des accidents de piéton à Rennes (Total)";
-    } else {
-        p_carte_velo.title.text = "Cartographie des accidents de vélo à Rennes en " + selected_year;
-        p_carte_pieton.title.text = "Cartographie des accidents de piéton à Rennes en " + selected_year;
-    }
-""")
-
-
-
-# Liaison du callback JavaScript à l'événement de sélection d'année dans le menu déroulant
-annee_menu.js_on_event('menu_item_click', callback_annee)
-
-# Affichage de la mise en page
-cartes = column(row(switch, info_text), row(p_carte_velo, p_carte_pieton, annee_menu))
-
-
-#### Commentaire
-text_carte = Div(text=""" <h1> Analyse cartographique </h1> 
-        <p> L'analyse de la carte des accidents de la route à Rennes, complétée par une étude des données statistiques, permet d'identifier plusieurs facteurs contribuant
-                  à la concentration d'accidents dans certaines zones :
-            <br>
-                 <ul>
-                 <li> Sur la rocade
-                    <ul>
-                        <li> Vitesse excessive : La vitesse élevée combinée à un sentiment de sécurité trompeur incite au dépassement des limitations et augmente les risques d'accidents graves.</li>
-                        <li> Fatigue au volant : La monotonie des trajets et la longueur des parcours favorisent la fatigue, diminuant les réflexes et la vigilance.</li>
-                        <li> Trafic dense : Le trafic congestionné génère du stress et incite aux comportements à risque (queues de poisson, dépassements dangereux).</li>
-                    </ul>
-                </li>
-                <li> En centre-ville
-                    <ul>
-                        <li> Mixité des usages : La cohabitation de piétons, cyclistes, voitures et transports en commun crée des interactions complexes et des points de conflit potentiels.</li>
-                        <li> Réseau routier complexe : La présence d'un réseau ancien, peu lisible, avec de nombreuses intersections et une signalisation parfois confuse, augmente les risques d'accidents.</li>
-                        <li> Manque de visibilité : Des éléments urbains (bâtiments, végétation) peuvent limiter la visibilité des piétons et cyclistes, augmentant les risques d'accidents.</li>
-                
-        </p>""",styles={'text-align':'justify','color':'black','background-color':'lavender','padding':'15px','border-radius':'10px', 'max-width':'750px'})
-
-
-
-#################################################################################################################################################
-################################################################### EVOLUTION ###################################################################
-#################################################################################################################################################
-# Ajout d'une colonne 'id' :
-accident["id"] = range(len(accident))
 
-# Passer en ColumnDataSource :
-accident_cds = ColumnDataSource(accident)
+def fichier_html(region):
+    """Nom du fichier HTML généré pour une région."""
+    nom = re.sub(r'[^\w-]+', '_', region)
+    return f"Projet_Visualisation_Accidents_{nom}.html"
 
-# Agréger les données par année et compter le nombre d'occurrences de chaque colonne pour chaque année
-accidents_par_annee = accident.groupby('annee').agg({'id': 'count', 'ntu': 'sum', 'nbh': 'sum', 'nbnh': 'sum'}).reset_index()
 
-# Utiliser cette nouvelle DataFrame comme source de données pour y
-donnees_ligne = ColumnDataSource({'x': accidents_par_annee['annee'],
-                                  'y': accidents_par_annee['id'],
-                                  'Tué': accidents_par_annee['ntu'],
-                                  'Blessés hospitalisés': accidents_par_annee['nbh'],
-                                  'Blessés': accidents_par_annee['nbnh'], 
-                                  'Nombre d\'accidents': accidents_par_annee['id']})
+# Modules dont le code entre dans la clé de cache des agrégats
+MODULES_AGREGATS = ['agregats', 'cube', 'series', 'vehicules', 'chargement', 'validation']
 
-# Evolution du nombre d'accident dans Rennes (menu pour sélectionner nbtu, nbh, nbnh)
-p_ligne = figure(title="Evolution des accidents à Rennes au cours du temps", x_axis_label = 'Année', y_axis_label = 'Nombre')
-ligne_accidents = p_ligne.line(x = 'x', y = 'y', source=donnees_ligne, line_color = '#922B21', line_width = 3)
+# Bornes de validation des lignes du CSV (--annees-valides, --emprise) : paramètres des étapes qui le lisent
+VALIDATION = ('annees_valides', 'emprise')
 
-# Ajouter un survol pour afficher les valeurs
-outilsurvol = HoverTool(tooltips = [( 'Année', '@x'), ( 'Nombre', '@y' )])
-p_ligne.add_tools(outilsurvol)
+# Dossier des tables du mode sans graphiques (--export-agregats sans dossier)
+DOSSIER_EXPORT = "agregats_export"
 
-# Ajouter un menu déroulant pour choisir l'ordonnée
-menu = Dropdown(label = "Choix des ordonnées", menu = [('Nombre d\'accidents', 'Nombre d\'accidents'),
-                                                       ('Tué', 'Tué'),
-                                                       ('Blessés hospitalisés', 'Blessés hospitalisés'),
-                                                       ('Blessés', 'Blessés')])
-
-callback = CustomJS(args = dict(p = p_ligne, source = donnees_ligne), code = """
-    const data = source.data;
-    const val = cb_obj.item;
-    const y = data['y'];
-    const ynew = data[val];
-    const graph_title = val + " à Rennes au cours du temps";
-    for (let i = 0; i < y.length; i++) {
-        y[i] = ynew[i];
-    }
-    source.change.emit();
-    p.title.text = graph_title;
-""")
-
-menu.js_on_event('menu_item_click', callback)
-
-evolution = row(p_ligne, menu)
-
-#### Commentaire
-text_evolution = Div(text=""" <h1> Analyse de l'évolution </h1> 
-        <p> Analyse des graphiques d'accidents à Rennes
+##### Importation des données #####
 
-        Les quatre graphiques présentés illustrent l'évolution des accidents de la route à Rennes sur une période de 10 ans (2014-2023).
-        <br>
-        <ul>
-            <li> <b> Nombre d'accidents </b> : on peut voir sur ce graphique qu'il y a un pique du nombre d'accidents en 2016 à plus de 600 accidents. Par la suite le nombre d'accidents diminue pour atteindre un minimum en 2020 à un peu plus de 400 accidents. </li>
-                     
-            <li> <b> Tués </b> : ce graphique met en évidence un pique en 2016 avec 16 personnes mortes du à des accidents routiers cette année, ce pique est pourtant précédé du plus petit nombre de mort, 2 tués, en 2015.</li>
+def etape_donnees(fichier, annees, departements, usagers, annees_valides, emprise):
+    """Lecture typée des seules colonnes utiles (date, heure et Geo Point déjà découpés, trié par date), validées
+    avec les bornes `annees_valides` et `emprise`, depuis l'instantané Parquet si le CSV n'a pas changé depuis le
+    dernier lancement. Pour un jeu partitionné (dossier), les filtres d'années, de départements et d'usagers sont
+    appliqués à la lecture des fichiers."""
+    return charger_accidents(fichier, annees_valides = annees_valides, emprise = emprise, annees = annees, departements = departements, usagers = usagers)
 
-            <li> <b> Blessés hospitalisés </b> : Le nombre d'accidents à Rennes est en baisse sur 10 ans, diminuant de 25%. On observe cependant des variations d'une année à l'autre. La baisse la plus forte a eu lieu entre 2020 et 2022. Tandis que le plus haut pique a été enregistré en 2017, avec 152 personnes bléssées</li>
-                     
-            <li> <b> Blessés </b> : ce graphique indique le nombre de blessés au court du temps. On constate que après 2016 où le pique de blessés a été de 630, une diminution se laisse entrevoir. Pour atteindre son plus bas en 2020, et par la suite remonter subitement.</li>
-        </ul>
-                     
-        <br>
-        <b> Conclusion</b>
-                     
-        <br>
-        L'analyse de ces graphiques permet de dresser un constat global de la situation des accidents de la route à Rennes. 
-        Si la tendance générale est à la baisse du à la pandémie de COVID-19, des points d'attention subsistent, notamment les accidents corporels graves et mortels.
-        Des actions ciblées de prévention et d'aménagement pourraient être mises en œuvre pour réduire encore le nombre d'accidents et améliorer la sécurité routière à Rennes.
 
+def etape_accidents(donnees, filtre):
+    """Accidents de la région : lignes retenues par l'expression pandas `filtre` (toutes sans filtre). Une région
+    sans accident n'a pas de graphique à construire : elle est refusée ici plutôt que par la première figure."""
+    accidents = donnees.query(filtre).reset_index(drop = True) if filtre else donnees
+    if accidents.empty:
+        raise ValueError("Aucun accident à afficher" + (f" : le filtre {filtre!r} ne retient aucune ligne" if filtre else ""))
+    return accidents
 
-        </p>""",styles={'text-align':'justify','color':'black','background-color':'lavender','padding':'15px','border-radius':'10px', 'max-width':'700px'})
 
+def etape_agregats(accidents):
+    """Agrégats des graphiques : nombre d'accidents par type de véhicule (une seule recherche dans la table des
+    classes pour les six colonnes vehicule1..vehicule6), heatmap, années, points des cartes."""
+    return agreger(accidents)
 
 
-#############################################################################################################################################
-################################################################# INTERFACE #################################################################
-#############################################################################################################################################
+def etape_agregats_flux(fichier, taille_bloc, annees, departements, usagers, annees_valides, emprise):
+    """Mode flux : le fichier n'est jamais chargé en entier, chaque bloc (validé, filtré) est cumulé dans les agrégats."""
+    return agreger_par_blocs(fichier, taille_bloc, annees_valides = annees_valides, emprise = emprise,
+                             annees = annees, departements = departements, usagers = usagers)
 
-tab1 = TabPanel(child=row(text_p_barre, column(pie_barre)), title="Nombre d'accidents en fonction du type de véhicule")
-tab2 = TabPanel(child=row(text_t_map, column(heat_map)), title="Accident de la route par jour et heure de la semaine")
-tab3 = TabPanel(child=row(cartes, column(text_carte)), title="Cartographie des accidents")
-tab4 = TabPanel(child=row(evolution, column(text_evolution)), title="Evolution des accidents")
-tabs_graphique = Tabs(tabs = [tab1, tab4, tab2, tab3])
 
+def etape_agregats_entrepot(entrepot):
+    """Agrégats déjà calculés année par année : seules les partitions sont relues et fusionnées."""
+    return agreger_entrepot(entrepot)
 
+########################################################################################################################
+############################################### CARTE ##################################################################
+########################################################################################################################
 
+def etape_points_cartes(agregats):
+    """Points des cartes en Web Mercator : la projection est calculée une seule fois pour tous les points, et chaque
+    carte (vélo, piéton) y désigne les siens par un tableau d'indices, avec la tranche [début, fin) de chaque année."""
+    donnees = agregats['points']
+
+    # Coordonnées projetées directement en float32, la précision des sources embarquées
+    x, y = coor_wgs84_to_web_mercator_float32(donnees['longitude'].to_numpy(), donnees['latitude'].to_numpy())
+    annee = donnees['annee'].to_numpy()
+
+    # Les points sont triés par date : chaque année est une tranche contiguë des indices de la carte
+    couches = {}
+    for usager in USAGERS:
+        indices = np.flatnonzero(donnees[usager].to_numpy()).astype(np.int32)
+        couches[usager] = dict(indices=indices, offsets=index_annees(annee[indices]))
+    return dict(x=x, y=y, annee=annee, couches=couches)
+
+
+def etape_cellules(points_cartes):
+    """Grilles multi-résolution (au total et par année) des points de chaque carte. Une carte d'au plus MAX_POINTS_BRUTS
+    points n'est pas agrégée (None) : ses points bruts sont plus légers que ses grilles."""
+    return {usager: pyramide_grille(*points_couche(points_cartes, usager)) if len(couche['indices']) > MAX_POINTS_BRUTS else None
+            for usager, couche in points_cartes['couches'].items()}
+
+
+def etape_points_chauds(agregats, points_cartes):
+    """Points chauds de chaque carte (toutes années confondues), les NB_POINTS_CHAUDS premiers."""
+    points_chauds = {}
+    for usager, couche in points_cartes['couches'].items():
+        gravites = {colonne: agregats['points'][colonne].to_numpy()[couche['indices']] for colonne in ('ntu', 'nbh', 'nbnh')}
+        points_chauds[usager] = detecter_points_chauds(*points_couche(points_cartes, usager), gravites).head(NB_POINTS_CHAUDS)
+    return points_chauds
+
+##########################################################################
+##### Carte des accidents par quartier (--quartiers FICHIER.geojson) #####
+##########################################################################
+
+def etape_quartiers(accidents, quartiers):
+    """Contours des quartiers en Web Mercator (un contour par partie des multipolygones) et nombre d'accidents de chacun."""
+    # shapely n'est importé que si la carte par quartier est demandée
+    from quartiers import affecter_quartiers_cache, charger_quartiers, compter_par_quartier
+
+    # Quartier de chaque accident : jointure spatiale indexée (STRtree), mise en cache par fichier de polygones
+    noms_quartiers, polygones = charger_quartiers(quartiers)
+    quartier = affecter_quartiers_cache(accidents['longitude'], accidents['latitude'], quartiers)
+    nb_par_quartier = compter_par_quartier(quartier, len(polygones))
+
+    contours = dict(xs=[], ys=[], nom=[], nb=[])
+    for nom, polygone, nb in zip(noms_quartiers, polygones, nb_par_quartier):
+        for partie in getattr(polygone, 'geoms', [polygone]):
+            lon, lat = np.asarray(partie.exterior.coords).T
+            x, y = coor_wgs84_to_web_mercator(lon, lat)
+            contours['xs'].append(x.astype(np.float32))
+            contours['ys'].append(y.astype(np.float32))
+            contours['nom'].append(nom)
+            contours['nb'].append(int(nb))
+    return contours
+
+###################################################################################
+##### Score de risque des tronçons (--reseau FICHIER.geojson, voir risque.py) #####
+###################################################################################
+
+def etape_risque(accidents, reseau, demi_vie):
+    """Tronçons du réseau classés par score de risque (accidents rattachés au plus proche tronçon, pondérés par gravité
+    et ancienneté), et tracés Web Mercator des NB_TRONCONS premiers (une ligne par partie des multilignes)."""
+    # shapely n'est importé que si le score de risque est demandé
+    import shapely
+    from risque import NB_TRONCONS, risque_troncons
+
+    troncons, geometries = risque_troncons(accidents, reseau, demi_vie)
+    premiers = troncons.head(NB_TRONCONS)
+    parties, partie_troncon = shapely.get_parts(geometries[premiers['troncon'].to_numpy()], return_index = True)
+    sommets, partie = shapely.get_coordinates(parties, return_index = True)
+    coupures = np.flatnonzero(np.diff(partie)) + 1
+    traces = dict(xs=[x.astype(np.float32) for x in np.split(sommets[:, 0], coupures)],
+                  ys=[y.astype(np.float32) for y in np.split(sommets[:, 1], coupures)],
+                  **{colonne: premiers[colonne].to_numpy()[partie_troncon] for colonne in ('rang', 'nom', 'score')})
+    return {'troncons': troncons, 'traces': traces}
+
+
+############################################
+##### Export des agrégats sans graphiques #####
+############################################
+
+def etape_export_agregats(agregats, points_chauds, export_agregats, format, risque = None):
+    """Mode sans graphiques : tables des agrégats (voir tables.py) écrites dans le dossier export_agregats,
+    avec le classement des tronçons si un réseau est donné (--reseau)."""
+    return exporter_tables(tables_agregats(agregats, points_chauds, risque), export_agregats, format)
+
+
+def _figures(nom):
+    """Étape construite par la fonction `nom` de figures.py, importé (avec Bokeh) à son premier appel seulement :
+    un lancement qui ne construit aucun graphique n'importe pas la pile graphique."""
+    def etape(**arguments):
+        import figures
+        return getattr(figures, nom)(**arguments)
+    etape.__name__ = nom
+    return etape
 
 
 #################################################################################################################################################
-################################################################### AFFICHAGE ###################################################################
+#################################################################### PIPELINE ###################################################################
 #################################################################################################################################################
-text_presentation = Div(text=""" <h1> Analyse des accidents dans la ville de Rennes </h1>  
-
-        <div style="display:flex; align-items:center;">
-            <p> 
-            Notre projet s'est concentré sur l'analyse des données d'accidents routiers survenus à Rennes entre 2012 et 2022. 
-            Nous avons examiné l'évolution des incidents impliquant des blessés, des décès, etc., ainsi que leur répartition géographique à l'aide
-            d'une carte des lieux d'accidents. De plus, nous avons étudié la répartition des accidents selon les types de véhicules impliqués, ainsi
-            que les horaires et les jours où les accidents sont les plus fréquents. 
-            Ces analyses fournissent un aperçu pour informer les politiques de sécurité routière et les efforts de prévention des
-            accidents dans la région de Rennes.</p>
-            
-            <img src="Projet/accident.jpeg" alt="photo_accident" style="width:400px; height:auto; margin-left:20px;">
-        </div>
-        """,styles={'text-align':'justify','color':'black','background-color':'lavender','padding':'0px','border-radius':'10px', 'max-width':'1500px'})
-
-
-
-
-
-output_file("Projet_Visualisation_Accidents_Rennes.html")
-show(column(row(text_presentation),row(tabs_graphique)))
-
-
-
 
+def etapes(options):
+    """Étapes du tableau de bord et leurs dépendances, selon les options de la ligne de commande."""
+    if options['entrepot']:
+        agregats = Etape('agregats', etape_agregats_entrepot, parametres=['entrepot'], fichiers=['entrepot'], modules=MODULES_AGREGATS + ['entrepot'])
+    elif options['flux']:
+        agregats = Etape('agregats', etape_agregats_flux, parametres=['fichier', 'taille_bloc', *FILTRES, *VALIDATION], fichiers=['fichier'], modules=MODULES_AGREGATS + ['partitions'])
+    else:
+        agregats = Etape('agregats', etape_agregats, entrees=['accidents'], modules=MODULES_AGREGATS)
+
+    # La carte par quartier a besoin de toutes les coordonnées, que seul le chargement complet fournit
+    onglets = ['onglet_vehicules', 'onglet_evolution', 'onglet_heatmap', 'onglet_cartes']
+    if options['quartiers'] and (options['flux'] or options['entrepot']):
+        warnings.warn("La carte par quartier a besoin de toutes les coordonnées : elle n'est pas disponible avec --flux ou --entrepot")
+    elif options['quartiers']:
+        onglets.append('onglet_quartiers')
+    # Le score de risque rattache chaque accident à un tronçon : lui aussi demande le chargement complet
+    risque = []
+    if options['reseau'] and (options['flux'] or options['entrepot']):
+        warnings.warn("Le score de risque des tronçons a besoin de tous les accidents : il n'est pas disponible avec --flux ou --entrepot")
+    elif options['reseau']:
+        onglets.append('onglet_risque')
+        risque = ['risque']
+
+    return [
+        # Données (mises en cache)
+        Etape('donnees', etape_donnees, parametres=['fichier', *FILTRES, *VALIDATION], fichiers=['fichier'], modules=['chargement', 'validation', 'partitions'], cache=False),
+        Etape('accidents', etape_accidents, entrees=['donnees'], parametres=['filtre'], cache=False),
+        agregats,
+        Etape('points_cartes', etape_points_cartes, entrees=['agregats'], modules=['agregats', 'carte']),
+        Etape('cellules', etape_cellules, entrees=['points_cartes'], modules=['carte']),
+        Etape('points_chauds', etape_points_chauds, entrees=['agregats', 'points_cartes'], modules=['points_chauds', 'carte']),
+        Etape('contours_quartiers', etape_quartiers, entrees=['accidents'], parametres=['quartiers'], fichiers=['quartiers'], modules=['quartiers', 'carte']),
+        Etape('risque', etape_risque, entrees=['accidents'], parametres=['reseau', 'demi_vie'], fichiers=['reseau'], modules=['risque', 'carte']),
+        # Tables des agrégats, sans graphiques
+        Etape('export_agregats', etape_export_agregats, entrees=['agregats', 'points_chauds'] + risque, parametres=['export_agregats', 'format'], cache=False),
+        # Figures (recalculées à chaque lancement)
+        Etape('onglet_vehicules', _figures('figure_vehicules'), entrees=['agregats'], cache=False),
+        Etape('onglet_heatmap', _figures('figure_heatmap'), entrees=['agregats'], cache=False),
+        Etape('onglet_cartes', _figures('figure_cartes'), entrees=['points_cartes', 'points_chauds'] + (['cellules'] if options['agregation_carte'] else []), parametres=['region', 'centre'], cache=False),
+        Etape('onglet_quartiers', _figures('figure_quartiers'), entrees=['contours_quartiers'], parametres=['region', 'centre'], cache=False),
+        Etape('onglet_risque', _figures('figure_risque'), entrees=['risque'], parametres=['region', 'centre'], cache=False),
+        Etape('onglet_evolution', _figures('figure_evolution'), entrees=['agregats'], parametres=['region'], cache=False),
+        Etape('tableau_de_bord', _figures('etape_tableau_de_bord'), entrees=onglets, cache=False),
+        Etape('sortie', _figures('etape_sortie'), entrees=['tableau_de_bord'], parametres=['region', 'sortie', 'onglets_differes', 'rapport_taille', 'afficher'], cache=False),
+    ]
+
+
+def analyseur(description = "Tableau de bord des accidents de la route"):
+    """Options de la ligne de commande communes au tableau de bord et au mode régions."""
+    parser = argparse.ArgumentParser(description = description)
+    parser.add_argument('--fichier', default = FICHIER_ACCIDENTS, help = "fichier CSV des accidents, ou dossier d'un jeu partitionné (voir partitions.py)")
+    parser.add_argument('--annees', type = int, nargs = 2, metavar = ('DEBUT', 'FIN'), help = "garder les accidents de ces années (bornes comprises)")
+    parser.add_argument('--departements', nargs = '+', metavar = 'DEPARTEMENT', help = "garder les accidents de ces départements (jeu partitionné par département)")
+    parser.add_argument('--usagers', nargs = '+', choices = USAGERS, help = "garder les accidents impliquant au moins un de ces usagers")
+    ajouter_options_validation(parser)
+    parser.add_argument('--region', default = REGION, help = "nom de la région affiché dans les titres")
+    parser.add_argument('--centre', type = float, nargs = 2, default = CENTRE, metavar = ('LATITUDE', 'LONGITUDE'), help = "centre des cartes")
+    parser.add_argument('--filtre', help = "expression pandas de sélection des accidents de la région, par exemple \"latitude > 48.0\"")
+    parser.add_argument('--sortie', help = "fichier HTML généré (par défaut d'après le nom de la région)")
+    parser.add_argument('--etapes', nargs = '+', metavar = 'ETAPE',
+                        help = "étapes à exécuter, avec celles dont elles dépendent et qui ne sont pas en cache (par défaut : sortie, ou export_agregats)")
+    parser.add_argument('--sans-cache', action = 'store_true', help = "recalculer toutes les étapes sans lire ni écrire le cache")
+    parser.add_argument('--flux', action = 'store_true', help = "lire le CSV par blocs et cumuler les agrégats (fichiers plus gros que la mémoire)")
+    parser.add_argument('--taille-bloc', type = int, default = TAILLE_BLOC, help = "nombre de lignes par bloc en mode flux")
+    parser.add_argument('--entrepot', help = "dossier de l'entrepôt d'agrégats par année (voir entrepot.py) à utiliser au lieu du CSV")
+    parser.add_argument('--agregation-carte', action = 'store_true', help = "cartes agrégées en grilles multi-résolution au lieu d'un point par accident")
+    parser.add_argument('--quartiers', help = "fichier GeoJSON des quartiers pour la carte du nombre d'accidents par quartier")
+    parser.add_argument('--reseau', help = "fichier GeoJSON des tronçons (LineString) et carrefours (Point) pour l'onglet du score de risque")
+    parser.add_argument('--demi-vie', type = float, default = 3.0, help = "demi-vie (années) du poids des accidents dans le score de risque")
+    parser.add_argument('--rapport-taille', action = 'store_true', help = "afficher la taille de chaque source de données dans le fichier HTML généré")
+    parser.add_argument('--onglets-differes', action = 'store_true', help = "écrire les données des onglets non actifs à côté du HTML et ne les charger qu'à l'ouverture de l'onglet")
+    parser.add_argument('--instrumentation', metavar = 'RAPPORT.json', help = "mesurer chaque étape (durée, CPU, lignes, mémoire allouée, taille des sources) et écrire le rapport JSON")
+    parser.add_argument('--profil', metavar = 'FICHIER.prof', help = "avec --instrumentation : profil cProfile de l'étape la plus lente")
+    parser.add_argument('--export-agregats', nargs = '?', const = DOSSIER_EXPORT, metavar = 'DOSSIER',
+                        help = f"sans graphiques : exporter les tables des agrégats dans DOSSIER (par défaut {DOSSIER_EXPORT}) sans importer Bokeh")
+    parser.add_argument('--format', choices = list(FORMATS), default = 'csv', help = "format des tables exportées")
+    parser.add_argument('--sans-navigateur', action = 'store_true', help = "écrire le fichier HTML sans l'ouvrir dans le navigateur")
+    parser.add_argument('--rapport-demarrage', action = 'store_true',
+                        help = "mesurer le démarrage du mode sans graphiques et du tableau de bord, chacun dans un processus neuf")
+    return parser
+
+
+def verifier_options(parser, args):
+    if args.profil and not args.instrumentation:
+        parser.error("--profil demande --instrumentation")
+    if args.filtre and (args.flux or args.entrepot):
+        parser.error("--filtre demande le chargement complet des accidents (incompatible avec --flux et --entrepot)")
+    if args.entrepot and any(getattr(args, filtre) for filtre in FILTRES):
+        parser.error("--annees, --departements et --usagers filtrent les accidents lus : ils ne s'appliquent pas aux agrégats de --entrepot")
+    if args.departements and not os.path.isdir(args.fichier):
+        parser.error("--departements demande un jeu partitionné par département (voir partitions.py --departement)")
+    if args.rapport_demarrage and (args.export_agregats or args.etapes):
+        parser.error("--rapport-demarrage choisit lui-même les étapes de chaque mode (incompatible avec --export-agregats et --etapes)")
+    args.centre = tuple(args.centre)
+    vars(args).update(options_validation(args))
+
+
+##### Temps de démarrage #####
+
+# Exécuté dans un processus neuf : import de ce module, puis main() avec les arguments donnés
+_MESURE_DEMARRAGE = """
+import json, sys, time
+debut = time.perf_counter()
+import Projet_final
+importe = time.perf_counter()
+Projet_final.main(json.loads(sys.argv[1]))
+print(json.dumps({'import': importe - debut, 'execution': time.perf_counter() - importe, 'pic_rss_mo': Projet_final.pic_memoire_mo(),
+                  'graphiques': [module for module in ('bokeh', 'shapely') if module in sys.modules]}))
+"""
+
+
+def modes_demarrage(arguments, dossier_export = DOSSIER_EXPORT):
+    """Arguments de chaque mode mesuré, sans cache d'étapes : tout est recalculé dans les deux cas."""
+    return {'sans_graphiques': arguments + ['--sans-cache', '--export-agregats', dossier_export],
+            'tableau_de_bord': arguments + ['--sans-cache', '--sans-navigateur']}
+
+
+def mesurer_demarrage(arguments):
+    """Lance main(arguments) dans un processus neuf : durées du processus, de l'import de ce module et de l'exécution,
+    pic RSS et bibliothèques graphiques importées."""
+    dossier = os.path.dirname(os.path.abspath(__file__))
+    environnement = {**os.environ, 'BOKEH_BROWSER': 'none', 'PYTHONPATH': os.pathsep.join(filter(None, [dossier, os.environ.get('PYTHONPATH')]))}
+    debut = time.perf_counter()
+    sortie = subprocess.run([sys.executable, '-c', _MESURE_DEMARRAGE, json.dumps(arguments)],
+                            check = True, capture_output = True, text = True, env = environnement).stdout
+    mesure = json.loads(sortie.splitlines()[-1])
+    mesure['processus'] = time.perf_counter() - debut
+    return mesure
+
+
+def rapport_demarrage(arguments, fichier = None, **bornes):
+    """Mesure le mode sans graphiques puis le tableau de bord, chacun dans un processus neuf. L'instantané Parquet
+    de `fichier` (validé avec les `bornes` des options) est écrit avant : les deux modes le relisent au lieu que
+    seul le premier lise le CSV."""
+    if fichier is not None:
+        charger_accidents(fichier, **bornes)
+    resultats = {}
+    for mode, arguments_mode in modes_demarrage(arguments).items():
+        mesure = resultats[mode] = mesurer_demarrage(arguments_mode)
+        print(f"{mode:<16} {mesure['processus']:.2f} s (import {mesure['import']:.2f} s, exécution {mesure['execution']:.2f} s), "
+              f"pic RSS {mesure['pic_rss_mo']:.1f} Mo, bibliothèques graphiques importées : {', '.join(mesure['graphiques']) or 'aucune'}")
+    return resultats
+
+
+def main(arguments = None):
+    parser = analyseur()
+    arguments = sys.argv[1:] if arguments is None else list(arguments)
+    args = parser.parse_args(arguments)
+    verifier_options(parser, args)
+    if args.rapport_demarrage:
+        return rapport_demarrage([argument for argument in arguments if argument != '--rapport-demarrage'],
+                                 None if args.flux or args.entrepot else args.fichier, **options_validation(args))
+    if args.sortie is None:
+        args.sortie = fichier_html(args.region)
+    if args.etapes is None:
+        args.etapes = ['export_agregats'] if args.export_agregats else ['sortie']
+    elif 'export_agregats' in args.etapes and args.export_agregats is None:
+        args.export_agregats = DOSSIER_EXPORT
+
+    options = dict(vars(args), afficher = not args.sans_navigateur)
+    instrumentation = Instrumentation(args.profil) if args.instrumentation else None
+    pipeline = Pipeline(etapes(options), options, utiliser_cache = not args.sans_cache, instrumentation = instrumentation)
+    inconnues = [nom for nom in args.etapes if nom not in pipeline.etapes]
+    if inconnues:
+        parser.error(f"étapes inconnues : {', '.join(inconnues)} (disponibles : {', '.join(pipeline.etapes)})")
+    resultats = pipeline.executer(args.etapes)
+
+    if instrumentation is not None:
+        if 'sortie' in pipeline.resultats:
+            from export import tailles_sources
+            instrumentation.ajouter_tailles_sources(tailles_sources(args.sortie)[1])
+        instrumentation.terminer(args.instrumentation)
+    return resultats
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import numpy as np
+import pandas as pd
+
+from chargement import TAILLE_BLOC, lire_par_blocs
+from cube import JOURS_SEMAINE, construire_cube, cube_vide
+from series import construire_serie, serie_vide
+from vehicules import CATEGORIES, NON_SPECIFIE, classer_vehicules, compter_classes
+
+##### Agrégats utilisés par les graphiques #####
+
+# Colonnes gardées pour les points des cartes vélo / piéton (et la gravité, pour les points chauds)
+COLONNES_POINTS = ['date', 'latitude', 'longitude', 'annee', 'ntu', 'nbh', 'nbnh']
+
+# Colonnes indiquant le type d'usager représenté sur chaque carte
+USAGERS = ['velo', 'pieton']
+
+
+def extraire_points(accident, lignes = None):
+    """Points de toutes les cartes dans une seule table : les accidents impliquant au moins un des USAGERS, avec
+    une colonne booléenne par usager qui désigne les points de sa carte (et le numéro de ligne, si donné)."""
+    masques = {usager: (accident[usager] == "Oui").to_numpy() for usager in USAGERS}
+    garder = np.logical_or.reduce(list(masques.values()))
+    points = accident.loc[garder, COLONNES_POINTS]
+    for usager, masque in masques.items():
+        points[usager] = masque[garder]
+    if lignes is not None:
+        points['ligne'] = lignes[garder]
+    return points
+
+
+def index_annees(annees):
+    """Tranche [début, fin) de chaque année dans des points triés par date, par exemple {'2012': (0, 153), ...}."""
+    annees = np.asarray(annees)
+    valeurs = np.unique(annees)
+    debuts = np.searchsorted(annees, valeurs, side = 'left')
+    fins = np.searchsorted(annees, valeurs, side = 'right')
+    return {str(annee): (int(debut), int(fin)) for annee, debut, fin in zip(valeurs, debuts, fins)}
+
+
+def finaliser(vehicules, cube, serie, points):
+    """Met les agrégats sous la forme attendue par les graphiques : la heatmap (toutes les cases jour / heure)
+    et les totaux par année sont des tranches du cube, gardé pour les filtres côté client avec la série journalière."""
+    heatmap = cube.tranche(garder = ('jsem', 'heure'), mesures = ['nb'], jsem = JOURS_SEMAINE)[0]
+    annees = cube.tranche(garder = ('annee',), mesures = ['nb', 'ntu', 'nbh', 'nbnh'])
+    annees = pd.DataFrame({'annee': cube.annees, **dict(zip(['nb', 'ntu', 'nbh', 'nbnh'], annees))})
+    return {
+        'vehicules': vehicules.drop(NON_SPECIFIE, errors = 'ignore'),
+        'heatmap': pd.DataFrame({'jsem': np.repeat(JOURS_SEMAINE, 24), 'heure': np.tile(np.arange(24), 7), 'nb': heatmap.ravel()}),
+        'annees': annees[annees['nb'] > 0].reset_index(drop = True),
+        'cube': cube,
+        'serie': serie,
+        'points': points.reset_index(drop = True),
+    }
+
+
+def agreger(accident, codes_classes = None):
+    """Agrégats calculés sur le DataFrame complet (trié par date)."""
+    if codes_classes is None:
+        codes_classes = classer_vehicules(accident)
+    return finaliser(compter_classes(codes_classes), construire_cube(accident, codes_classes),
+                     construire_serie(accident, codes_classes), extraire_points(accident))
+
+
+##### Mode flux : agrégats cumulés bloc par bloc #####
+
+class AgregatsFlux:
+    """Cumule les agrégats d'une suite de blocs lus dans l'ordre du fichier.
+
+    Le résultat est identique à agreger() sur le fichier entier trié par date : l'ordre de première
+    apparition des catégories de véhicule est reconstitué avec la clé (colonne, date, ligne du fichier).
+    """
+
+    def __init__(self):
+        self.lignes = 0
+        self.comptes = np.zeros(len(CATEGORIES), dtype = np.int64)
+        self.premieres = {}
+        self.cube = cube_vide()
+        self.serie = serie_vide()
+        self.points = []
+
+    def ajouter(self, bloc):
+        lignes = np.arange(self.lignes, self.lignes + len(bloc))
+        self.lignes += len(bloc)
+
+        # Catégories de véhicule : comptes et première apparition dans l'ordre (date, ligne) de chaque colonne
+        codes = classer_vehicules(bloc)
+        self.comptes += np.bincount(codes.ravel(), minlength = len(CATEGORIES))
+        dates = bloc['date'].to_numpy()
+        ordre = np.lexsort((lignes, dates))
+        for j in range(codes.shape[1]):
+            presentes, premiere_position = np.unique(codes[ordre, j], return_index = True)
+            for code, i in zip(presentes, ordre[premiere_position]):
+                cle = (j, dates[i], lignes[i])
+                if code not in self.premieres or cle < self.premieres[code]:
+                    self.premieres[code] = cle
+
+        self.cube = self.cube.fusionner(construire_cube(bloc, codes))
+        self.serie = self.serie.fusionner(construire_serie(bloc, codes))
+
+        self.points.append(extraire_points(bloc, lignes))
+
+    def fusionner(self, autre):
+        """Ajoute les agrégats d'un autre cumul portant sur des lignes distinctes (par exemple une autre année)."""
+        self.lignes += autre.lignes
+        self.comptes += autre.comptes
+        for code, cle in autre.premieres.items():
+            if code not in self.premieres or cle < self.premieres[code]:
+                self.premieres[code] = cle
+        self.cube = self.cube.fusionner(autre.cube)
+        self.serie = self.serie.fusionner(autre.serie)
+        self.points.extend(autre.points)
+        return self
+
+    def resultats(self):
+        ordre = sorted(self.premieres, key = self.premieres.get)
+        vehicules = pd.Series(self.comptes[ordre], index = np.array(CATEGORIES, dtype = object)[ordre])
+
+        # Remettre les points dans l'ordre du tri stable par date
+        points = pd.concat(self.points, ignore_index = True).sort_values(['date', 'ligne'], ignore_index = True)
+        return finaliser(vehicules, self.cube, self.serie, points[COLONNES_POINTS + USAGERS])
+
+
+def agreger_par_blocs(chemin, taille_bloc = TAILLE_BLOC, **options):
+    """Agrégats du fichier lu par blocs : la mémoire ne dépend que de taille_bloc (et du nombre de points à cartographier).
+    Les `options` sont celles de lire_par_blocs : filtres de chargement.FILTRES et bornes de validation."""
+    flux = AgregatsFlux()
+    for bloc in lire_par_blocs(chemin, taille_bloc, **options):
+        flux.ajouter(bloc)
+    return flux.resultats()
@@ -0,0 +1,212 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import bokeh
+from bokeh.embed import file_html
+from bokeh.resources import CDN
+
+from agregats import extraire_points, finaliser
+from chargement import lire_brut, pic_memoire_mo, trier_par_date
+from cube import construire_cube
+from series import construire_serie
+from synthetique import ecrire_accidents
+from validation import valider
+from vehicules import classer_vehicules, compter_classes
+import figures
+import Projet_final
+
+##### Banc d'essai : temps et mémoire de chaque étape selon la taille des données #####
+
+TAILLES = [10_000, 100_000, 1_000_000, 10_000_000]
+
+# Fichiers synthétiques générés, réutilisés d'un lancement à l'autre
+DOSSIER_DONNEES = "donnees_banc"
+
+FICHIER_RESULTATS = "banc_essai.json"
+
+
+def _lire_status(champ):
+    """Valeur d'un champ de /proc/self/status (VmRSS, VmHWM) en Mo, None hors Linux."""
+    try:
+        with open('/proc/self/status') as f:
+            for ligne in f:
+                if ligne.startswith(champ + ':'):
+                    return int(ligne.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def reinitialiser_pic_rss():
+    """Remet à zéro le pic RSS du processus (Linux : écrire 5 dans /proc/self/clear_refs). Faux si impossible."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def mesurer(nom, fonction, *args):
+    """Exécute une étape : renvoie son résultat et sa mesure (durée, RSS avant l'étape et pic RSS pendant l'étape).
+
+    Sans remise à zéro possible du pic, c'est le pic depuis le début du processus qui est relevé (pic_cumule).
+    """
+    gc.collect()
+    rss_avant = _lire_status('VmRSS')
+    pic_remis_a_zero = reinitialiser_pic_rss()
+    debut = time.perf_counter()
+    resultat = fonction(*args)
+    duree = time.perf_counter() - debut
+    pic = _lire_status('VmHWM') if pic_remis_a_zero else pic_memoire_mo()
+    return resultat, {'etape': nom, 'secondes': round(duree, 4), 'rss_avant_mo': rss_avant and round(rss_avant, 1),
+                      'pic_rss_mo': round(pic, 1), 'pic_cumule': not pic_remis_a_zero}
+
+
+##### Étapes mesurées #####
+
+def _classification(accident):
+    codes = classer_vehicules(accident)
+    return codes, compter_classes(codes)
+
+
+def _figures(agregats, points_cartes, points_chauds):
+    return figures.etape_tableau_de_bord(figures.figure_vehicules(agregats), figures.figure_evolution(agregats, Projet_final.REGION),
+                                         figures.figure_heatmap(agregats),
+                                         figures.figure_cartes(points_cartes, Projet_final.REGION, Projet_final.CENTRE, points_chauds = points_chauds))
+
+
+def _html(tableau_de_bord):
+    return file_html(tableau_de_bord, CDN, "Banc d'essai")
+
+
+def banc(chemin):
+    """Mesure chaque étape du tableau de bord sur un fichier d'accidents, dans le processus courant."""
+    mesures = []
+
+    def etape(nom, fonction, *args):
+        resultat, mesure = mesurer(nom, fonction, *args)
+        mesures.append(mesure)
+        return resultat
+
+    brut = etape('lecture', lire_brut, chemin)
+    lignes = len(brut)
+    accident = etape('dates_heures', lambda brut: trier_par_date(valider(brut)[0]), brut)
+    del brut
+    codes, vehicules = etape('classes_vehicules', _classification, accident)
+    cube = etape('cube', construire_cube, accident, codes)
+    serie = etape('serie', construire_serie, accident, codes)
+    agregats = etape('points', lambda accident: finaliser(vehicules, cube, serie, extraire_points(accident)), accident)
+    points_cartes = etape('projection', Projet_final.etape_points_cartes, agregats)
+    points_chauds = etape('points_chauds', Projet_final.etape_points_chauds, agregats, points_cartes)
+    tableau_de_bord = etape('figures', _figures, agregats, points_cartes, points_chauds)
+    html = etape('html', _html, tableau_de_bord)
+
+    for mesure in mesures:
+        mesure['lignes'] = lignes
+    mesures[-1]['octets_html'] = len(html.encode('utf-8'))
+    return mesures
+
+
+def demarrage(chemin, lignes):
+    """Démarrage complet (processus neuf, sans cache d'étapes) du mode sans graphiques et du tableau de bord HTML.
+
+    L'instantané Parquet du fichier est écrit avant : les deux modes le relisent.
+    """
+    Projet_final.charger_accidents(chemin)
+    mesures = []
+    with tempfile.TemporaryDirectory() as dossier:
+        arguments = ['--fichier', chemin, '--sortie', os.path.join(dossier, 'tableau_de_bord.html')]
+        for mode, arguments_mode in Projet_final.modes_demarrage(arguments, os.path.join(dossier, 'agregats')).items():
+            mesure = Projet_final.mesurer_demarrage(arguments_mode)
+            mesures.append({'etape': f'demarrage_{mode}', 'secondes': round(mesure['processus'], 4), 'import_secondes': round(mesure['import'], 4),
+                            'pic_rss_mo': round(mesure['pic_rss_mo'], 1), 'pic_cumule': True, 'graphiques': mesure['graphiques'], 'lignes': lignes})
+    return mesures
+
+
+def fichier_synthetique(lignes, dossier = DOSSIER_DONNEES, graine = 0):
+    """Chemin du fichier synthétique de cette taille, généré au premier besoin."""
+    chemin = os.path.join(dossier, f"accidents_{lignes}_g{graine}.csv")
+    if not os.path.exists(chemin):
+        os.makedirs(dossier, exist_ok = True)
+        debut = time.perf_counter()
+        ecrire_accidents(chemin + ".tmp", lignes, graine)
+        os.replace(chemin + ".tmp", chemin)
+        print(f"{chemin} généré en {time.perf_counter() - debut:.1f} s")
+    return chemin
+
+
+def environnement():
+    """Machine, versions et commit, pour comparer des résultats entre lancements."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output = True, text = True,
+                                cwd = os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'date': datetime.now().isoformat(timespec = 'seconds'), 'commit': commit, 'machine': platform.platform(),
+            'processeurs': os.cpu_count(), 'python': platform.python_version(), 'pandas': pd.__version__,
+            'numpy': np.__version__, 'bokeh': bokeh.__version__}
+
+
+def lancer(tailles = TAILLES, dossier = DOSSIER_DONNEES, graine = 0):
+    """Mesure chaque taille dans un processus neuf (mémoire de départ identique) et renvoie toutes les mesures."""
+    mesures = []
+    for lignes in tailles:
+        chemin = fichier_synthetique(lignes, dossier, graine)
+        sortie = subprocess.run([sys.executable, os.path.abspath(__file__), '--mesure', chemin],
+                                check = True, capture_output = True, text = True,
+                                env = {**os.environ, 'BOKEH_BROWSER': 'none'}).stdout
+        mesures += json.loads(sortie.splitlines()[-1])
+        mesures += demarrage(chemin, lignes)
+        resume(mesures, lignes)
+    return mesures
+
+
+def resume(mesures, lignes):
+    print(f"{lignes:>12,} lignes")
+    for mesure in mesures:
+        if mesure['lignes'] == lignes:
+            print(f"  {mesure['etape']:<26} {mesure['secondes']:>9.3f} s  pic RSS {mesure['pic_rss_mo']:>9.1f} Mo")
+
+
+def comparer(mesures, reference):
+    """Rapport des durées à celles d'un fichier de résultats précédent (même taille, même étape)."""
+    anciennes = {(mesure['lignes'], mesure['etape']): mesure for mesure in reference['mesures']}
+    print(f"Comparaison avec {reference['environnement'].get('commit')} ({reference['environnement'].get('date')})")
+    for mesure in mesures:
+        ancienne = anciennes.get((mesure['lignes'], mesure['etape']))
+        if ancienne and ancienne['secondes'] > 0:
+            print(f"  {mesure['lignes']:>12,} {mesure['etape']:<26} temps x{mesure['secondes'] / ancienne['secondes']:.2f}"
+                  f"  pic RSS x{mesure['pic_rss_mo'] / ancienne['pic_rss_mo']:.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Banc d'essai du tableau de bord sur des données synthétiques de tailles croissantes")
+    parser.add_argument('--tailles', type = int, nargs = '+', default = TAILLES, help = "nombres de lignes à mesurer")
+    parser.add_argument('--dossier', default = DOSSIER_DONNEES, help = "dossier des fichiers synthétiques")
+    parser.add_argument('--graine', type = int, default = 0)
+    parser.add_argument('--sortie', default = FICHIER_RESULTATS, help = "fichier JSON des résultats")
+    parser.add_argument('--reference', help = "fichier JSON d'un lancement précédent, à comparer")
+    parser.add_argument('--mesure', help = argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mesure:
+        print(json.dumps(banc(args.mesure)))
+    else:
+        mesures = lancer(args.tailles, args.dossier, args.graine)
+        with open(args.sortie, 'w', encoding = 'utf-8') as f:
+            json.dump({'environnement': environnement(), 'mesures': mesures}, f, indent = 1)
+        print(f"Résultats écrits dans {args.sortie}")
+        if args.reference:
+            with open(args.reference, encoding = 'utf-8') as f:
+                comparer(mesures, json.load(f))
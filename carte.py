@@ -0,0 +1,115 @@
+import numpy as np
+import pandas as pd
+
+# Converts decimal longitude/latitude to Web Mercator format
+def coor_wgs84_to_web_mercator(lon, lat):
+    k = 6378137
+    x = lon * (k * np.pi/180.0)
+    y = np.log(np.tan((90 + lat) * np.pi/360.0)) * k
+    return (x,y)
+
+
+# Same projection into new float32 arrays, block by block: float64 precision without full-size float64 temporaries
+def coor_wgs84_to_web_mercator_float32(lon, lat, block = 1 << 16):
+    x = np.empty(len(lon), dtype = np.float32)
+    y = np.empty(len(lat), dtype = np.float32)
+    for start in range(0, len(x), block):
+        end = start + block
+        x[start:end], y[start:end] = coor_wgs84_to_web_mercator(np.asarray(lon[start:end], dtype = np.float64), np.asarray(lat[start:end], dtype = np.float64))
+    return (x,y)
+
+
+# Converts Web Mercator coordinates back to decimal longitude/latitude
+def coor_web_mercator_to_wgs84(x, y):
+    k = 6378137
+    lon = x / (k * np.pi/180.0)
+    lat = np.arctan(np.exp(y / k)) * 360.0/np.pi - 90
+    return (lon,lat)
+
+
+def points_couche(points_cartes, usager, colonnes = ('x', 'y', 'annee')):
+    """Colonnes des points d'une carte, extraites des tableaux communs le temps de leur utilisation."""
+    indices = points_cartes['couches'][usager]['indices']
+    return [points_cartes[colonne][indices] for colonne in colonnes]
+
+
+##### Agrégation spatiale multi-résolution des cartes #####
+
+# Nombre de cellules visées sur la largeur de la carte : fixe le niveau de détail affiché pour un zoom donné
+CELLULES_ECRAN = 64
+
+# Nombre maximal de cellules embarquées par carte, tous niveaux et toutes années (et Total) confondus : borne la taille
+# des grilles envoyées au navigateur
+BUDGET_CELLULES = 40000
+
+# Plus petite taille de cellule, en mètres Web Mercator
+TAILLE_CELLULE_MIN = 16
+
+# Au-delà de ce nombre de points, les points bruts ne sont pas envoyés au navigateur et seules les grilles sont affichées
+MAX_POINTS_BRUTS = 20000
+
+
+def pyramide_grille(x, y, annees, budget = BUDGET_CELLULES, taille_min = TAILLE_CELLULE_MIN):
+    """Compte les points (x, y en Web Mercator) sur des grilles de plus en plus fines, au total et par année.
+
+    Les tailles de cellule sont des puissances de 2 (en mètres) : chaque cellule d'un niveau se découpe en quatre
+    cellules du niveau suivant. Les grilles totales s'arrêtent au premier niveau qui porterait leurs cellules au-delà
+    de la moitié du budget ; les grilles par année sont ajoutées du niveau le plus grossier au plus fin, tant que
+    l'ensemble des cellules tient dans le budget. Le premier niveau est toujours gardé, au total et par année : une
+    année s'affiche au plus fin des niveaux qui ont sa grille.
+    Renvoie (cellules, tailles, offsets) : le DataFrame des cellules (x, y du centre, taille, nb), la taille des
+    cellules de chaque niveau, et la tranche [début, fin) de chaque clé 'niveau/annee' (ou 'niveau/Total').
+    """
+    # Coordonnées float32 gardées telles quelles : la division par la taille (float64) les promeut sans copie entière
+    x = np.asarray(x)
+    y = np.asarray(y)
+    annees = np.asarray(annees)
+    if len(x) == 0:
+        return pd.DataFrame({'x': [], 'y': [], 'taille': [], 'nb': []}), [float(taille_min)], {}
+
+    etendue = max(x.max() - x.min(), y.max() - y.min(), taille_min)
+    taille = 2.0 ** np.ceil(np.log2(float(etendue) / CELLULES_ECRAN))
+
+    morceaux, offsets = [], {}
+    debut = 0
+
+    def ajouter(cle, comptes, taille):
+        nonlocal debut
+        ix, iy = comptes.index.get_level_values('ix'), comptes.index.get_level_values('iy')
+        morceaux.append(pd.DataFrame({'x': (ix + 0.5) * taille, 'y': (iy + 0.5) * taille, 'taille': taille, 'nb': comptes.to_numpy()}))
+        offsets[cle] = (debut, debut + len(comptes))
+        debut += len(comptes)
+
+    def cases(taille):
+        return pd.DataFrame({'annee': annees, 'ix': np.floor(x / taille).astype(np.int64), 'iy': np.floor(y / taille).astype(np.int64)})
+
+    tailles = []
+    while taille >= taille_min:
+        total = cases(taille).groupby(['ix', 'iy']).size()
+        if tailles and 2 * (debut + len(total)) > budget:
+            break
+        ajouter(f"{len(tailles)}/Total", total, taille)
+        tailles.append(float(taille))
+        taille /= 2
+
+    for niveau, taille in enumerate(tailles):
+        par_annee = cases(taille).groupby(['annee', 'ix', 'iy']).size()
+        if niveau and debut + len(par_annee) > budget:
+            break
+        for annee in par_annee.index.unique(level = 0):
+            ajouter(f"{niveau}/{annee}", par_annee.loc[annee], taille)
+
+    return pd.concat(morceaux, ignore_index = True), tailles, offsets
+
+
+def niveau_pour_largeur(tailles, largeur, cellules_ecran = CELLULES_ECRAN):
+    """Niveau le plus fin qui garde au plus cellules_ecran cellules sur la largeur visible (même règle que le JavaScript)."""
+    niveau = 0
+    while niveau + 1 < len(tailles) and largeur / tailles[niveau + 1] <= cellules_ecran:
+        niveau += 1
+    return niveau
+
+
+def points_bruts_visibles(tailles, largeur, cellules_ecran = CELLULES_ECRAN):
+    """Vrai quand même le niveau le plus fin est trop grossier pour la largeur visible : on affiche alors les points bruts."""
+    return largeur / tailles[-1] < cellules_ecran / 2
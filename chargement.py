@@ -0,0 +1,187 @@
+import argparse
+import hashlib
+import os
+import resource
+import subprocess
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from validation import ANNEES, EMPRISE, chemin_quarantaine, ecrire_quarantaine, valider
+from vehicules import COLONNES_VEHICULES
+
+##### Schéma du fichier d'accidents #####
+
+FICHIER_ACCIDENTS = "accidents_corporels.csv"
+
+# Dossier des instantanés colonnaires (un fichier Parquet par version du CSV source)
+DOSSIER_CACHE = ".cache_accidents"
+
+# A incrémenter dès que le schéma ou les colonnes dérivées changent, pour invalider les anciens instantanés
+VERSION_SCHEMA = 2
+
+# Nombre de lignes lues à la fois en mode flux
+TAILLE_BLOC = 200_000
+
+# Seules colonnes du CSV utilisées par le tableau de bord, avec leur type
+# (dates, heures et gravités en catégories : peu de valeurs distinctes, converties une seule fois chacune à la validation)
+TYPES_COLONNES = {
+    'date': 'category',
+    'heure': 'category',
+    'jsem': 'category',
+    **{col: 'category' for col in COLONNES_VEHICULES},
+    'Geo Point': 'string',
+    'velo': 'category',
+    'pieton': 'category',
+    'ntu': 'category',
+    'nbh': 'category',
+    'nbnh': 'category',
+}
+
+# Filtres de chargement : années [début, fin], départements, usagers (au moins un impliqué). Poussés à la lecture
+# des fichiers d'un jeu partitionné (voir partitions.py), appliqués après lecture pour le CSV
+FILTRES = ('annees', 'departements', 'usagers')
+
+
+def lire_brut(chemin, colonnes = (), **options):
+    """Lecture du CSV source limitée aux colonnes du schéma (et aux `colonnes` en plus, en catégories), sans colonnes
+    dérivées (options passées à read_csv)."""
+    types = {**TYPES_COLONNES, **{colonne: 'category' for colonne in colonnes}}
+    return pd.read_csv(chemin, sep = ";", decimal = ".", usecols = list(types), dtype = types, **options)
+
+
+def trier_par_date(accident):
+    # Ordonner par date croissante (tri stable pour un ordre reproductible) :
+    return accident.sort_values(by = 'date', kind = 'stable', ignore_index = True)
+
+
+def signaler_quarantaine(chemin, rejetees):
+    if rejetees:
+        warnings.warn(f"{rejetees} lignes invalides de {chemin} ignorées, voir {chemin_quarantaine(chemin)}")
+
+
+def lire_csv(chemin, annees_valides = ANNEES, emprise = EMPRISE):
+    """Lit le CSV source en entier avec le schéma ci-dessus, validé (lignes invalides, hors de la période `annees_valides`
+    ou de l'`emprise`, en quarantaine) et trié par date."""
+    accident, quarantaine = valider(lire_brut(chemin), emprise, annees_valides)
+    ecrire_quarantaine(chemin, quarantaine)
+    signaler_quarantaine(chemin, len(quarantaine))
+    return trier_par_date(accident)
+
+
+def filtrer_accidents(accident, annees = None, departements = None, usagers = None):
+    """Accidents retenus par les FILTRES : mêmes lignes que la lecture filtrée d'un jeu partitionné."""
+    garder = np.ones(len(accident), dtype = bool)
+    if annees:
+        garder &= accident['annee'].between(*annees).to_numpy()
+    if departements:
+        if 'departement' not in accident:
+            raise ValueError("Filtre par département impossible : pas de colonne 'departement' (jeu partitionné par département attendu, voir partitions.py)")
+        garder &= accident['departement'].isin(departements).to_numpy()
+    if usagers:
+        garder &= np.logical_or.reduce([(accident[usager] == "Oui").to_numpy() for usager in usagers])
+    return accident if garder.all() else accident.loc[garder].reset_index(drop = True)
+
+
+def lire_par_blocs(chemin, taille_bloc = TAILLE_BLOC, colonnes = (), annees_valides = ANNEES, emprise = EMPRISE, **filtres):
+    """Lit le CSV source par blocs validés (comme lire_csv) d'au plus taille_bloc lignes, dans l'ordre du fichier (non triés).
+    Un dossier est un jeu partitionné, déjà validé à sa conversion, lu partition par partition (voir partitions.py)."""
+    if os.path.isdir(chemin):
+        from partitions import lire_partitions_par_blocs
+        yield from lire_partitions_par_blocs(chemin, taille_bloc, **filtres)
+        return
+
+    rejetees = 0
+    with lire_brut(chemin, colonnes, chunksize = taille_bloc) as lecteur:
+        for numero, bloc in enumerate(lecteur):
+            accident, quarantaine = valider(bloc, emprise, annees_valides)
+            ecrire_quarantaine(chemin, quarantaine, ajouter = numero > 0)
+            rejetees += len(quarantaine)
+            yield filtrer_accidents(accident, **filtres)
+    signaler_quarantaine(chemin, rejetees)
+
+
+def empreinte_fichier(chemin):
+    """Empreinte du fichier source : hash SHA-256 du contenu et date de modification."""
+    sha = hashlib.sha256()
+    with open(chemin, 'rb') as f:
+        for bloc in iter(lambda: f.read(1 << 20), b''):
+            sha.update(bloc)
+    return f"{sha.hexdigest()[:16]}-{os.stat(chemin).st_mtime_ns}"
+
+
+def chemin_instantane(chemin, dossier_cache = DOSSIER_CACHE, annees_valides = ANNEES, emprise = EMPRISE):
+    """Instantané d'une version du CSV source validée avec ces bornes."""
+    nom = os.path.splitext(os.path.basename(chemin))[0]
+    bornes = hashlib.sha256(repr((tuple(annees_valides), tuple(map(tuple, emprise)))).encode('utf-8')).hexdigest()[:8]
+    return os.path.join(dossier_cache, f"{nom}-v{VERSION_SCHEMA}-{empreinte_fichier(chemin)}-{bornes}.parquet")
+
+
+def charger_accidents(chemin = FICHIER_ACCIDENTS, dossier_cache = DOSSIER_CACHE, utiliser_cache = True,
+                      annees_valides = ANNEES, emprise = EMPRISE, **filtres):
+    """Charge les accidents depuis l'instantané Parquet s'il existe, sinon depuis le CSV validé avec les bornes
+    `annees_valides` et `emprise` (et écrit l'instantané), puis garde ceux des `filtres` (voir FILTRES). Un dossier
+    est un jeu partitionné : seules les partitions et les groupes de lignes qui peuvent contenir des accidents
+    retenus sont lus (voir partitions.py)."""
+    if os.path.isdir(chemin):
+        from partitions import lire_partitions
+        return lire_partitions(chemin, **filtres)
+    if not utiliser_cache:
+        return filtrer_accidents(lire_csv(chemin, annees_valides, emprise), **filtres)
+
+    instantane = chemin_instantane(chemin, dossier_cache, annees_valides, emprise)
+    if os.path.exists(instantane):
+        return filtrer_accidents(pd.read_parquet(instantane), **filtres)
+
+    accident = lire_csv(chemin, annees_valides, emprise)
+    os.makedirs(dossier_cache, exist_ok = True)
+    try:
+        accident.to_parquet(instantane, index = False)
+    except ImportError as erreur:
+        warnings.warn(f"Instantané Parquet non écrit ({erreur}) : le CSV sera relu au prochain lancement")
+    return filtrer_accidents(accident, **filtres)
+
+
+##### Mesure démarrage à froid / à chaud #####
+
+def pic_memoire_mo():
+    """Pic de mémoire résidente (RSS) du processus courant, en Mo."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _mesurer(chemin, dossier_cache):
+    debut = time.perf_counter()
+    accident = charger_accidents(chemin, dossier_cache)
+    print(f"{time.perf_counter() - debut:.3f} {pic_memoire_mo():.1f} {len(accident)}")
+
+
+def rapport_chargement(chemin = FICHIER_ACCIDENTS, dossier_cache = DOSSIER_CACHE):
+    """Mesure le chargement à froid (sans instantané) puis à chaud, chacun dans un processus neuf."""
+    instantane = chemin_instantane(chemin, dossier_cache)
+    if os.path.exists(instantane):
+        os.remove(instantane)
+
+    resultats = {}
+    for mode in ('froid', 'chaud'):
+        sortie = subprocess.run([sys.executable, os.path.abspath(__file__), chemin, '--cache', dossier_cache, '--mesure'],
+                                check = True, capture_output = True, text = True).stdout.split()
+        duree, rss, lignes = float(sortie[0]), float(sortie[1]), int(sortie[2])
+        resultats[mode] = (duree, rss)
+        print(f"Démarrage à {mode} : {duree:.3f} s, pic RSS {rss:.1f} Mo ({lignes} lignes)")
+    return resultats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Chargement typé des accidents et rapport démarrage à froid / à chaud")
+    parser.add_argument('fichier', nargs = '?', default = FICHIER_ACCIDENTS)
+    parser.add_argument('--cache', default = DOSSIER_CACHE, help = "dossier des instantanés Parquet")
+    parser.add_argument('--mesure', action = 'store_true', help = argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mesure:
+        _mesurer(args.fichier, args.cache)
+    else:
+        rapport_chargement(args.fichier, args.cache)
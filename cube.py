@@ -0,0 +1,138 @@
+import numpy as np
+
+from vehicules import CATEGORIES, NON_SPECIFIE, classer_vehicules
+
+##### Cube des accidents : comptes précalculés sur toutes les dimensions des graphiques #####
+
+JOURS_SEMAINE = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
+
+# Dernière case de l'axe des jours : jour de semaine absent ou inconnu. Ces accidents comptent dans tous les totaux,
+# la heatmap (tranche des seuls JOURS_SEMAINE) les laisse de côté.
+JOUR_INCONNU = 'Inconnu'
+
+# Première case de l'axe des catégories : tous les accidents, quels que soient leurs véhicules
+TOUTES = 'Toutes'
+
+AXES = ('annee', 'mois', 'jsem', 'heure', 'categorie', 'velo', 'pieton')
+
+# nb : accidents ; vehicules : véhicules de la catégorie (hors 'Non spécifié' pour Toutes) ; ntu, nbh, nbnh : sommes
+MESURES = ('nb', 'vehicules', 'ntu', 'nbh', 'nbnh')
+
+LIBELLES_AXES = {
+    'mois': list(range(1, 13)),
+    'jsem': JOURS_SEMAINE + [JOUR_INCONNU],
+    'heure': list(range(24)),
+    'categorie': [TOUTES] + CATEGORIES,
+    'velo': ['Non', 'Oui'],
+    'pieton': ['Non', 'Oui'],
+}
+
+
+class Cube:
+    """Tableau dense (mesure, annee, mois, jsem, heure, categorie, velo, pieton) des comptes d'accidents.
+
+    Un accident compte dans la case 'Toutes' et dans chaque catégorie de véhicule qu'il implique : l'axe des
+    catégories se sélectionne, il ne se somme pas. Les autres axes partitionnent les accidents.
+    """
+
+    def __init__(self, annee_min, valeurs):
+        self.annee_min = annee_min
+        self.valeurs = valeurs
+
+    @property
+    def annees(self):
+        return list(range(self.annee_min, self.annee_min + self.valeurs.shape[1]))
+
+    def libelles(self, axe):
+        return self.annees if axe == 'annee' else LIBELLES_AXES[axe]
+
+    def tranche(self, garder = (), mesures = MESURES, **selections):
+        """Somme du cube sur les axes ni gardés ni sélectionnés : renvoie un tableau (mesure, axes gardés dans l'ordre de AXES).
+
+        Une sélection (libellé ou liste de libellés) restreint un axe ; gardé, l'axe sélectionné suit l'ordre de la
+        liste, sinon il est sommé. Sans sélection ni garde, l'axe des catégories vaut 'Toutes'.
+        """
+        if 'categorie' not in garder and 'categorie' not in selections:
+            selections['categorie'] = TOUTES
+        valeurs = self.valeurs[[MESURES.index(mesure) for mesure in mesures]]
+
+        # Des derniers axes aux premiers, pour que la position des axes restant à traiter ne change pas
+        for position, axe in reversed(list(enumerate(AXES, start = 1))):
+            if axe in selections:
+                choix = selections[axe]
+                libelles = self.libelles(axe)
+                indices = [libelles.index(libelle) for libelle in (choix if isinstance(choix, (list, tuple)) else [choix])]
+                valeurs = valeurs.take(indices, axis = position)
+                if axe not in garder:
+                    valeurs = valeurs.sum(axis = position, dtype = np.int64)
+            elif axe not in garder:
+                valeurs = valeurs.sum(axis = position, dtype = np.int64)
+        return valeurs
+
+    def fusionner(self, autre):
+        """Cube de la réunion de deux ensembles d'accidents distincts (axes des années alignés)."""
+        if autre.valeurs.shape[1] == 0:
+            return self
+        if self.valeurs.shape[1] == 0:
+            return autre
+        debut = min(self.annee_min, autre.annee_min)
+        fin = max(self.annee_min + self.valeurs.shape[1], autre.annee_min + autre.valeurs.shape[1])
+        valeurs = np.zeros((self.valeurs.shape[0], fin - debut) + self.valeurs.shape[2:], dtype = self.valeurs.dtype)
+        for cube in (self, autre):
+            valeurs[:, cube.annee_min - debut:cube.annee_min - debut + cube.valeurs.shape[1]] += cube.valeurs
+        return Cube(debut, valeurs)
+
+
+def cube_vide():
+    return Cube(0, np.zeros((len(MESURES), 0, 12, len(LIBELLES_AXES['jsem']), 24, len(LIBELLES_AXES['categorie']), 2, 2), dtype = np.int32))
+
+
+def cumuler_categories(avant, apres, nb_avant, nb_apres, codes, gravites):
+    """Cumule les MESURES dans un tableau (mesure, avant, categorie, apres) : chaque accident compte dans la case
+    'Toutes' et dans chaque catégorie de véhicule qu'il implique (codes : une ligne de codes de classe par accident).
+    avant et apres sont les indices de chaque accident sur les axes qui précèdent et qui suivent les catégories."""
+    nb_categories = len(LIBELLES_AXES['categorie'])
+
+    # Nombre de véhicules de chaque catégorie dans chaque accident
+    n = len(avant)
+    comptes = np.bincount((np.arange(n)[:, None] * len(CATEGORIES) + codes).ravel(), minlength = n * len(CATEGORIES)).reshape(n, len(CATEGORIES))
+    lignes, categories = np.nonzero(comptes)
+    specifies = comptes.sum(axis = 1) - comptes[:, CATEGORIES.index(NON_SPECIFIE)]
+
+    # Case 'Toutes' pour chaque accident, puis une case par (accident, catégorie impliquée)
+    cases = np.concatenate([(avant * nb_categories) * nb_apres + apres, ((avant[lignes] * nb_categories) + categories + 1) * nb_apres + apres[lignes]])
+    poids = {
+        'nb': None,
+        'vehicules': np.concatenate([specifies, comptes[lignes, categories]]),
+        **{colonne: np.concatenate([valeurs, valeurs[lignes]]) for colonne, valeurs in gravites.items()},
+    }
+    taille = nb_avant * nb_categories * nb_apres
+    valeurs = np.stack([np.bincount(cases, weights = poids[mesure], minlength = taille).astype(np.int32) for mesure in MESURES])
+    return valeurs.reshape((len(MESURES), nb_avant, nb_categories, nb_apres))
+
+
+def construire_cube(accident, codes_classes = None):
+    """Construit le cube en un seul passage : chaque accident (et chacune de ses catégories de véhicule) donne
+    l'indice de sa case, et np.bincount cumule toutes les mesures. Les lignes au jour de semaine absent ou inconnu
+    vont dans la case JOUR_INCONNU."""
+    if codes_classes is None:
+        codes_classes = classer_vehicules(accident)
+    # Codes des jours traduits par leur table de catégories, sans convertir chaque ligne en texte
+    inconnu = LIBELLES_AXES['jsem'].index(JOUR_INCONNU)
+    jsem = accident['jsem'].astype('category')
+    table = np.array([JOURS_SEMAINE.index(jour) if jour in JOURS_SEMAINE else inconnu for jour in map(str, jsem.cat.categories)] + [inconnu])
+    jour = table[jsem.cat.codes.to_numpy()]
+    annee = accident['annee'].to_numpy().astype(np.int64)
+    if len(annee) == 0:
+        return cube_vide()
+
+    nb_jours = len(LIBELLES_AXES['jsem'])
+    nb_categories = len(LIBELLES_AXES['categorie'])
+    annee_min = int(annee.min())
+    nb_annees = int(annee.max()) - annee_min + 1
+    case = (((annee - annee_min) * 12 + accident['mois'].to_numpy() - 1) * nb_jours + jour) * 24 + accident['heure'].to_numpy()
+    usager = 2 * (accident['velo'] == "Oui").to_numpy() + (accident['pieton'] == "Oui").to_numpy()
+
+    gravites = {colonne: accident[colonne].to_numpy() for colonne in ('ntu', 'nbh', 'nbnh')}
+    valeurs = cumuler_categories(case, usager, nb_annees * 12 * nb_jours * 24, 4, codes_classes, gravites)
+    return Cube(annee_min, valeurs.reshape((len(MESURES), nb_annees, 12, nb_jours, 24, nb_categories, 2, 2)))
@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from agregats import AgregatsFlux
+from chargement import TAILLE_BLOC, lire_par_blocs
+from cube import Cube, cube_vide
+from pipeline import empreinte_chemin
+from validation import ANNEES, EMPRISE, ajouter_options_validation, options_validation
+from series import SerieJournaliere
+from vehicules import CATEGORIES
+
+##### Entrepôt d'agrégats partitionné par année #####
+
+# Un sous-dossier 'annee=AAAA' par année, contenant les agrégats cumulés de cette année seulement
+DOSSIER_ENTREPOT = "entrepot_accidents"
+
+# Fichiers déjà cumulés dans une partition (nom et empreinte) : un même fichier n'y est pas ajouté deux fois
+FICHIER_SOURCES = "sources.json"
+
+
+def dossier_partition(entrepot, annee):
+    return os.path.join(entrepot, f"annee={annee}")
+
+
+def annees_entrepot(entrepot = DOSSIER_ENTREPOT):
+    """Années présentes dans l'entrepôt, par ordre croissant."""
+    if not os.path.isdir(entrepot):
+        return []
+    return sorted(int(nom.split('=')[1]) for nom in os.listdir(entrepot)
+                  if nom.startswith('annee=') and nom[6:].isdigit())
+
+
+def ecrire_partition(entrepot, annee, flux, sources = ()):
+    """Écrit les agrégats d'une année et les fichiers dont ils proviennent, en remplaçant la partition existante
+    d'un seul renommage."""
+    final = dossier_partition(entrepot, annee)
+    temporaire = final + ".tmp"
+    shutil.rmtree(temporaire, ignore_errors = True)
+    os.makedirs(temporaire)
+
+    codes = sorted(flux.premieres)
+    pd.DataFrame({
+        'categorie': [CATEGORIES[code] for code in codes],
+        'nb': flux.comptes[codes],
+        'colonne': [flux.premieres[code][0] for code in codes],
+        'date': [flux.premieres[code][1] for code in codes],
+        'ligne': [flux.premieres[code][2] for code in codes],
+    }).to_parquet(os.path.join(temporaire, "vehicules.parquet"), index = False)
+    np.savez_compressed(os.path.join(temporaire, "cube.npz"), annee_min = flux.cube.annee_min, valeurs = flux.cube.valeurs)
+    np.savez_compressed(os.path.join(temporaire, "serie.npz"), annee_min = flux.serie.annee_min, valeurs = flux.serie.valeurs)
+    pd.concat(flux.points, ignore_index = True).to_parquet(os.path.join(temporaire, "points.parquet"), index = False)
+    with open(os.path.join(temporaire, FICHIER_SOURCES), 'w', encoding = 'utf-8') as f:
+        json.dump(list(sources), f, ensure_ascii = False, indent = 1)
+
+    # Remplacer l'ancienne partition : elle n'est supprimée qu'une fois la nouvelle en place
+    ancien = final + ".old"
+    shutil.rmtree(ancien, ignore_errors = True)
+    if os.path.exists(final):
+        os.rename(final, ancien)
+    os.rename(temporaire, final)
+    shutil.rmtree(ancien, ignore_errors = True)
+
+
+def lire_partition(entrepot, annee):
+    """Relit les agrégats d'une année sous forme de cumul fusionnable."""
+    dossier = dossier_partition(entrepot, annee)
+    flux = AgregatsFlux()
+
+    vehicules = pd.read_parquet(os.path.join(dossier, "vehicules.parquet"))
+    codes = [CATEGORIES.index(categorie) for categorie in vehicules['categorie']]
+    flux.comptes[codes] = vehicules['nb'].to_numpy()
+    flux.premieres = {code: (colonne, date, ligne) for code, colonne, date, ligne
+                      in zip(codes, vehicules['colonne'], vehicules['date'].to_numpy(), vehicules['ligne'])}
+
+    with np.load(os.path.join(dossier, "cube.npz")) as cube:
+        flux.cube = Cube(int(cube['annee_min']), cube['valeurs'])
+    # Cube écrit avant l'ajout de la case des jours inconnus : ses axes ne se fusionnent plus
+    if flux.cube.valeurs.shape[2:] != cube_vide().valeurs.shape[2:]:
+        raise ValueError(f"Partition {dossier} écrite par une version précédente : réimporter l'année {annee}")
+    with np.load(os.path.join(dossier, "serie.npz")) as serie:
+        flux.serie = SerieJournaliere(int(serie['annee_min']), serie['valeurs'])
+    flux.lignes = int(flux.cube.tranche(mesures = ['nb'])[0])
+    flux.points = [pd.read_parquet(os.path.join(dossier, "points.parquet"))]
+    return flux
+
+
+def lire_sources(entrepot, annee):
+    """Fichiers cumulés dans la partition d'une année (liste vide pour une partition écrite sans cette liste)."""
+    chemin = os.path.join(dossier_partition(entrepot, annee), FICHIER_SOURCES)
+    if not os.path.exists(chemin):
+        return []
+    with open(chemin, encoding = 'utf-8') as f:
+        return json.load(f)
+
+
+def importer(chemin, entrepot = DOSSIER_ENTREPOT, taille_bloc = TAILLE_BLOC, remplacer = False, annees_valides = ANNEES, emprise = EMPRISE):
+    """Ajoute un fichier d'accidents à l'entrepôt : seules ses lignes sont lues, validées avec les bornes `annees_valides`
+    et `emprise`. Les accidents d'une année déjà présente sont cumulés avec ceux de sa partition, après eux dans l'ordre
+    des lignes ; avec `remplacer`, la partition ne garde que ceux du fichier. Une année où ce fichier a déjà été cumulé
+    est laissée telle quelle (avertissement). Renvoie la liste des années écrites."""
+    source = {'fichier': os.path.basename(os.path.normpath(chemin)), 'empreinte': empreinte_chemin(chemin)}
+    existantes = set() if remplacer else set(annees_entrepot(entrepot))
+    par_annee, sources, deja_importees = {}, {}, set()
+    for bloc in lire_par_blocs(chemin, taille_bloc, annees_valides = annees_valides, emprise = emprise):
+        for annee, lignes in bloc.groupby('annee').indices.items():
+            annee = int(annee)
+            if annee in deja_importees:
+                continue
+            if annee not in par_annee:
+                sources[annee] = lire_sources(entrepot, annee) if annee in existantes else []
+                if any(ancienne['empreinte'] == source['empreinte'] for ancienne in sources[annee]):
+                    deja_importees.add(annee)
+                    continue
+                sources[annee].append(source)
+                # Les lignes du fichier sont numérotées à la suite de celles de la partition
+                par_annee[annee] = lire_partition(entrepot, annee) if annee in existantes else AgregatsFlux()
+            par_annee[annee].ajouter(bloc.iloc[lignes])
+
+    if deja_importees:
+        warnings.warn(f"{chemin} est déjà cumulé dans les années {', '.join(map(str, sorted(deja_importees)))} : "
+                      f"elles ne sont pas modifiées (--remplacer pour les réécrire avec ce seul fichier)")
+    os.makedirs(entrepot, exist_ok = True)
+    for annee, flux in par_annee.items():
+        ecrire_partition(entrepot, annee, flux, sources[annee])
+    return sorted(par_annee)
+
+
+def agreger_entrepot(entrepot = DOSSIER_ENTREPOT):
+    """Agrégats de toutes les années de l'entrepôt, identiques à ceux du fichier complet."""
+    annees = annees_entrepot(entrepot)
+    if not annees:
+        raise FileNotFoundError(f"Aucune partition d'année dans l'entrepôt '{entrepot}'")
+    flux = AgregatsFlux()
+    for annee in annees:
+        flux.fusionner(lire_partition(entrepot, annee))
+    return flux.resultats()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Import incrémental des accidents dans l'entrepôt d'agrégats par année")
+    parser.add_argument('fichiers', nargs = '+', help = "fichiers CSV à importer (cumulés avec les années déjà présentes)")
+    parser.add_argument('--entrepot', default = DOSSIER_ENTREPOT)
+    parser.add_argument('--taille-bloc', type = int, default = TAILLE_BLOC)
+    parser.add_argument('--remplacer', action = 'store_true', help = "remplacer les années du fichier au lieu de les cumuler avec l'entrepôt")
+    ajouter_options_validation(parser)
+    args = parser.parse_args()
+
+    sans_annee = []
+    for fichier in args.fichiers:
+        debut = time.perf_counter()
+        annees = importer(fichier, args.entrepot, args.taille_bloc, args.remplacer, **options_validation(args))
+        if not annees:
+            print(f"{fichier} : aucune année importée (aucune ligne retenue ou fichier déjà importé)", file = sys.stderr)
+            sans_annee.append(fichier)
+            continue
+        print(f"{fichier} : années {', '.join(map(str, annees))} importées en {time.perf_counter() - debut:.2f} s")
+    if sans_annee:
+        sys.exit(1)
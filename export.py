@@ -0,0 +1,198 @@
+import json
+import os
+import re
+import shutil
+
+import numpy as np
+import pandas as pd
+from bokeh.models import ColumnDataSource, CustomJS, CustomJSHover, CustomJSTransform, GlyphRenderer, IndexFilter
+
+##### Export compact du tableau de bord #####
+
+
+def plus_petit_entier(valeurs):
+    """Convertit un tableau d'entiers dans le plus petit type signé qui contient toutes ses valeurs."""
+    valeurs = np.asarray(valeurs)
+    if len(valeurs) == 0:
+        return valeurs.astype(np.int8)
+    for type_entier in (np.int8, np.int16, np.int32):
+        informations = np.iinfo(type_entier)
+        if informations.min <= valeurs.min() and valeurs.max() <= informations.max:
+            return valeurs.astype(type_entier)
+    return valeurs.astype(np.int64)
+
+
+def compacter(colonnes):
+    """Colonnes d'une source prêtes à être embarquées : flottants en float32 et entiers au plus petit type,
+    transmis par Bokeh sous forme de tableaux binaires typés."""
+    compactes = {}
+    for nom, valeurs in dict(colonnes).items():
+        tableau = np.asarray(valeurs)
+        if tableau.dtype.kind == 'f':
+            compactes[nom] = tableau.astype(np.float32, copy = False)
+        elif tableau.dtype.kind in 'iu':
+            compactes[nom] = plus_petit_entier(tableau)
+        else:
+            compactes[nom] = valeurs
+    return compactes
+
+
+def coder(valeurs, table = None):
+    """Remplace des valeurs catégorielles par leurs codes entiers : renvoie (codes, table des libellés)."""
+    categories = pd.Categorical(valeurs, categories = table)
+    return plus_petit_entier(categories.codes), list(categories.categories)
+
+
+def traduire_codes(table):
+    """Transformation appliquée par le navigateur pour retrouver les libellés d'une colonne codée (axes catégoriels)."""
+    return CustomJSTransform(args = dict(table = table), v_func = "return Array.from(xs, (code) => table[code])")
+
+
+def survol_codes(table):
+    """Formateur d'infobulle affichant le libellé d'une colonne codée."""
+    return CustomJSHover(args = dict(table = table), code = "return table[value]")
+
+
+##### Taille des sources dans le fichier HTML #####
+
+def _sources(objet, trouvees):
+    if isinstance(objet, dict):
+        if objet.get('type') == 'object' and objet.get('name') == 'ColumnDataSource':
+            attributs = objet.get('attributes', {})
+            trouvees.append((attributs.get('name') or objet.get('id'), attributs.get('data')))
+        for valeur in objet.values():
+            _sources(valeur, trouvees)
+    elif isinstance(objet, list):
+        for valeur in objet:
+            _sources(valeur, trouvees)
+    return trouvees
+
+
+def tailles_sources(chemin_html):
+    """Octets occupés par chaque ColumnDataSource dans le document Bokeh d'un fichier HTML généré,
+    par taille décroissante : renvoie (taille du fichier, [(nom, octets), ...])."""
+    with open(chemin_html, encoding = 'utf-8') as f:
+        html = f.read()
+    tailles = []
+    for document in re.findall(r'<script type="application/json" id="[^"]*">\s*(.*?)\s*</script>', html, re.S):
+        for nom, donnees in _sources(json.loads(document), []):
+            tailles.append((nom, len(json.dumps(donnees, separators = (',', ':')))))
+    tailles.sort(key = lambda taille: -taille[1])
+    return os.path.getsize(chemin_html), tailles
+
+
+def rapport_tailles(chemin_html):
+    """Affiche la taille de chaque ColumnDataSource dans un fichier HTML généré."""
+    total, tailles = tailles_sources(chemin_html)
+    print(f"{chemin_html} : {total:,} octets")
+    for nom, octets in tailles:
+        print(f"  {nom:<30} {octets:>12,} octets ({100 * octets / total:5.1f} %)")
+    return total, tailles
+
+
+##### Chargement différé des onglets #####
+
+# Types des tableaux binaires écrits à côté du HTML, et leur équivalent JavaScript
+TYPES_BINAIRES = {'float32': 'Float32Array', 'float64': 'Float64Array', 'int8': 'Int8Array', 'int16': 'Int16Array',
+                  'int32': 'Int32Array', 'uint8': 'Uint8Array', 'uint16': 'Uint16Array', 'uint32': 'Uint32Array'}
+
+CHARGER_ONGLET = """
+    // Sources de l'onglet activé, chargées une seule fois depuis les fichiers écrits à côté du HTML
+    const onglet = cb_obj.active;
+    if (cb_obj.tags.includes(onglet) || !onglets.has(onglet)) {
+        return;
+    }
+    cb_obj.tags = [...cb_obj.tags, onglet];
+    const debut = performance.now();
+
+    (async () => {
+        for (const [source, manifeste, filtres] of onglets.get(onglet)) {
+            const description = await (await fetch(dossier + "/" + manifeste)).json();
+            const data = {};
+            for (const [colonne, contenu] of Object.entries(description.colonnes)) {
+                if (contenu.fichier !== undefined) {
+                    const octets = await (await fetch(dossier + "/" + contenu.fichier)).arrayBuffer();
+                    data[colonne] = new globalThis[types.get(contenu.type)](octets);
+                } else {
+                    data[colonne] = contenu.valeurs;
+                }
+            }
+            source.data = data;
+            description.filtres.forEach((indices, i) => { filtres[i].indices = indices; });
+        }
+        console.log(`Onglet ${onglet} chargé en ${(performance.now() - debut).toFixed(1)} ms`);
+    })().catch((erreur) => console.error(`Chargement de l'onglet ${onglet} impossible`, erreur));
+"""
+
+
+def _en_liste(valeurs):
+    if isinstance(valeurs, np.ndarray):
+        return valeurs.tolist()
+    return [_en_liste(valeur) if isinstance(valeur, np.ndarray) else valeur for valeur in valeurs]
+
+
+def _ecrire_source(source, filtres, dossier, nom):
+    """Écrit les colonnes d'une source (tableaux numériques en binaire, le reste en JSON) et son manifeste."""
+    colonnes = {}
+    for colonne, valeurs in source.data.items():
+        tableau = valeurs if isinstance(valeurs, np.ndarray) else None
+        if tableau is not None and tableau.ndim == 1 and tableau.dtype.kind in 'iuf':
+            if tableau.dtype.name not in TYPES_BINAIRES:
+                tableau = tableau.astype(np.float64)
+            fichier = f"{nom}.{colonne}.bin"
+            tableau.astype(tableau.dtype.newbyteorder('<')).tofile(os.path.join(dossier, fichier))
+            colonnes[colonne] = {'fichier': fichier, 'type': tableau.dtype.name}
+        else:
+            colonnes[colonne] = {'valeurs': _en_liste(valeurs)}
+    manifeste = f"{nom}.json"
+    with open(os.path.join(dossier, manifeste), 'w', encoding = 'utf-8') as f:
+        json.dump({'colonnes': colonnes, 'filtres': [filtre.indices for filtre in filtres]}, f)
+    return manifeste
+
+
+def differer_onglets(tabs, chemin_html):
+    """Sort les données des onglets non affichés au départ dans des fichiers à côté du HTML.
+
+    Elles sont chargées par le navigateur (fetch) à la première activation de l'onglet : le document servi
+    au départ ne contient que les données de l'onglet actif. Le HTML doit alors être servi en HTTP
+    (par exemple avec python -m http.server), les navigateurs refusant fetch() sur file://.
+    Renvoie le nombre d'octets écrits dans les fichiers annexes.
+    """
+    dossier = os.path.splitext(chemin_html)[0] + "_donnees"
+    shutil.rmtree(dossier, ignore_errors = True)
+    os.makedirs(dossier)
+
+    sources_onglet_actif = set(tabs.tabs[tabs.active].select({'type': ColumnDataSource}))
+    onglets = {}
+    for i, onglet in enumerate(tabs.tabs):
+        if i == tabs.active:
+            continue
+        rendus = list(onglet.select({'type': GlyphRenderer}))
+        a_charger = []
+        for source in onglet.select({'type': ColumnDataSource}):
+            if source in sources_onglet_actif:
+                continue
+            # Filtres par indices des vues de la source : vidés avec elle puis restaurés au chargement
+            filtres = [rendu.view.filter for rendu in rendus if rendu.data_source is source
+                       and isinstance(rendu.view.filter, IndexFilter) and rendu.view.filter.indices is not None]
+            manifeste = _ecrire_source(source, filtres, dossier, source.name or source.id)
+            source.data = {colonne: [] for colonne in source.data}
+            for filtre in filtres:
+                filtre.indices = []
+            a_charger.append([source, manifeste, filtres])
+        if a_charger:
+            onglets[i] = a_charger
+
+    tabs.js_on_change('active', CustomJS(args = dict(onglets = onglets, dossier = os.path.basename(dossier),
+                                                      types = TYPES_BINAIRES), code = CHARGER_ONGLET))
+    return sum(os.path.getsize(os.path.join(dossier, fichier)) for fichier in os.listdir(dossier))
+
+
+# Temps jusqu'au premier rendu, depuis le début de la navigation, affiché dans la console du navigateur
+MESURE_PREMIER_RENDU = """
+    requestAnimationFrame(() => console.log(`Premier rendu : ${performance.now().toFixed(1)} ms après le début du chargement`));
+"""
+
+
+def mesurer_premier_rendu(document):
+    document.js_on_event('document_ready', CustomJS(code = MESURE_PREMIER_RENDU))
@@ -0,0 +1,781 @@
+import numpy as np
+from bokeh.document import Document
+from bokeh.io import save
+from bokeh.resources import CDN
+from bokeh.plotting import figure, show, ColumnDataSource, output_file
+from bokeh.models import CDSView, IndexFilter, Dropdown, CustomJS, BasicTicker, PrintfTickFormatter, TabPanel, Tabs, Div, Select, HoverTool, FactorRange, Switch, DataTable, TableColumn
+from bokeh.layouts import row, column
+from bokeh.palettes import Reds8
+from bokeh.transform import cumsum, linear_cmap, log_cmap, transform
+from math import pi
+from cube import JOURS_SEMAINE, LIBELLES_AXES, TOUTES
+from carte import CELLULES_ECRAN, MAX_POINTS_BRUTS, coor_wgs84_to_web_mercator, niveau_pour_largeur, points_bruts_visibles, points_couche
+from export import coder, compacter, differer_onglets, mesurer_premier_rendu, plus_petit_entier, rapport_tailles, survol_codes, traduire_codes
+from points_chauds import RAYON
+from vehicules import CATEGORIES, NON_SPECIFIE
+
+##### Figures du tableau de bord : seul module qui importe Bokeh, chargé au premier onglet construit #####
+
+
+#############################################################################################################################################
+################################################################# PIE CHART #################################################################
+#############################################################################################################################################
+
+def figure_vehicules(agregats):
+    """Onglet du nombre d'accidents par type de véhicule (pie chart ou barplot)."""
+    # Nombre d'accidents par type de vehicule, sans les non specifies car trop nombreux et mauvaise visualisation des resultats par la suite
+    data = agregats['vehicules'].reset_index(name='nb_accident').rename(columns={'index': 'type_vehicule'})
+
+    #####################
+    ##### PIE CHART #####
+    #####################
+
+    # Calculer les angles et les couleurs : chaque catégorie garde sa couleur, quelles que soient celles présentes dans la région
+    data['angle'] = data['nb_accident'] / data['nb_accident'].sum() * 2 * pi
+    data['color'] = [Reds8[CATEGORIES.index(categorie)] for categorie in data['type_vehicule']]
+
+    # Une seule source pour le pie chart et le barplot
+    source_vehicules = ColumnDataSource(data, name = 'source_vehicules')
+
+    # Créer un graphique en secteurs (pie chart)
+    p_pie = figure(title = "Accidents en fonction du véhicule", 
+                   x_range=(-0.5, 1.0),
+                   height = 500, 
+                   toolbar_location = None,
+                   tools = "hover", 
+                   tooltips = "@type_vehicule: @nb_accident")
+
+    # Dessiner les secteurs
+    p_pie.wedge(x = 0, y = 1, radius = 0.4,
+            start_angle = cumsum('angle', include_zero=True), end_angle = cumsum('angle'),
+            line_color = "white", fill_color = 'color', legend_field = 'type_vehicule', source = source_vehicules)
+
+    # Paramètres du graphique
+    p_pie.axis.axis_label = None
+    p_pie.axis.visible = False
+    p_pie.grid.grid_line_color = None
+
+    ####################
+    ##### BARPLOT #####
+    ###################
+
+    # Créer un graphique en barplot
+    p_barre = figure(title = "Accidents en fonction du véhicule", 
+                x_range = data['type_vehicule'], y_axis_label = 'Nombre d\'accidents', 
+                height = 500,
+                toolbar_location = None, 
+                tools = "")
+
+    # Ajouter les barres
+    p_barre.vbar(x = 'type_vehicule', top = 'nb_accident', width = 0.9, color = '#922B21', source=source_vehicules)
+
+    #Création de l'outil
+    outilsurvol = HoverTool(tooltips = [('Véhicule','@type_vehicule'), ( 'Nombre', '@nb_accident' )])
+    p_barre.add_tools(outilsurvol)
+
+    # Paramètres du graphique
+    p_barre.xgrid.grid_line_color = None
+    p_barre.y_range.start = 0
+    p_barre.y_range.end = 10000
+
+    # Modifier l'orientation des noms sur l'axe des x
+    p_barre.xaxis.major_label_orientation = 45  # Angle de 45 degrés
+
+    ################################################
+    ##### Pouvoir choisir le type de graphique #####
+    ################################################
+
+    # Masquer le barplot par défaut
+    p_barre.visible = False
+
+    # Créer un Select pour choisir entre pie chart et barplot
+    select = Select(title="Choisir le type de graphique", options=["Pie Chart", "Barplot"], value="Pie Chart")
+
+    # Callback JavaScript pour changer le type de graphique en fonction de la sélection
+    callback = CustomJS(args=dict(p_pie=p_pie, p_barre=p_barre), code="""
+        if (cb_obj.value === "Pie Chart") {
+            p_pie.visible = true;
+            p_barre.visible = false;
+        } else {
+            p_pie.visible = false;
+            p_barre.visible = true;
+        }
+    """)
+
+    # Associer la fonction JavaScript à la sélection du Select
+    select.js_on_change('value', callback)
+
+    # Afficher les graphiques et le Select dans une mise en page
+    pie_barre = column(select, p_pie, p_barre)
+
+    #### Commentaire
+
+    ## Commentaire graphique croisières ---
+    text_p_barre = Div(text="""<h1> Analyse </h1> 
+            <p> Les voitures sont le type de véhicule le plus impliqué dans les accidents à Rennes, avec une partition de 60% des accuidents globaux.
+                Elles sont ensuite suivies des deux-roues motorisés et des vélos qui sont impliqués dans 20% des accidents.
+                Les autres types de véhicules sont beaucoup moins impliqués dans les accidents.<br><br>
+           
+                En revanche, le graphique ne montre pas la gravité des accidents ni les facteurs qui y contribuent.
+                Il est possible que les accidents impliquant des deux-roues motorisés soient plus graves que les accidents impliquant des voitures.
+                Ou que les véhicules soient plus susceptibles d'être impliqués dans des accidents en raison de facteurs tels
+                que la vitesse, la distraction au volant ou l'état des routes.
+            </p>""", styles={'text-align':'justify','color':'black','background-color':'lavender','padding':'15px','border-radius':'10px', 'max-width':'500px'})
+
+    return TabPanel(child=row(text_p_barre, column(pie_barre)), title="Nombre d'accidents en fonction du type de véhicule")
+
+
+
+##########################################################################################################################################
+################################################################ HEAT MAP ################################################################
+##########################################################################################################################################
+
+def categories_filtrables():
+    """Choix du filtre par type de véhicule : toutes les catégories, puis chacune des catégories connues."""
+    return [TOUTES] + [categorie for categorie in CATEGORIES if categorie != NON_SPECIFIE]
+
+
+# Choix d'une tranche du cube embarquée : les tranches sont rangées bout à bout, dans l'ordre des options des menus
+TRANCHE_HEATMAP = """
+    const n = source.data.nb.length;
+    const debut = (annees.indexOf(choix_annee.value) * categories.length + categories.indexOf(choix_categorie.value)) * n;
+    const nb = tranches.data.nb.slice(debut, debut + n);
+    // Bornes de la palette : plus petit et plus grand compte non nuls (les cases vides restent transparentes)
+    let bas = Infinity, haut = 0;
+    for (const v of nb) {
+        if (v > 0) { bas = Math.min(bas, v); haut = Math.max(haut, v); }
+    }
+    mapper.low = Number.isFinite(bas) ? bas : 1;
+    mapper.high = Math.max(haut, mapper.low);
+    source.data = {...source.data, nb: nb};
+"""
+
+
+def figure_heatmap(agregats):
+    """Onglet de la heatmap des accidents par jour de la semaine et heure, filtrable par année et type de véhicule."""
+    # Nombre d'accidents pour chaque case 'jsem' x 'heure' (cases vides comprises)
+    heatmap_data = agregats['heatmap']
+
+    # Définir l'ordre des jours de la semaine selon votre préférence
+    ordre_jours_semaine = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
+
+    # Heures au format '00'..'23' pour l'axe catégoriel
+    heures = [f'{h:02d}' for h in range(24)]
+
+    # Convertir en ColumnDataSource : jours et heures envoyés en codes entiers, traduits par le navigateur avec leurs tables
+    codes_jours, _ = coder(heatmap_data['jsem'], ordre_jours_semaine)
+    heatmap_data_cvs = ColumnDataSource(data=compacter(dict(jsem=codes_jours, heure=heatmap_data['heure'], nb=heatmap_data['nb'])), name='heatmap_data_cvs')
+
+    # Utiliser FactorRange pour spécifier l'ordre des jours de la semaine sur l'axe Y
+    x_range = FactorRange(factors=ordre_jours_semaine)
+
+    # Créer une palette de couleurs
+    colors = ["#75968f", "#a5bab7", "#c9d9d3", "#e2e2e2", "#dfccce", "#ddb7b1", "#cc7878", "#933b41", "#550b1d"]
+
+    # Liste des outils
+    TOOLS = "hover,save,pan,box_zoom,reset,wheel_zoom"
+
+    # Créer un graphique de type heatmap
+    heat_map = figure(title="Accident de la route par jour de la semaine et heure",
+            x_range = x_range, 
+            y_range = [heures[h] for h in reversed(np.unique(heatmap_data.heure[heatmap_data.nb > 0]))],
+            x_axis_location="above", width=600, height=600,
+            tools=TOOLS, toolbar_location='below',
+            tooltips=[('Heure/Jour', '@heure{custom} @jsem{custom}'), ('Nombre', '@nb')])
+    heat_map.hover.formatters = {'@heure': survol_codes(heures), '@jsem': survol_codes(ordre_jours_semaine)}
+
+    # Supprimer les axes
+    heat_map.grid.grid_line_color = None
+    heat_map.axis.axis_line_color = None
+    heat_map.axis.major_tick_line_color = None
+    heat_map.axis.major_label_text_font_size = "7px"
+    heat_map.axis.major_label_standoff = 0
+    heat_map.xaxis.major_label_orientation = 0
+
+    # Réalisation de la heatmap avec les axes inversés
+    non_nuls = heatmap_data.nb[heatmap_data.nb > 0]
+    couleurs = linear_cmap("nb", colors, low=non_nuls.min(), high=non_nuls.max(), low_color="rgba(0, 0, 0, 0)")
+    r = heat_map.rect(x=transform("jsem", traduire_codes(ordre_jours_semaine)), y=transform("heure", traduire_codes(heures)), width=1, height=1, source=heatmap_data_cvs,
+            fill_color=couleurs,
+            line_color=None)
+
+    # Ajouter une légende
+    heat_map.add_layout(r.construct_color_bar(
+        major_label_text_font_size="7px",
+        ticker=BasicTicker(desired_num_ticks=len(colors)),
+        formatter=PrintfTickFormatter(format="%d"),
+        label_standoff=6,
+        border_line_color=None,
+        padding=5,), 'right')
+
+    # Filtres côté client : tranches (année, catégorie, jour, heure) du cube, la première année valant toutes les années
+    cube = agregats['cube']
+    annees = [int(annee) for annee in agregats['annees']['annee']]
+    categories = categories_filtrables()
+    tranches = cube.tranche(garder=('annee', 'jsem', 'heure', 'categorie'), mesures=['nb'], annee=annees, jsem=JOURS_SEMAINE, categorie=categories)[0].transpose(0, 3, 1, 2)
+    tranches = np.concatenate([tranches.sum(axis=0, keepdims=True), tranches])
+    tranches_heatmap = ColumnDataSource(data=dict(nb=plus_petit_entier(tranches.ravel())), name='tranches_heatmap')
+
+    choix_annee = Select(title="Année", value=TOUTES, options=[TOUTES] + [str(annee) for annee in annees])
+    choix_categorie = Select(title="Type de véhicule", value=TOUTES, options=categories)
+    callback = CustomJS(args=dict(source=heatmap_data_cvs, tranches=tranches_heatmap, mapper=couleurs.transform, choix_annee=choix_annee,
+                                  choix_categorie=choix_categorie, annees=choix_annee.options, categories=categories), code=TRANCHE_HEATMAP)
+    choix_annee.js_on_change('value', callback)
+    choix_categorie.js_on_change('value', callback)
+
+
+    #### Commentaire
+    text_t_map = Div(text=""" <h1> Analyse du heat map </h1> 
+            <p> Le heat map présenté met en lumière une tendance claire concernant les accidents de la route : les journées les plus accidentogènes sont les vendredis,
+                      avec un pic notable à 8h du matin. Cette observation s'accompagne d'une corrélation avec les heures de pointe, indiquant une concentration des
+                      accidents durant les trajets domicile-travail. En revanche, les week-ends sont globalement moins marqués par les accidents, avec une absence totale
+                      d'incidents sur certains créneaux horaires du dimanche. <br><br>
+                 
+                     Ces informations précieuses pourraient servir à cibler des campagnes de sensibilisation et des mesures préventives en vue de réduire le nombre d'accidents,
+                      en particulier durant les heures et les jours identifiés comme les plus à risque.
+
+    Ces informations précieuses pourraient servir à cibler des campagnes de sensibilisation et des mesures préventives en vue de réduire le nombre d'accidents, en particulier durant les heures et les jours identifiés comme les plus à risque.
+            </p>""",styles={'text-align':'justify','color':'black','background-color':'lavender','padding':'15px','border-radius':'10px', 'max-width':'600px'})
+
+    return TabPanel(child=row(text_t_map, column(row(choix_annee, choix_categorie), heat_map)), title="Accident de la route par jour et heure de la semaine")
+
+
+
+########################################################################################################################
+############################################### CARTE ##################################################################
+########################################################################################################################
+
+def ajouter_points_chauds(p_carte, usager, points_chauds):
+    """Calque des points chauds : un cercle par point chaud, masquable depuis la légende."""
+    source = ColumnDataSource(data=compacter(dict(
+        x=points_chauds['x'], y=points_chauds['y'],
+        # Rayon affiché : dispersion des accidents autour du centre, plus la demi-largeur du voisinage de détection
+        rayon=points_chauds['rayon'] + RAYON,
+        **{colonne: points_chauds[colonne] for colonne in ('rang', 'nb', 'ntu', 'nbh', 'nbnh', 'premiere_annee', 'derniere_annee', 'annees_actives')},
+    )), name=f'points_chauds_{usager}')
+    rendu = p_carte.circle(x='x', y='y', radius='rayon', source=source, fill_color='#F39C12', fill_alpha=0.35,
+                           line_color='#7E5109', line_width=2, legend_label="Points chauds")
+    p_carte.add_tools(HoverTool(renderers=[rendu], tooltips=[('Point chaud', 'n°@rang'), ('Accidents', '@nb'), ('Tués', '@ntu'),
+                                                             ('Blessés hospitalisés', '@nbh'), ('Blessés', '@nbnh'),
+                                                             ('Années', '@premiere_annee - @derniere_annee (@annees_actives années avec accident)')]))
+    p_carte.legend.location = "top_left"
+    p_carte.legend.click_policy = "hide"
+
+
+def creer_carte(usager, titre, points_cartes, centre, cellules = None, points_chauds = None):
+    """Carte des accidents d'un type d'usager, filtrée par année ; avec les cellules (None pour une carte
+    non agrégée), grilles selon le zoom.
+
+    Renvoie la figure, le filtre des points, les tranches des années et les paramètres du niveau de détail
+    (None sans agrégation) attendus par les callbacks JavaScript.
+    """
+    # Trop de points en mode agrégé : ils ne sont pas envoyés, et le filtre par année n'a plus de tranche à afficher
+    couche = points_cartes['couches'][usager]
+    points_bruts = cellules is None or len(couche['indices']) <= MAX_POINTS_BRUTS
+    offsets = couche['offsets'] if points_bruts else {}
+
+    # Créer une source de données pour les points d'accident (seules copies des coordonnées de la carte)
+    x, y = points_couche(points_cartes, usager, ('x', 'y')) if points_bruts else (np.array([]), np.array([]))
+    source = ColumnDataSource(data=compacter(dict(x=x, y=y)), name=f'source_{usager}')
+
+    # Les points de l'année sont filtrés par une vue sur la source
+    filtre = IndexFilter()
+
+    # Création de la figure avec axes géographiques, centrée sur la région
+    x_centre, y_centre = coor_wgs84_to_web_mercator(centre[1], centre[0])
+    p_carte = figure(title = titre,
+               x_axis_type = "mercator",
+               y_axis_type = "mercator",
+               x_range=(x_centre - 10000, x_centre + 10000),
+               y_range=(y_centre - 10000, y_centre + 10000),
+               active_scroll = "wheel_zoom")
+
+    #Ajout d'un arrière plan de carte
+    p_carte.add_tile("CartoDB Positron")
+
+    # Ajouter les points d'accident à la carte
+    rendu_points = p_carte.circle(x='x', y='y', size=5, color='#922B21', alpha=1, source=source, view=CDSView(filter=filtre))
+
+    if points_chauds is not None and len(points_chauds):
+        ajouter_points_chauds(p_carte, usager, points_chauds)
+
+    if cellules is None:
+        return p_carte, filtre, offsets, None
+
+    ##### Agrégation multi-résolution (--agregation-carte) #####
+
+    # Au lieu d'un glyphe par accident : grilles de plus en plus fines selon le zoom, les points bruts n'apparaissant
+    # qu'au zoom le plus fort (et seulement s'ils sont peu nombreux). Le nombre de glyphes envoyés reste borné.
+    cellules, tailles, offsets_cellules = cellules
+    largeur = p_carte.x_range.end - p_carte.x_range.start
+    cle = f"{niveau_pour_largeur(tailles, largeur)}/Total"
+    debut, fin = offsets_cellules.get(cle, (0, 0))
+    filtre_cellules = IndexFilter(indices = list(range(debut, fin)), tags = [cle])
+
+    rendu_cellules = p_carte.rect(x='x', y='y', width='taille', height='taille', source=ColumnDataSource(data=compacter(cellules), name=f'cellules_{usager}'),
+                                  view=CDSView(filter=filtre_cellules), line_color=None, fill_alpha=0.7,
+                                  fill_color=log_cmap('nb', Reds8[::-1], low=1, high=max(cellules['nb'].max(), 1)))
+    p_carte.add_tools(HoverTool(renderers=[rendu_cellules], tooltips=[('Accidents', '@nb')]))
+
+    rendu_points.visible = points_bruts and points_bruts_visibles(tailles, largeur)
+    rendu_cellules.visible = not rendu_points.visible
+    return p_carte, filtre, offsets, [p_carte, filtre_cellules, rendu_cellules, rendu_points, offsets_cellules, tailles, points_bruts]
+
+
+def figure_cartes(points_cartes, region, centre, cellules = None, points_chauds = None):
+    """Onglet des cartes des accidents de vélo et de piéton, avec le calque des points chauds."""
+    titre_velo = f"Cartographie des accidents de vélo à {region}"
+    titre_pieton = f"Cartographie des accidents de piéton à {region}"
+
+    ################################
+    ##### Carte pour les vélos #####
+    ################################
+
+    p_carte_velo, filtre_velo, offsets_velo, lod_velo = creer_carte('velo', titre_velo, points_cartes, centre,
+                                                                    None if cellules is None else cellules['velo'],
+                                                                    None if points_chauds is None else points_chauds['velo'])
+    p_carte_velo.visible = True
+
+    ##################################
+    ##### Carte pour les piétons #####
+    ##################################
+
+    p_carte_pieton, filtre_pieton, offsets_pieton, lod_pieton = creer_carte('pieton', titre_pieton, points_cartes, centre,
+                                                                            None if cellules is None else cellules['pieton'],
+                                                                            None if points_chauds is None else points_chauds['pieton'])
+    p_carte_pieton.visible = False
+
+    cartes_lod = [lod for lod in (lod_velo, lod_pieton) if lod is not None]
+
+    #############################################
+    ##### Pouvoir switch entre les 2 cartes #####
+    #############################################
+
+    # Texte d'information
+    info_text = Div(text="<b>Pouvoir switch entre les cartes des vélos et des piétons</b>")
+
+    # Création du widget Switch
+    switch = Switch(active=True)
+
+    # Définition de la fonction de rappel JavaScript pour basculer entre les cartes
+    callback = CustomJS(args=dict(p_carte_velo=p_carte_velo, p_carte_pieton=p_carte_pieton), code="""
+        if (this.active) {
+            p_carte_velo.visible = true;
+            p_carte_pieton.visible = false;
+        } else {
+            p_carte_velo.visible = false;
+            p_carte_pieton.visible = true;
+        }
+    """)
+    switch.js_on_change("active", callback)
+
+    ##### Menu pour choisir l'année #####
+
+    # Labels pour les années : toutes celles des accidents chargés, de la première à la dernière
+    annees_points = points_cartes['annee']
+    LABELS = ["Total"] + ([str(annee) for annee in range(int(annees_points.min()), int(annees_points.max()) + 1)] if len(annees_points) else [])
+
+    # Création du menu déroulant pour choisir l'année
+    annee_menu = Dropdown(label="Choix de l'année", menu=[(str(year), str(year)) for year in LABELS])
+
+    # Définition de la fonction de rappel JavaScript pour sélectionner l'année
+    callback_annee = CustomJS(args=dict(offsets_velo=offsets_velo, offsets_pieton=offsets_pieton, filtre_velo=filtre_velo, filtre_pieton=filtre_pieton, p_carte_velo=p_carte_velo, p_carte_pieton=p_carte_pieton, titre_velo=titre_velo, titre_pieton=titre_pieton), code="""
+        const selected_year = cb_obj.item;
+        const debut_clic = performance.now();
+
+        // Indices des points de l'année : la tranche [début, fin) précalculée, sans parcourir les données
+        // "Total" supprime le filtre et affiche tous les points
+        function tranche(offsets) {
+            if (selected_year === "Total") {
+                return null;
+            }
+            const [debut, fin] = offsets.get(selected_year) ?? [0, 0];
+            const indices = new Array(fin - debut);
+            for (let i = 0; i < indices.length; i++) {
+                indices[i] = debut + i;
+            }
+            return indices;
+        }
+
+        // Mettre à jour les filtres des vues : seuls les points de l'année sont dessinés
+        filtre_velo.indices = tranche(offsets_velo);
+        filtre_pieton.indices = tranche(offsets_pieton);
+
+        // Mettre à jour le titre de la carte
+        if (selected_year === "Total") {
+            p_carte_velo.title.text = titre_velo + " (Total)";
+            p_carte_pieton.title.text = titre_pieton + " (Total)";
+        } else {
+            p_carte_velo.title.text = titre_velo + " en " + selected_year;
+            p_carte_pieton.title.text = titre_pieton + " en " + selected_year;
+        }
+
+        // Latence clic -> rendu, mesurée à l'image suivante
+        requestAnimationFrame(() => console.log(`Année ${selected_year} : rendu en ${(performance.now() - debut_clic).toFixed(1)} ms`));
+    """)
+
+
+
+    # Liaison du callback JavaScript à l'événement de sélection d'année dans le menu déroulant
+    annee_menu.js_on_event('menu_item_click', callback_annee)
+
+    # Changement de niveau de détail au zoom et à chaque choix d'année
+    if cartes_lod:
+        callback_lod = CustomJS(args=dict(cartes=cartes_lod, annee_menu=annee_menu, cellules_ecran=CELLULES_ECRAN), code="""
+            // Année courante : mémorisée dans les tags du menu
+            if (cb_obj.item !== undefined) {
+                annee_menu.tags = [cb_obj.item];
+            }
+            const annee = annee_menu.tags.length > 0 ? annee_menu.tags[0] : "Total";
+
+            for (const [p, filtre, rendu_cellules, rendu_points, offsets, tailles, points_bruts] of cartes) {
+                // Niveau le plus fin qui garde au plus cellules_ecran cellules sur la largeur visible
+                const largeur = p.x_range.end - p.x_range.start;
+                let niveau = 0;
+                while (niveau + 1 < tailles.length && largeur / tailles[niveau + 1] <= cellules_ecran) {
+                    niveau++;
+                }
+
+                // Points bruts quand même la grille la plus fine est trop grossière
+                const afficher_points = points_bruts && largeur / tailles[tailles.length - 1] < cellules_ecran / 2;
+                rendu_points.visible = afficher_points;
+                rendu_cellules.visible = !afficher_points;
+
+                // Grilles par année embarquées pour les niveaux grossiers seulement : au plus fin de ceux qui ont l'année
+                while (niveau > 0 && annee !== "Total" && !offsets.has(niveau + "/" + annee)) {
+                    niveau--;
+                }
+
+                // Tranche des cellules du niveau et de l'année, seulement si elle a changé
+                const cle = niveau + "/" + annee;
+                if (filtre.tags[0] !== cle) {
+                    const [debut, fin] = offsets.get(cle) ?? [0, 0];
+                    const indices = new Array(fin - debut);
+                    for (let i = 0; i < indices.length; i++) {
+                        indices[i] = debut + i;
+                    }
+                    filtre.indices = indices;
+                    filtre.tags = [cle];
+                }
+            }
+        """)
+        annee_menu.js_on_event('menu_item_click', callback_lod)
+        for p_carte in [p_carte_velo, p_carte_pieton]:
+            p_carte.x_range.js_on_change('end', callback_lod)
+
+    # Affichage de la mise en page
+    cartes = column(row(switch, info_text), row(p_carte_velo, p_carte_pieton, annee_menu))
+
+
+    #### Commentaire
+    text_carte = Div(text=""" <h1> Analyse cartographique </h1> 
+            <p> L'analyse de la carte des accidents de la route à Rennes, complétée par une étude des données statistiques, permet d'identifier plusieurs facteurs contribuant
+                      à la concentration d'accidents dans certaines zones :
+                <br>
+                     <ul>
+                     <li> Sur la rocade
+                        <ul>
+                            <li> Vitesse excessive : La vitesse élevée combinée à un sentiment de sécurité trompeur incite au dépassement des limitations et augmente les risques d'accidents graves.</li>
+                            <li> Fatigue au volant : La monotonie des trajets et la longueur des parcours favorisent la fatigue, diminuant les réflexes et la vigilance.</li>
+                            <li> Trafic dense : Le trafic congestionné génère du stress et incite aux comportements à risque (queues de poisson, dépassements dangereux).</li>
+                        </ul>
+                    </li>
+                    <li> En centre-ville
+                        <ul>
+                            <li> Mixité des usages : La cohabitation de piétons, cyclistes, voitures et transports en commun crée des interactions complexes et des points de conflit potentiels.</li>
+                            <li> Réseau routier complexe : La présence d'un réseau ancien, peu lisible, avec de nombreuses intersections et une signalisation parfois confuse, augmente les risques d'accidents.</li>
+                            <li> Manque de visibilité : Des éléments urbains (bâtiments, végétation) peuvent limiter la visibilité des piétons et cyclistes, augmentant les risques d'accidents.</li>
+
+            </p>""",styles={'text-align':'justify','color':'black','background-color':'lavender','padding':'15px','border-radius':'10px', 'max-width':'750px'})
+
+    return TabPanel(child=row(cartes, column(text_carte)), title="Cartographie des accidents")
+
+
+##########################################################################
+##### Carte des accidents par quartier (--quartiers FICHIER.geojson) #####
+##########################################################################
+
+def figure_quartiers(contours_quartiers, region, centre):
+    """Onglet du nombre d'accidents par quartier."""
+    source_quartiers = ColumnDataSource(data=contours_quartiers, name='source_quartiers')
+
+    x_centre, y_centre = coor_wgs84_to_web_mercator(centre[1], centre[0])
+    p_quartiers = figure(title = f"Nombre d'accidents par quartier à {region}",
+               x_axis_type = "mercator",
+               y_axis_type = "mercator",
+               x_range=(x_centre - 10000, x_centre + 10000),
+               y_range=(y_centre - 10000, y_centre + 10000),
+               active_scroll = "wheel_zoom",
+               tooltips = [('Quartier', '@nom'), ('Nombre', '@nb')])
+    p_quartiers.add_tile("CartoDB Positron")
+    p_quartiers.patches(xs='xs', ys='ys', source=source_quartiers, line_color='white', fill_alpha=0.7,
+                        fill_color=linear_cmap('nb', Reds8[::-1], low=min(contours_quartiers['nb']), high=max(contours_quartiers['nb'])))
+
+    return TabPanel(child=p_quartiers, title="Accidents par quartier")
+
+
+####################################################################################
+##### Score de risque des tronçons (--reseau FICHIER.geojson, voir risque.py) #####
+####################################################################################
+
+# Colonnes du classement affiché à côté de la carte
+COLONNES_RISQUE = {'rang': 'Rang', 'nom': 'Tronçon', 'score': 'Score', 'nb': 'Accidents', 'ntu': 'Tués', 'nbh': 'Blessés hospitalisés',
+                   'nbnh': 'Blessés légers', 'dernier_accident': 'Dernier accident'}
+
+
+def figure_risque(risque, region, centre):
+    """Onglet des tronçons les plus à risque : tracés colorés par score sur la carte et classement."""
+    traces = risque['traces']
+    premiers = risque['troncons'].head(len(set(traces['rang'])))
+    source_traces = ColumnDataSource(data=traces, name='source_traces_risque')
+    source_troncons = ColumnDataSource(data={**{colonne: premiers[colonne].to_numpy() for colonne in ('rang', 'nom', 'nb', 'ntu', 'nbh', 'nbnh')},
+                                             'score': premiers['score'].round(2).to_numpy(),
+                                             'dernier_accident': premiers['dernier_accident'].dt.strftime('%d/%m/%Y').to_numpy(),
+                                             'x': premiers['x'].to_numpy(np.float32), 'y': premiers['y'].to_numpy(np.float32)},
+                                       name='source_troncons_risque')
+
+    x_centre, y_centre = coor_wgs84_to_web_mercator(centre[1], centre[0])
+    p_risque = figure(title = f"Tronçons les plus à risque à {region} (gravité et ancienneté des accidents)",
+               x_axis_type = "mercator",
+               y_axis_type = "mercator",
+               x_range=(x_centre - 10000, x_centre + 10000),
+               y_range=(y_centre - 10000, y_centre + 10000),
+               active_scroll = "wheel_zoom")
+    p_risque.add_tile("CartoDB Positron")
+    couleur = linear_cmap('score', Reds8[::-1], low=min(traces['score'], default=0), high=max(traces['score'], default=1))
+    p_risque.multi_line(xs='xs', ys='ys', source=source_traces, line_width=4, line_color=couleur)
+    # Un cercle par tronçon (centre de gravité) : les carrefours n'ont pas de tracé
+    cercles = p_risque.scatter(x='x', y='y', source=source_troncons, size=8, line_color='black', fill_alpha=0.8, fill_color=couleur)
+    p_risque.add_tools(HoverTool(renderers = [cercles], tooltips = [('Rang', '@rang'), ('Tronçon', '@nom'), ('Score', '@score'),
+                                                                    ('Accidents', '@nb'), ('Tués', '@ntu'), ('Dernier accident', '@dernier_accident')]))
+
+    classement = DataTable(source=source_troncons, columns=[TableColumn(field=colonne, title=titre) for colonne, titre in COLONNES_RISQUE.items()],
+                           index_position=None, width=700, height=600)
+
+    return TabPanel(child=row(p_risque, classement), title="Tronçons à risque")
+
+
+
+#################################################################################################################################################
+################################################################### EVOLUTION ###################################################################
+#################################################################################################################################################
+
+# Ordonnées proposées par le menu et mesure du cube correspondante
+MESURES_EVOLUTION = {'Nombre d\'accidents': 'nb', 'Tué': 'ntu', 'Blessés hospitalisés': 'nbh', 'Blessés': 'nbnh'}
+
+# Niveaux de l'onglet d'évolution (menu des périodes) et fenêtres de moyenne glissante proposées pour chacun
+NIVEAUX_EVOLUTION = {'Année': 'annee', 'Mois': 'mois', 'Semaine ISO': 'semaine', 'Jour': 'jour'}
+FENETRES_EVOLUTION = {'annee': ['3 ans'], 'mois': ['3 mois', '12 mois'], 'semaine': ['4 semaines', '13 semaines', '52 semaines'],
+                      'jour': ['7 jours', '30 jours', '365 jours']}
+SANS_MOYENNE = 'Aucune'
+
+# Millisecondes par jour : les périodes sont embarquées en jours depuis le 1er janvier 1970
+MS_JOUR = 86400000
+
+# La série affichée est une tranche (niveau, catégorie, mesure) des séries embarquées : la source reçoit de nouvelles
+# colonnes, sans agrégation dans le navigateur. La moyenne glissante des dernières périodes se calcule par somme courante.
+TRANCHE_EVOLUTION = """
+    function libelle(niveau, jour) {
+        const date = new Date(jour * ms_jour);
+        const jj = String(date.getUTCDate()).padStart(2, "0");
+        const mm = String(date.getUTCMonth() + 1).padStart(2, "0");
+        const aaaa = date.getUTCFullYear();
+        if (niveau == "annee") {
+            return String(aaaa);
+        }
+        if (niveau == "mois") {
+            return mm + "/" + aaaa;
+        }
+        if (niveau == "semaine") {
+            // Semaine ISO : numérotée dans l'année de son jeudi
+            const jeudi = new Date((jour + 3) * ms_jour);
+            const numero = Math.floor(((jour + 3) * ms_jour - Date.UTC(jeudi.getUTCFullYear(), 0, 1)) / (7 * ms_jour)) + 1;
+            return jeudi.getUTCFullYear() + "-S" + String(numero).padStart(2, "0") + " (du " + jj + "/" + mm + "/" + aaaa + ")";
+        }
+        return jj + "/" + mm + "/" + aaaa;
+    }
+
+    if (cb_obj.item !== undefined) {
+        menu.tags = [cb_obj.item];
+    }
+    const mesure = menu.tags.length ? menu.tags[0] : mesures[0];
+    const niveau = niveaux.get(choix_niveau.value);
+
+    // Nouveau niveau : ses fenêtres de moyenne glissante (changer la valeur du menu relance ce callback)
+    const options = [sans_moyenne].concat(fenetres.get(niveau));
+    if (choix_moyenne.options.join() != options.join()) {
+        choix_moyenne.options = options;
+        if (!options.includes(choix_moyenne.value)) {
+            choix_moyenne.value = sans_moyenne;
+            return;
+        }
+    }
+
+    const [debut_periodes, n, debut_valeurs] = decoupage.get(niveau);
+    const debut = debut_valeurs + (categories.indexOf(choix_categorie.value) * mesures.length + mesures.indexOf(mesure)) * n;
+    const y = Array.from(series.data.valeurs.slice(debut, debut + n));
+    let jour = 0;
+    const jours = Array.from(periodes.data.ecart, (ecart) => jour += ecart).slice(debut_periodes, debut_periodes + n);
+
+    // Moyenne des `fenetre` dernières périodes, sans valeur tant que la fenêtre n'est pas pleine
+    const fenetre = choix_moyenne.value == sans_moyenne ? 0 : parseInt(choix_moyenne.value);
+    const moyenne = new Array(n).fill(NaN);
+    let somme = 0;
+    for (let i = 0; fenetre > 0 && i < n; i++) {
+        somme += y[i] - (i >= fenetre ? y[i - fenetre] : 0);
+        if (i >= fenetre - 1) {
+            moyenne[i] = somme / fenetre;
+        }
+    }
+
+    source.data = {x: jours.map((jour) => jour * ms_jour), y: y, moyenne: moyenne, periode: jours.map((jour) => libelle(niveau, jour))};
+    ligne_moyenne.visible = fenetre > 0;
+    ligne_accidents.glyph.line_width = niveau == "annee" ? 3 : 1;
+    const categorie = choix_categorie.value == categories[0] ? "" : " (" + choix_categorie.value + ")";
+    p.title.text = mesure + " à " + region + " au cours du temps" + categorie;
+"""
+
+
+def figure_evolution(agregats, region):
+    """Onglet de l'évolution des accidents par année, mois, semaine ISO ou jour, avec moyenne glissante, filtrable par type de véhicule."""
+    # Séries (niveau, catégorie, mesure, période) de toutes les combinaisons des menus, cumulées depuis la série journalière
+    categories = categories_filtrables()
+    colonnes_categories = [LIBELLES_AXES['categorie'].index(categorie) for categorie in categories]
+    niveaux = agregats['serie'].niveaux(list(MESURES_EVOLUTION.values()))
+    debuts, valeurs, decoupage = [], [], {}
+    for niveau, (jours, series) in niveaux.items():
+        # [début des périodes, nombre de périodes, début des valeurs] du niveau dans les tableaux embarqués
+        decoupage[niveau] = [sum(map(len, debuts)), len(jours), sum(map(len, valeurs))]
+        debuts.append(jours)
+        valeurs.append(series[:, :, colonnes_categories].transpose(2, 0, 1).ravel())
+    # Premiers jours des périodes embarqués par écarts successifs (presque tous égaux) : ils se compressent bien mieux
+    periodes_evolution = ColumnDataSource(data=compacter(dict(ecart=np.diff(np.concatenate(debuts), prepend=0))), name='periodes_evolution')
+    series_evolution = ColumnDataSource(data=dict(valeurs=plus_petit_entier(np.concatenate(valeurs))), name='series_evolution')
+
+    # Série affichée au départ : nombre d'accidents par année, toutes catégories
+    jours, series = niveaux['annee']
+    donnees_ligne = ColumnDataSource({'x': jours * float(MS_JOUR),
+                                      'y': series[0, :, 0],
+                                      'moyenne': np.full(len(jours), np.nan),
+                                      'periode': [str(annee) for annee in jours.astype('datetime64[D]').astype('datetime64[Y]').astype(np.int64) + 1970]},
+                                     name='donnees_ligne')
+
+    # Evolution du nombre d'accident dans la région (menu pour sélectionner nbtu, nbh, nbnh)
+    p_ligne = figure(title=f"Evolution des accidents à {region} au cours du temps", x_axis_type = 'datetime', x_axis_label = 'Période', y_axis_label = 'Nombre')
+    ligne_accidents = p_ligne.line(x = 'x', y = 'y', source=donnees_ligne, line_color = '#922B21', line_width = 3)
+    ligne_moyenne = p_ligne.line(x = 'x', y = 'moyenne', source=donnees_ligne, line_color = '#1F618D', line_width = 3, visible = False)
+
+    # Ajouter un survol pour afficher les valeurs
+    outilsurvol = HoverTool(renderers = [ligne_accidents], tooltips = [( 'Période', '@periode'), ( 'Nombre', '@y' ), ('Moyenne glissante', '@moyenne{0.0}')])
+    p_ligne.add_tools(outilsurvol)
+
+    # Ajouter un menu déroulant pour choisir l'ordonnée
+    menu = Dropdown(label = "Choix des ordonnées", menu = [('Nombre d\'accidents', 'Nombre d\'accidents'),
+                                                           ('Tué', 'Tué'),
+                                                           ('Blessés hospitalisés', 'Blessés hospitalisés'),
+                                                           ('Blessés', 'Blessés')])
+
+    choix_categorie = Select(title = "Type de véhicule", value = TOUTES, options = categories)
+    choix_niveau = Select(title = "Période", value = 'Année', options = list(NIVEAUX_EVOLUTION))
+    choix_moyenne = Select(title = "Moyenne glissante", value = SANS_MOYENNE, options = [SANS_MOYENNE] + FENETRES_EVOLUTION['annee'])
+
+    callback = CustomJS(args = dict(p = p_ligne, source = donnees_ligne, series = series_evolution, periodes = periodes_evolution, menu = menu,
+                                    choix_categorie = choix_categorie, choix_niveau = choix_niveau, choix_moyenne = choix_moyenne,
+                                    ligne_accidents = ligne_accidents, ligne_moyenne = ligne_moyenne, categories = categories,
+                                    mesures = list(MESURES_EVOLUTION), niveaux = NIVEAUX_EVOLUTION, fenetres = FENETRES_EVOLUTION,
+                                    decoupage = decoupage, sans_moyenne = SANS_MOYENNE, ms_jour = MS_JOUR, region = region), code = TRANCHE_EVOLUTION)
+
+    menu.js_on_event('menu_item_click', callback)
+    for choix in (choix_categorie, choix_niveau, choix_moyenne):
+        choix.js_on_change('value', callback)
+
+    evolution = row(p_ligne, column(menu, choix_categorie, choix_niveau, choix_moyenne))
+
+    #### Commentaire
+    text_evolution = Div(text=""" <h1> Analyse de l'évolution </h1> 
+            <p> Analyse des graphiques d'accidents à Rennes
+
+            Les quatre graphiques présentés illustrent l'évolution des accidents de la route à Rennes sur une période de 10 ans (2014-2023).
+            <br>
+            <ul>
+                <li> <b> Nombre d'accidents </b> : on peut voir sur ce graphique qu'il y a un pique du nombre d'accidents en 2016 à plus de 600 accidents. Par la suite le nombre d'accidents diminue pour atteindre un minimum en 2020 à un peu plus de 400 accidents. </li>
+                     
+                <li> <b> Tués </b> : ce graphique met en évidence un pique en 2016 avec 16 personnes mortes du à des accidents routiers cette année, ce pique est pourtant précédé du plus petit nombre de mort, 2 tués, en 2015.</li>
+
+                <li> <b> Blessés hospitalisés </b> : Le nombre d'accidents à Rennes est en baisse sur 10 ans, diminuant de 25%. On observe cependant des variations d'une année à l'autre. La baisse la plus forte a eu lieu entre 2020 et 2022. Tandis que le plus haut pique a été enregistré en 2017, avec 152 personnes bléssées</li>
+                     
+                <li> <b> Blessés </b> : ce graphique indique le nombre de blessés au court du temps. On constate que après 2016 où le pique de blessés a été de 630, une diminution se laisse entrevoir. Pour atteindre son plus bas en 2020, et par la suite remonter subitement.</li>
+            </ul>
+                     
+            <br>
+            <b> Conclusion</b>
+                     
+            <br>
+            L'analyse de ces graphiques permet de dresser un constat global de la situation des accidents de la route à Rennes. 
+            Si la tendance générale est à la baisse du à la pandémie de COVID-19, des points d'attention subsistent, notamment les accidents corporels graves et mortels.
+            Des actions ciblées de prévention et d'aménagement pourraient être mises en œuvre pour réduire encore le nombre d'accidents et améliorer la sécurité routière à Rennes.
+
+
+            </p>""",styles={'text-align':'justify','color':'black','background-color':'lavender','padding':'15px','border-radius':'10px', 'max-width':'700px'})
+
+    return TabPanel(child=row(evolution, column(text_evolution)), title="Evolution des accidents")
+
+
+
+#############################################################################################################################################
+################################################################# INTERFACE #################################################################
+#############################################################################################################################################
+
+def etape_tableau_de_bord(onglet_vehicules, onglet_evolution, onglet_heatmap, onglet_cartes, onglet_quartiers = None, onglet_risque = None):
+    """Mise en page finale : présentation et onglets."""
+    onglets_optionnels = [onglet for onglet in (onglet_quartiers, onglet_risque) if onglet is not None]
+    tabs_graphique = Tabs(tabs = [onglet_vehicules, onglet_evolution, onglet_heatmap, onglet_cartes] + onglets_optionnels)
+
+    text_presentation = Div(text=""" <h1> Analyse des accidents dans la ville de Rennes </h1>  
+
+            <div style="display:flex; align-items:center;">
+                <p> 
+                Notre projet s'est concentré sur l'analyse des données d'accidents routiers survenus à Rennes entre 2012 et 2022. 
+                Nous avons examiné l'évolution des incidents impliquant des blessés, des décès, etc., ainsi que leur répartition géographique à l'aide
+                d'une carte des lieux d'accidents. De plus, nous avons étudié la répartition des accidents selon les types de véhicules impliqués, ainsi
+                que les horaires et les jours où les accidents sont les plus fréquents. 
+                Ces analyses fournissent un aperçu pour informer les politiques de sécurité routière et les efforts de prévention des
+                accidents dans la région de Rennes.</p>
+
+                <img src="Projet/accident.jpeg" alt="photo_accident" style="width:400px; height:auto; margin-left:20px;">
+            </div>
+            """,styles={'text-align':'justify','color':'black','background-color':'lavender','padding':'0px','border-radius':'10px', 'max-width':'1500px'})
+
+    return column(row(text_presentation),row(tabs_graphique))
+
+
+
+#################################################################################################################################################
+################################################################### AFFICHAGE ###################################################################
+#################################################################################################################################################
+
+def etape_sortie(tableau_de_bord, region, sortie, onglets_differes, rapport_taille, afficher = True):
+    """Écrit le fichier HTML du tableau de bord et, sauf afficher = False, l'ouvre dans le navigateur."""
+    # Un document par tableau de bord : un processus peut en écrire plusieurs (mode régions)
+    document = Document()
+    document.add_root(tableau_de_bord)
+
+    # Temps jusqu'au premier rendu affiché dans la console du navigateur
+    mesurer_premier_rendu(document)
+
+    # Données des onglets non actifs dans des fichiers annexes, chargées à la première ouverture de l'onglet
+    if onglets_differes:
+        octets_annexes = differer_onglets(tableau_de_bord.select_one({'type': Tabs}), sortie)
+
+    if afficher:
+        output_file(sortie)
+        show(tableau_de_bord)
+    else:
+        save(tableau_de_bord, filename = sortie, resources = CDN, title = f"Accidents à {region}")
+
+    # Taille de chaque source de données dans le fichier généré
+    if rapport_taille:
+        rapport_tailles(sortie)
+        if onglets_differes:
+            print(f"Fichiers annexes des onglets : {octets_annexes:,} octets")
+    return sortie
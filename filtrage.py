@@ -0,0 +1,181 @@
+import argparse
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from agregats import USAGERS
+from carte import coor_wgs84_to_web_mercator
+from chargement import FICHIER_ACCIDENTS, charger_accidents
+from cube import JOURS_SEMAINE
+from vehicules import CATEGORIES, NON_SPECIFIE, classer_vehicules
+
+##### Filtres calculés côté serveur, avec cache LRU (mode bokeh serve) #####
+
+# Gravité d'un accident : la plus grave de ses conséquences. Le filtre garde les accidents au moins aussi graves.
+GRAVITES = ['Tous', 'Blessés légers', 'Blessés hospitalisés', 'Tués']
+
+# Nombre de combinaisons de filtres gardées en mémoire
+TAILLE_CACHE = 256
+
+# Côté des cellules de la carte, en mètres Web Mercator : seuls les comptes par cellule sont envoyés
+TAILLE_CELLULE = 250
+
+# Calculs lancés hors de la boucle du serveur, pour qu'une session ne bloque pas les autres
+PROCESSUS_LEGERS = 4
+
+# Clé du cache : None pour un critère non filtré, gravité = indice dans GRAVITES
+Filtre = namedtuple('Filtre', ['annee_min', 'annee_max', 'categorie', 'usager', 'jour', 'gravite'])
+
+
+class JeuFiltrable:
+    """Colonnes des accidents sous forme de tableaux NumPy, filtrées et agrégées à la demande.
+
+    Les agrégats de chaque filtre sont mémorisés dans un cache LRU borné ; ils sont partagés entre les
+    sessions et ne doivent pas être modifiés.
+    """
+
+    def __init__(self, accident, taille_cache = TAILLE_CACHE):
+        self.lignes = len(accident)
+        self.annee = accident['annee'].to_numpy()
+        self.jour = pd.Categorical(accident['jsem'].astype(str), categories = JOURS_SEMAINE).codes.astype(np.int16)
+        self.heure = accident['heure'].to_numpy().astype(np.int16)
+
+        # Catégories de véhicule impliquées : un bit par catégorie
+        self.codes = classer_vehicules(accident)
+        self.categories = np.bitwise_or.reduce(np.left_shift(1, self.codes.astype(np.int32)), axis = 1)
+
+        self.usagers = {usager: (accident[usager] == "Oui").to_numpy() for usager in USAGERS}
+        self.ntu, self.nbh, self.nbnh = (accident[colonne].to_numpy() for colonne in ('ntu', 'nbh', 'nbnh'))
+        self.gravite = np.select([self.ntu > 0, self.nbh > 0, self.nbnh > 0], [3, 2, 1], 0).astype(np.int8)
+
+        # Cellule de la carte de chaque accident : indice dans la liste des cellules non vides
+        x, y = coor_wgs84_to_web_mercator(accident['longitude'].to_numpy(dtype = float), accident['latitude'].to_numpy(dtype = float))
+        cellules, self.cellule = np.unique(np.stack([np.floor(x / TAILLE_CELLULE), np.floor(y / TAILLE_CELLULE)]), axis = 1, return_inverse = True)
+        self.centres_cellules = (cellules + 0.5) * TAILLE_CELLULE
+
+        self.annees = (int(self.annee.min()), int(self.annee.max())) if self.lignes else (0, 0)
+        self.agregats = lru_cache(maxsize = taille_cache)(self._calculer)
+        self._verrou = threading.Lock()
+        self._duree_calculs = 0.0
+
+    def masque(self, filtre):
+        """Lignes retenues par un filtre (tableau de booléens)."""
+        masque = (self.annee >= filtre.annee_min) & (self.annee <= filtre.annee_max)
+        if filtre.categorie is not None:
+            masque &= (self.categories & (1 << CATEGORIES.index(filtre.categorie))) != 0
+        if filtre.usager is not None:
+            masque &= self.usagers[filtre.usager]
+        if filtre.jour is not None:
+            masque &= self.jour == JOURS_SEMAINE.index(filtre.jour)
+        if filtre.gravite:
+            masque &= self.gravite >= filtre.gravite
+        return masque
+
+    def _calculer(self, filtre):
+        debut = time.perf_counter()
+        masque = self.masque(filtre)
+        annee = self.annee[masque] - self.annees[0]
+        nb_annees = self.annees[1] - self.annees[0] + 1
+
+        vehicules = np.bincount(self.codes[masque].ravel(), minlength = len(CATEGORIES))
+        # Jour de semaine absent ou inconnu (code -1) : l'accident compte partout sauf dans la heatmap
+        jour_connu = masque & (self.jour >= 0)
+        heatmap = np.bincount(self.jour[jour_connu] * 24 + self.heure[jour_connu], minlength = 7 * 24)
+        nb_cellule = np.bincount(self.cellule[masque], minlength = self.centres_cellules.shape[1])
+        non_vides = np.flatnonzero(nb_cellule)
+
+        resultat = {
+            'lignes': int(masque.sum()),
+            'vehicules': {'categorie': [categorie for categorie in CATEGORIES if categorie != NON_SPECIFIE],
+                          'nb': np.delete(vehicules, CATEGORIES.index(NON_SPECIFIE))},
+            'heatmap': {'jsem': np.repeat(JOURS_SEMAINE, 24), 'heure': np.tile([f'{h:02d}' for h in range(24)], 7), 'nb': heatmap},
+            'annees': {'annee': np.arange(self.annees[0], self.annees[1] + 1),
+                       'nb': np.bincount(annee, minlength = nb_annees),
+                       **{colonne: np.bincount(annee, weights = valeurs[masque], minlength = nb_annees).astype(np.int64)
+                          for colonne, valeurs in (('ntu', self.ntu), ('nbh', self.nbh), ('nbnh', self.nbnh))}},
+            'cellules': {'x': self.centres_cellules[0, non_vides], 'y': self.centres_cellules[1, non_vides], 'nb': nb_cellule[non_vides]},
+        }
+        with self._verrou:
+            self._duree_calculs += time.perf_counter() - debut
+        return resultat
+
+    def metriques(self):
+        """Requêtes, succès et échecs du cache, taux de succès et durée moyenne d'un calcul."""
+        informations = self.agregats.cache_info()
+        requetes = informations.hits + informations.misses
+        return {'requetes': requetes, 'succes': informations.hits, 'echecs': informations.misses,
+                'taux_succes': informations.hits / requetes if requetes else 0.0,
+                'taille': informations.currsize, 'taille_max': informations.maxsize,
+                'calcul_moyen_ms': 1000 * self._duree_calculs / informations.misses if informations.misses else 0.0}
+
+
+# Jeu de données et exécuteur partagés par toutes les sessions du processus serveur
+_JEUX = {}
+_VERROU_JEUX = threading.Lock()
+_EXECUTEUR = None
+
+
+def jeu_partage(fichier = FICHIER_ACCIDENTS, taille_cache = TAILLE_CACHE):
+    """Jeu filtrable d'un fichier, chargé une seule fois par processus."""
+    with _VERROU_JEUX:
+        if fichier not in _JEUX:
+            _JEUX[fichier] = JeuFiltrable(charger_accidents(fichier), taille_cache)
+        return _JEUX[fichier]
+
+
+def executeur():
+    global _EXECUTEUR
+    with _VERROU_JEUX:
+        if _EXECUTEUR is None:
+            _EXECUTEUR = ThreadPoolExecutor(PROCESSUS_LEGERS, thread_name_prefix = 'filtrage')
+        return _EXECUTEUR
+
+
+##### Simulation de sessions concurrentes #####
+
+def simuler(jeu, sessions, requetes, graine = 0):
+    """Chaque session (un thread) envoie des filtres tirés au hasard, les plus simples plus souvent.
+    Renvoie les latences en millisecondes."""
+    def session(numero):
+        rng = np.random.default_rng(graine + numero)
+        latences = []
+        for _ in range(requetes):
+            if rng.random() < 0.5:
+                annees = jeu.annees
+            else:
+                debut_annees = int(rng.integers(jeu.annees[0], jeu.annees[1] + 1))
+                annees = (debut_annees, int(rng.integers(debut_annees, jeu.annees[1] + 1)))
+            filtre = Filtre(*annees,
+                            rng.choice([None] * 4 + CATEGORIES[:3]), rng.choice([None, None, *USAGERS]),
+                            rng.choice([None] * 7 + JOURS_SEMAINE), int(rng.choice(len(GRAVITES), p = [0.7, 0.1, 0.1, 0.1])))
+            debut = time.perf_counter()
+            jeu.agregats(filtre)
+            latences.append(1000 * (time.perf_counter() - debut))
+        return latences
+
+    with ThreadPoolExecutor(sessions) as pool:
+        return np.concatenate([np.asarray(latences) for latences in pool.map(session, range(sessions))])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Charge de sessions concurrentes sur les filtres côté serveur et taux de succès du cache")
+    parser.add_argument('fichier', nargs = '?', default = FICHIER_ACCIDENTS)
+    parser.add_argument('--sessions', type = int, default = 8)
+    parser.add_argument('--requetes', type = int, default = 200, help = "requêtes par session")
+    parser.add_argument('--taille-cache', type = int, default = TAILLE_CACHE)
+    args = parser.parse_args()
+
+    jeu = JeuFiltrable(charger_accidents(args.fichier), args.taille_cache)
+    debut = time.perf_counter()
+    latences = simuler(jeu, args.sessions, args.requetes)
+    duree = time.perf_counter() - debut
+    metriques = jeu.metriques()
+    print(f"{len(latences)} requêtes en {duree:.2f} s ({len(latences) / duree:,.0f} requêtes/s), "
+          f"latence médiane {np.median(latences):.2f} ms, p95 {np.percentile(latences, 95):.2f} ms")
+    print(f"Cache : {metriques['taux_succes']:.1%} de succès ({metriques['succes']} / {metriques['requetes']}), "
+          f"{metriques['taille']} / {metriques['taille_max']} entrées, calcul moyen {metriques['calcul_moyen_ms']:.2f} ms")
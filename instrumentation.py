@@ -0,0 +1,117 @@
+import cProfile
+import json
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+##### Instrumentation des étapes du pipeline (--instrumentation) #####
+
+
+def compter_lignes(objet):
+    """Nombre de lignes d'un résultat d'étape : longueur des tables et tableaux, somme pour les conteneurs
+    (un dictionnaire de colonnes de même longueur compte pour une table). None si rien ne se compte."""
+    if isinstance(objet, (pd.DataFrame, pd.Series, np.ndarray)):
+        return len(objet)
+    if isinstance(objet, dict):
+        colonnes = {len(valeur) for valeur in objet.values() if isinstance(valeur, (pd.Series, np.ndarray, list))}
+        if len(colonnes) == 1 and not any(isinstance(valeur, pd.DataFrame) for valeur in objet.values()):
+            return colonnes.pop()
+        valeurs = objet.values()
+    elif isinstance(objet, (list, tuple)):
+        valeurs = objet
+    else:
+        return None
+    comptes = [compte for compte in map(compter_lignes, valeurs) if compte is not None]
+    return sum(comptes) if comptes else None
+
+
+def _sources(resultat):
+    """Noms des ColumnDataSource d'un résultat d'étape qui est un objet Bokeh."""
+    if not hasattr(resultat, 'select'):
+        return []
+    from bokeh.models import ColumnDataSource
+    return [source.name or source.id for source in resultat.select({'type': ColumnDataSource})]
+
+
+class Instrumentation:
+    """Mesures de chaque étape exécutée : durée, temps CPU, lignes en entrée et en sortie, pic de mémoire allouée
+    (tracemalloc) et, une fois le HTML écrit, taille de ses ColumnDataSource.
+
+    N'est créée qu'à la demande : sans elle le pipeline appelle les étapes directement. Avec `profil`, chaque étape
+    est aussi passée sous cProfile et seul le profil de la plus lente est écrit (les durées incluent alors le
+    surcoût du profileur).
+    """
+
+    def __init__(self, profil = None):
+        self.mesures = []
+        self.profil = profil
+        self._plus_lente = None
+        tracemalloc.start()
+
+    def mesurer(self, nom, fonction, arguments, cache = False):
+        memoire_depart, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        profileur = cProfile.Profile() if self.profil else None
+
+        debut, debut_cpu = time.perf_counter(), time.process_time()
+        if profileur is not None:
+            profileur.enable()
+        try:
+            resultat = fonction(**arguments)
+        finally:
+            if profileur is not None:
+                profileur.disable()
+        duree, cpu = time.perf_counter() - debut, time.process_time() - debut_cpu
+        _, pic = tracemalloc.get_traced_memory()
+
+        lignes_entree = [compte for compte in map(compter_lignes, arguments.values()) if compte is not None]
+        self.mesures.append({
+            'etape': nom,
+            'cache': cache,
+            'secondes': round(duree, 4),
+            'cpu_secondes': round(cpu, 4),
+            'lignes_entree': sum(lignes_entree) if lignes_entree else None,
+            'lignes_sortie': compter_lignes(resultat),
+            'pic_alloue_mo': round((pic - memoire_depart) / 2 ** 20, 2),
+            'sources': {source: None for source in _sources(resultat)},
+        })
+        if profileur is not None and (self._plus_lente is None or duree > self._plus_lente[0]):
+            self._plus_lente = (duree, nom, profileur)
+        return resultat
+
+    def ajouter_tailles_sources(self, tailles):
+        """Octets de chaque source dans le HTML, rattachés à la première étape qui l'a créée."""
+        tailles = dict(tailles)
+        for mesure in self.mesures:
+            for source in mesure['sources']:
+                if source in tailles:
+                    mesure['sources'][source] = tailles.pop(source)
+
+    def rapport(self):
+        return {
+            'etapes': self.mesures,
+            'total_secondes': round(sum(mesure['secondes'] for mesure in self.mesures), 4),
+            'profil': self._plus_lente and {'etape': self._plus_lente[1], 'fichier': self.profil},
+        }
+
+    def resume(self):
+        print(f"{'étape':<28} {'durée':>9} {'CPU':>9} {'lignes entrée':>14} {'lignes sortie':>14} {'pic alloué':>12} {'sources':>12}")
+        for mesure in self.mesures:
+            lignes = [f"{compte:,}" if compte is not None else '-' for compte in (mesure['lignes_entree'], mesure['lignes_sortie'])]
+            octets = sum(octets or 0 for octets in mesure['sources'].values())
+            print(f"{mesure['etape'] + (' (cache)' if mesure['cache'] else ''):<28} {mesure['secondes']:>7.3f} s {mesure['cpu_secondes']:>7.3f} s"
+                  f" {lignes[0]:>14} {lignes[1]:>14} {mesure['pic_alloue_mo']:>9.1f} Mo {octets / 1024:>9.1f} Ko")
+
+    def terminer(self, chemin_rapport):
+        """Arrête les mesures, écrit le rapport JSON (et le profil de l'étape la plus lente) et affiche le résumé."""
+        tracemalloc.stop()
+        if self._plus_lente is not None:
+            self._plus_lente[2].dump_stats(self.profil)
+        with open(chemin_rapport, 'w', encoding = 'utf-8') as f:
+            json.dump(self.rapport(), f, indent = 1)
+        self.resume()
+        if self._plus_lente is not None:
+            print(f"Profil de l'étape la plus lente ({self._plus_lente[1]}) : {self.profil}")
+        print(f"Rapport d'instrumentation : {chemin_rapport}")
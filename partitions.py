@@ -0,0 +1,217 @@
+import argparse
+import functools
+import itertools
+import json
+import operator
+import os
+import shutil
+import time
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from chargement import TAILLE_BLOC, lire_csv, lire_par_blocs, trier_par_date
+from validation import ANNEES, EMPRISE, ajouter_options_validation, options_validation
+
+##### Jeu de données partitionné : Parquet par année (et département), filtres poussés à la lecture des fichiers #####
+
+DOSSIER_PARTITIONS = "accidents_partitionnes"
+
+# Colonnes de partition, dans l'ordre des sous-dossiers (annee=AAAA/departement=DD), avec leur type
+PARTITIONS = {'annee': pa.int16(), 'departement': pa.string()}
+
+# Lignes par groupe de lignes Parquet : les statistiques min / max de chaque groupe (dates, coordonnées...)
+# permettent à la lecture de sauter ceux qu'un filtre exclut
+LIGNES_PAR_GROUPE = 64 * 1024
+
+
+def partitionnement(departement):
+    champs = ['annee'] + (['departement'] if departement else [])
+    return ds.partitioning(pa.schema([(champ, PARTITIONS[champ]) for champ in champs]), flavor = 'hive')
+
+
+def par_departement(dossier):
+    """Vrai si le jeu est aussi partitionné par département."""
+    return any(nom.startswith('departement=') for _, dossiers, _ in os.walk(dossier) for nom in dossiers)
+
+
+def _schema(table):
+    """Schéma commun à tous les blocs : catégories en dictionnaires de textes à indices int32 (la largeur des indices
+    dépend du bloc, et une colonne vide dans le premier bloc n'a pas de type), avec l'ordre des colonnes des
+    accidents chargés depuis le CSV, que les colonnes de partition ne gardent pas."""
+    champs = [champ.with_type(pa.dictionary(pa.int32(), pa.string())) if pa.types.is_dictionary(champ.type) or pa.types.is_null(champ.type) else champ
+              for champ in table.schema]
+    return pa.schema(champs, metadata = {b'colonnes': json.dumps(table.column_names).encode('utf-8')})
+
+
+def convertir(chemin, dossier = DOSSIER_PARTITIONS, departement = None, taille_bloc = TAILLE_BLOC, annees_valides = ANNEES, emprise = EMPRISE):
+    """Convertit le CSV source en jeu Parquet partitionné, lu par blocs : un dossier annee=AAAA (puis departement=DD
+    si `departement` nomme la colonne du CSV qui le donne) par partition. Les lignes sont validées comme à la lecture
+    du CSV, avec les bornes `annees_valides` et `emprise` (invalides en quarantaine), et gardent l'ordre du fichier.
+    Un jeu existant est remplacé d'un seul renommage. Renvoie les partitions écrites."""
+    tables = (pa.Table.from_pandas(bloc.assign(departement = bloc.pop(departement).astype('string')) if departement else bloc,
+                                   preserve_index = False)
+              for bloc in lire_par_blocs(chemin, taille_bloc, colonnes = [departement] if departement else (),
+                                         annees_valides = annees_valides, emprise = emprise))
+    premiere = next(tables, None)
+    if premiere is None:
+        raise ValueError(f"Aucun accident valide dans {chemin}")
+    schema = _schema(premiere)
+    lots = (lot for table in itertools.chain([premiere], tables) for lot in table.cast(schema).to_batches())
+
+    temporaire = dossier + ".tmp"
+    shutil.rmtree(temporaire, ignore_errors = True)
+    partitions = set()
+    ds.write_dataset(pa.RecordBatchReader.from_batches(schema, lots), temporaire, format = 'parquet',
+                     partitioning = partitionnement(departement), preserve_order = True,
+                     min_rows_per_group = LIGNES_PAR_GROUPE, max_rows_per_group = LIGNES_PAR_GROUPE,
+                     file_visitor = lambda fichier: partitions.add(os.path.relpath(os.path.dirname(fichier.path), temporaire)))
+
+    # Remplacer l'ancien jeu : il n'est supprimé qu'une fois le nouveau en place
+    ancien = dossier + ".old"
+    shutil.rmtree(ancien, ignore_errors = True)
+    if os.path.exists(dossier):
+        os.rename(dossier, ancien)
+    os.rename(temporaire, dossier)
+    shutil.rmtree(ancien, ignore_errors = True)
+    return sorted(partitions)
+
+
+##### Lecture filtrée #####
+
+def jeu_partitionne(dossier, departements = None):
+    departement = par_departement(dossier)
+    if departements and not departement:
+        raise ValueError(f"Filtre par département impossible : {dossier} n'est partitionné que par année (convertir avec --departement)")
+    return ds.dataset(dossier, format = 'parquet', partitioning = partitionnement(departement))
+
+
+def expression_filtre(annees = None, departements = None, usagers = None):
+    """Expression Arrow des filtres de chargement (voir chargement.FILTRES), évaluée pendant la lecture : les partitions
+    d'années ou de départements exclus ne sont pas ouvertes, ni les groupes de lignes que leurs statistiques excluent."""
+    conditions = []
+    if annees:
+        conditions.append((ds.field('annee') >= annees[0]) & (ds.field('annee') <= annees[1]))
+    if departements:
+        conditions.append(ds.field('departement').isin([str(departement) for departement in departements]))
+    if usagers:
+        conditions.append(functools.reduce(operator.or_, [ds.field(usager) == "Oui" for usager in usagers]))
+    return functools.reduce(operator.and_, conditions) if conditions else None
+
+
+def colonnes_lues(jeu, colonnes = None):
+    """Colonnes demandées (toutes par défaut), dans l'ordre des accidents chargés depuis le CSV."""
+    ordre = json.loads(jeu.schema.metadata[b'colonnes'])
+    ordre += [nom for nom in jeu.schema.names if nom not in ordre]
+    return [nom for nom in ordre if colonnes is None or nom in colonnes]
+
+
+def lire_partitions(dossier, annees = None, departements = None, usagers = None, colonnes = None):
+    """Accidents d'un jeu partitionné retenus par les filtres, comme charger_accidents() sur le CSV : mêmes colonnes
+    (ou les seules `colonnes`), triés par date. Avec des partitions par département, les accidents d'un même jour
+    suivent l'ordre des départements et non plus celui du fichier source."""
+    jeu = jeu_partitionne(dossier, departements)
+    accident = jeu.to_table(columns = colonnes_lues(jeu, colonnes), filter = expression_filtre(annees, departements, usagers)).to_pandas()
+    return trier_par_date(accident) if 'date' in accident else accident
+
+
+def lire_partitions_par_blocs(dossier, taille_bloc = TAILLE_BLOC, annees = None, departements = None, usagers = None):
+    """Mode flux : accidents retenus par les filtres, par blocs d'environ taille_bloc lignes, partition après partition."""
+    jeu = jeu_partitionne(dossier, departements)
+    lots, lignes = [], 0
+    for lot in jeu.to_batches(columns = colonnes_lues(jeu), filter = expression_filtre(annees, departements, usagers), batch_size = taille_bloc):
+        lots.append(lot)
+        lignes += lot.num_rows
+        if lignes >= taille_bloc:
+            yield pa.Table.from_batches(lots).to_pandas()
+            lots, lignes = [], 0
+    if lots:
+        yield pa.Table.from_batches(lots).to_pandas()
+
+
+def octets_a_lire(dossier, colonnes = None, **filtres):
+    """Octets (compressés) des colonnes que la lecture filtrée doit lire, d'après les métadonnées Parquet : colonnes
+    demandées et colonnes des filtres, dans les seuls groupes de lignes des partitions retenues que les statistiques
+    n'excluent pas (pieds de fichiers non comptés)."""
+    jeu = jeu_partitionne(dossier, filtres.get('departements'))
+    filtre = expression_filtre(**filtres)
+    noms = set(colonnes_lues(jeu, colonnes)) | set(filtres.get('usagers') or ())
+    total = 0
+    for fragment in jeu.get_fragments(filter = filtre):
+        metadonnees = fragment.metadata
+        for groupe in (fragment.subset(filtre, schema = jeu.schema) if filtre is not None else fragment).row_groups:
+            morceaux = metadonnees.row_group(groupe.id)
+            total += sum(morceaux.column(j).total_compressed_size for j in range(morceaux.num_columns) if morceaux.column(j).path_in_schema in noms)
+    return total
+
+
+##### Banc de lecture : octets lus par requête sélective, face à la lecture complète #####
+
+# Requêtes mesurées (arguments de lire_partitions) ; celles par département ne portent que sur un jeu partitionné ainsi
+REQUETES = {
+    'tout': {},
+    'piéton 2019-2022': {'annees': (2019, 2022), 'usagers': ['pieton']},
+    'piéton 2019-2022, département 35': {'annees': (2019, 2022), 'departements': ['35'], 'usagers': ['pieton']},
+    'vélo 2022, date et coordonnées': {'annees': (2022, 2022), 'usagers': ['velo'], 'colonnes': ['date', 'latitude', 'longitude']},
+}
+
+
+def octets_lus_processus():
+    """Octets lus par le processus depuis son lancement (Linux : rchar de /proc/self/io), None ailleurs."""
+    try:
+        with open('/proc/self/io') as f:
+            for ligne in f:
+                if ligne.startswith('rchar:'):
+                    return int(ligne.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _mesurer(lecture):
+    avant = octets_lus_processus()
+    debut = time.perf_counter()
+    accident = lecture()
+    duree = time.perf_counter() - debut
+    apres = octets_lus_processus()
+    return len(accident), duree, None if avant is None else apres - avant
+
+
+def banc_lecture(chemin, dossier = DOSSIER_PARTITIONS):
+    """Pour chaque requête : lignes, durée, octets que la lecture filtrée du jeu partitionné doit lire d'après les
+    métadonnées et octets réellement lus par le processus, face à la lecture du CSV entier (filtré ensuite)."""
+    lignes_csv, duree_csv, lus_csv = _mesurer(lambda: lire_csv(chemin))
+    octets_csv = lus_csv or os.path.getsize(chemin)
+    print(f"  {'CSV entier':<34} {lignes_csv:>10,} lignes  {octets_csv / 1e6:>8.1f} Mo lus {duree_csv:>6.2f} s")
+    resultats = []
+    for nom, requete in REQUETES.items():
+        if requete.get('departements') and not par_departement(dossier):
+            continue
+        lignes, duree, lus = _mesurer(lambda: lire_partitions(dossier, **requete))
+        resultats.append({'requete': nom, 'lignes': lignes, 'secondes': duree, 'octets_a_lire': octets_a_lire(dossier, **requete),
+                          'octets_lus': lus, 'secondes_csv': duree_csv, 'octets_csv': octets_csv})
+    for resultat in resultats:
+        lus = resultat['octets_lus']
+        print(f"  {resultat['requete']:<34} {resultat['lignes']:>10,} lignes  {resultat['octets_a_lire'] / 1e6:>8.2f} Mo à lire"
+              + (f", {lus / 1e6:.2f} Mo lus" if lus is not None else "")
+              + f" {resultat['secondes']:>6.2f} s  ({resultat['octets_a_lire'] / octets_csv:.1%} du CSV)")
+    return resultats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Conversion du CSV des accidents en jeu Parquet partitionné par année (et département)")
+    parser.add_argument('fichier', help = "fichier CSV des accidents")
+    parser.add_argument('--dossier', default = DOSSIER_PARTITIONS, help = "dossier du jeu partitionné (remplacé s'il existe)")
+    parser.add_argument('--departement', metavar = 'COLONNE', help = "colonne du CSV donnant le département, second niveau de partition")
+    parser.add_argument('--taille-bloc', type = int, default = TAILLE_BLOC)
+    parser.add_argument('--banc', action = 'store_true', help = "comparer ensuite les octets lus par des requêtes sélectives à ceux du CSV")
+    ajouter_options_validation(parser)
+    args = parser.parse_args()
+
+    debut = time.perf_counter()
+    partitions = convertir(args.fichier, args.dossier, args.departement, args.taille_bloc, **options_validation(args))
+    taille = sum(os.path.getsize(os.path.join(racine, nom)) for racine, _, noms in os.walk(args.dossier) for nom in noms)
+    print(f"{args.fichier} converti en {time.perf_counter() - debut:.2f} s : {len(partitions)} partitions, "
+          f"{taille / 1e6:.1f} Mo (CSV {os.path.getsize(args.fichier) / 1e6:.1f} Mo) dans {args.dossier}")
+    if args.banc:
+        banc_lecture(args.fichier, args.dossier)
@@ -0,0 +1,143 @@
+import hashlib
+import importlib
+import inspect
+import os
+import pickle
+import time
+
+from chargement import empreinte_fichier
+
+##### Pipeline d'étapes avec cache sur disque #####
+
+# Dossier des résultats d'étapes, adressés par le contenu de leurs entrées et de leur code
+DOSSIER_CACHE_ETAPES = ".cache_etapes"
+
+
+class Etape:
+    """Étape nommée du pipeline.
+
+    fonction est appelée avec des arguments nommés : le résultat de chaque étape de `entrees` et la valeur de
+    chaque option de `parametres`. Les options de `fichiers` sont des chemins dont le contenu entre dans la clé
+    de cache. Le code de la fonction et celui des `modules` listés en font aussi partie : l'étape n'est
+    recalculée que si l'une de ses entrées ou son code change. Les étapes dont le résultat ne se sérialise pas
+    (figures Bokeh) ou qui ont leur propre cache sont déclarées avec cache = False.
+    """
+
+    def __init__(self, nom, fonction, entrees = (), parametres = (), fichiers = (), modules = (), cache = True):
+        self.nom = nom
+        self.fonction = fonction
+        self.entrees = list(entrees)
+        self.parametres = list(parametres)
+        self.fichiers = list(fichiers)
+        self.modules = list(modules)
+        self.cache = cache
+
+    def empreinte_code(self):
+        sha = hashlib.sha256(inspect.getsource(self.fonction).encode('utf-8'))
+        for module in self.modules:
+            sha.update(inspect.getsource(importlib.import_module(module)).encode('utf-8'))
+        return sha.hexdigest()
+
+
+# Empreintes déjà calculées par le processus, par (chemin, taille, date de modification) : un gros fichier
+# n'est relu qu'une fois quand plusieurs pipelines le partagent (mode régions)
+_EMPREINTES = {}
+
+
+def empreinte_chemin(chemin):
+    """Empreinte d'un fichier (contenu) ou d'un dossier (noms, tailles et dates de ses fichiers)."""
+    if chemin is None or not os.path.exists(chemin):
+        return repr(chemin)
+    if os.path.isfile(chemin):
+        informations = os.stat(chemin)
+        cle = (os.path.abspath(chemin), informations.st_size, informations.st_mtime_ns)
+        if cle not in _EMPREINTES:
+            _EMPREINTES[cle] = empreinte_fichier(chemin)
+        return _EMPREINTES[cle]
+    sha = hashlib.sha256()
+    for racine, dossiers, fichiers in sorted(os.walk(chemin)):
+        dossiers.sort()
+        for nom in sorted(fichiers):
+            informations = os.stat(os.path.join(racine, nom))
+            sha.update(f"{os.path.relpath(os.path.join(racine, nom), chemin)}:{informations.st_size}:{informations.st_mtime_ns}".encode('utf-8'))
+    return sha.hexdigest()
+
+
+def _lire_pickle(chemin):
+    with open(chemin, 'rb') as f:
+        return pickle.load(f)
+
+
+class Pipeline:
+    """Exécute les étapes demandées et, à la demande, celles dont elles dépendent (sauf si leur résultat est en cache).
+
+    `resultats` donne le résultat d'étapes déjà calculées ailleurs (par exemple un jeu de données partagé) :
+    elles ne sont ni recalculées ni lues dans le cache.
+    """
+
+    def __init__(self, etapes, options, dossier_cache = DOSSIER_CACHE_ETAPES, utiliser_cache = True, bavard = True, instrumentation = None,
+                 resultats = None):
+        self.etapes = {etape.nom: etape for etape in etapes}
+        self.options = options
+        self.dossier_cache = dossier_cache
+        self.utiliser_cache = utiliser_cache
+        self.bavard = bavard
+        self.instrumentation = instrumentation
+        self.resultats = dict(resultats or {})
+        self.cles = {}
+
+    def cle(self, nom):
+        """Clé de contenu d'une étape : nom, code, clés des étapes d'entrée, valeur des paramètres et contenu des fichiers."""
+        if nom not in self.cles:
+            etape = self.etapes[nom]
+            sha = hashlib.sha256(nom.encode('utf-8'))
+            sha.update(etape.empreinte_code().encode('utf-8'))
+            for entree in etape.entrees:
+                sha.update(self.cle(entree).encode('utf-8'))
+            for parametre in etape.parametres:
+                sha.update(f"{parametre}={self.options.get(parametre)!r}".encode('utf-8'))
+            for fichier in etape.fichiers:
+                sha.update(empreinte_chemin(self.options.get(fichier)).encode('utf-8'))
+            self.cles[nom] = sha.hexdigest()[:20]
+        return self.cles[nom]
+
+    def chemin_cache(self, nom):
+        return os.path.join(self.dossier_cache, f"{nom}-{self.cle(nom)}.pkl")
+
+    def resultat(self, nom):
+        if nom in self.resultats:
+            return self.resultats[nom]
+        etape = self.etapes[nom]
+
+        chemin = self.chemin_cache(nom) if etape.cache and self.utiliser_cache else None
+        if chemin is not None and os.path.exists(chemin):
+            self.resultats[nom] = self._appeler(nom, _lire_pickle, {'chemin': chemin}, cache = True)
+            self._annoncer(f"étape {nom} : lue dans le cache")
+            return self.resultats[nom]
+
+        arguments = {entree: self.resultat(entree) for entree in etape.entrees}
+        arguments.update({parametre: self.options.get(parametre) for parametre in etape.parametres})
+        debut = time.perf_counter()
+        self.resultats[nom] = self._appeler(nom, etape.fonction, arguments)
+        self._annoncer(f"étape {nom} : calculée en {time.perf_counter() - debut:.2f} s")
+
+        if chemin is not None:
+            os.makedirs(self.dossier_cache, exist_ok = True)
+            temporaire = f"{chemin}.{os.getpid()}.tmp"
+            with open(temporaire, 'wb') as f:
+                pickle.dump(self.resultats[nom], f, protocol = pickle.HIGHEST_PROTOCOL)
+            os.replace(temporaire, chemin)
+        return self.resultats[nom]
+
+    def executer(self, noms):
+        """Exécute les étapes demandées (dans l'ordre) et renvoie leurs résultats."""
+        return {nom: self.resultat(nom) for nom in noms}
+
+    def _appeler(self, nom, fonction, arguments, cache = False):
+        if self.instrumentation is None:
+            return fonction(**arguments)
+        return self.instrumentation.mesurer(nom, fonction, arguments, cache)
+
+    def _annoncer(self, message):
+        if self.bavard:
+            print(message)
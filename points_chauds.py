@@ -0,0 +1,148 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from agregats import USAGERS
+from carte import coor_web_mercator_to_wgs84, coor_wgs84_to_web_mercator
+from chargement import FICHIER_ACCIDENTS, charger_accidents
+
+##### Points chauds : regroupements d'accidents sur une grille (sans calcul de distances deux à deux) #####
+
+# Côté des cellules de la grille, en mètres au sol : deux accidents d'un même point chaud sont à moins d'environ 2 cellules
+RAYON = 50
+
+# Nombre minimal d'accidents dans le voisinage 3 x 3 d'une cellule pour qu'elle soit dense, et dans un point chaud
+MIN_ACCIDENTS = 5
+
+# Points chauds gardés par carte, par rang
+NB_POINTS_CHAUDS = 50
+
+# Les 8 cellules voisines
+VOISINS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if (dx, dy) != (0, 0)]
+
+
+def _chercher(cles, valeurs):
+    """Position de chaque valeur dans le tableau trié cles, -1 si elle n'y est pas."""
+    positions = np.minimum(np.searchsorted(cles, valeurs), len(cles) - 1)
+    return np.where(cles[positions] == valeurs, positions, -1)
+
+
+def detecter_points_chauds(x, y, annees, gravites, rayon = RAYON, min_accidents = MIN_ACCIDENTS):
+    """Points chauds des accidents (x, y en Web Mercator), classés du plus au moins grand nombre d'accidents.
+
+    Les points sont comptés par cellule de côté `rayon` ; une cellule est dense quand son voisinage 3 x 3
+    contient au moins min_accidents accidents, et chaque sommet de densité réunit les cellules denses qui y
+    montent (regroupement par densité sur la grille). Les cellules sont indexées par tri : le tout est en
+    O(n log n), sans distance entre points. `gravites` est un dictionnaire {'ntu': ..., 'nbh': ..., 'nbnh': ...}.
+
+    Renvoie un DataFrame : rang, x, y (centre de gravité), longitude, latitude, rayon (écart quadratique moyen
+    au centre, en mètres Web Mercator), nb, sommes des gravités, premiere_annee, derniere_annee, annees_actives.
+    """
+    # Coordonnées float32 acceptées sans copie en float64 : les calculs avec la taille (float64) se font en float64
+    x = np.asarray(x)
+    y = np.asarray(y)
+    annees = np.asarray(annees)
+    colonnes = ['rang', 'x', 'y', 'longitude', 'latitude', 'rayon', 'nb', *gravites, 'premiere_annee', 'derniere_annee', 'annees_actives']
+    if len(x) == 0:
+        return pd.DataFrame({colonne: [] for colonne in colonnes})
+
+    # Les distances Web Mercator sont dilatées de 1 / cos(latitude) : cellules agrandies d'autant, à la latitude médiane
+    _, latitude = coor_web_mercator_to_wgs84(0.0, float(np.median(y)))
+    taille = rayon / np.cos(np.radians(latitude))
+
+    # Clé entière de la cellule de chaque point ; les 8 voisins sont à ±1 et ±largeur de la clé
+    ix = np.floor(x / taille).astype(np.int64)
+    iy = np.floor(y / taille).astype(np.int64)
+    ix -= ix.min() - 1
+    iy -= iy.min() - 1
+    largeur = int(iy.max()) + 2
+    cles, cellule, comptes = np.unique(ix * largeur + iy, return_inverse = True, return_counts = True)
+
+    # Densité : accidents du voisinage 3 x 3 de chaque cellule non vide
+    voisins = [_chercher(cles, cles + dx * largeur + dy) for dx, dy in VOISINS]
+    densite = comptes.copy()
+    for position in voisins:
+        densite += np.where(position >= 0, comptes[position], 0)
+    denses = densite >= min_accidents
+
+    # Montée de gradient sur la grille : chaque cellule dense pointe vers sa voisine dense la plus dense (si elle l'est
+    # plus qu'elle, à égalité la plus grande clé), et un point chaud réunit les cellules qui mènent au même sommet.
+    # Contrairement à des composantes connexes, deux sommets reliés par une rue dense restent séparés.
+    parent = np.arange(len(cles))
+    for position in voisins:
+        voisine = np.where((position >= 0) & denses[position], densite[position], -1)
+        plus_dense = denses & ((voisine > densite[parent]) | ((voisine == densite[parent]) & (position > parent)))
+        parent[plus_dense] = position[plus_dense]
+    # Saut de pointeurs jusqu'aux sommets
+    while True:
+        sommet = parent[parent]
+        if np.array_equal(sommet, parent):
+            break
+        parent = sommet
+    etiquette = np.where(denses, parent, -1)
+
+    # Points des cellules denses, numérotés par point chaud
+    groupe = etiquette[cellule]
+    dans_groupe = groupe >= 0
+    if not dans_groupe.any():
+        return pd.DataFrame({colonne: [] for colonne in colonnes})
+    _, groupe = np.unique(groupe[dans_groupe], return_inverse = True)
+    nb_groupes = int(groupe.max()) + 1
+    px, py, pannees = x[dans_groupe], y[dans_groupe], annees[dans_groupe].astype(np.int64)
+
+    nb = np.bincount(groupe, minlength = nb_groupes)
+    cx = np.bincount(groupe, weights = px, minlength = nb_groupes) / nb
+    cy = np.bincount(groupe, weights = py, minlength = nb_groupes) / nb
+    ecart = np.sqrt(np.bincount(groupe, weights = (px - cx[groupe]) ** 2 + (py - cy[groupe]) ** 2, minlength = nb_groupes) / nb)
+    longitude, latitude = coor_web_mercator_to_wgs84(cx, cy)
+
+    # Années où chaque point chaud a au moins un accident
+    annee_min = int(pannees.min())
+    nb_annees = int(pannees.max()) - annee_min + 1
+    presence = np.bincount(groupe * nb_annees + pannees - annee_min, minlength = nb_groupes * nb_annees).reshape(nb_groupes, nb_annees) > 0
+
+    resultat = pd.DataFrame({
+        'x': cx, 'y': cy, 'longitude': longitude, 'latitude': latitude, 'rayon': ecart, 'nb': nb,
+        **{colonne: np.bincount(groupe, weights = np.asarray(valeurs)[dans_groupe], minlength = nb_groupes).astype(np.int64)
+           for colonne, valeurs in gravites.items()},
+        'premiere_annee': annee_min + presence.argmax(axis = 1),
+        'derniere_annee': annee_min + nb_annees - 1 - presence[:, ::-1].argmax(axis = 1),
+        'annees_actives': presence.sum(axis = 1),
+    })
+    resultat = resultat[resultat['nb'] >= min_accidents]
+    ordre = [colonne for colonne in ('nb', 'ntu', 'nbh') if colonne in resultat]
+    resultat = resultat.sort_values(ordre, ascending = False, kind = 'stable', ignore_index = True)
+    resultat.insert(0, 'rang', np.arange(1, len(resultat) + 1))
+    return resultat[colonnes]
+
+
+def points_chauds_accidents(accident, usager = None, nombre = None, **parametres):
+    """Points chauds d'un DataFrame d'accidents (tous, ou ceux d'un type d'usager : 'velo' ou 'pieton')."""
+    if usager is not None:
+        accident = accident[accident[usager] == "Oui"]
+    x, y = coor_wgs84_to_web_mercator(accident['longitude'].to_numpy(dtype = float), accident['latitude'].to_numpy(dtype = float))
+    points = detecter_points_chauds(x, y, accident['annee'].to_numpy(), {colonne: accident[colonne].to_numpy() for colonne in ('ntu', 'nbh', 'nbnh')},
+                                    **parametres)
+    return points if nombre is None else points.head(nombre)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Points chauds des accidents, classés par nombre d'accidents")
+    parser.add_argument('fichier', nargs = '?', default = FICHIER_ACCIDENTS)
+    parser.add_argument('--usager', choices = USAGERS, help = "seulement les accidents de vélo ou de piéton")
+    parser.add_argument('--rayon', type = float, default = RAYON, help = "côté des cellules de la grille, en mètres")
+    parser.add_argument('--min-accidents', type = int, default = MIN_ACCIDENTS)
+    parser.add_argument('--nombre', type = int, default = 20, help = "points chauds affichés")
+    parser.add_argument('--sortie', help = "fichier CSV de tous les points chauds")
+    args = parser.parse_args()
+
+    accident = charger_accidents(args.fichier)
+    debut = time.perf_counter()
+    points = points_chauds_accidents(accident, args.usager, rayon = args.rayon, min_accidents = args.min_accidents)
+    print(f"{len(points)} points chauds parmi {len(accident):,} accidents en {time.perf_counter() - debut:.2f} s")
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(points.drop(columns = ['x', 'y']).head(args.nombre).to_string(index = False, float_format = '{:.5f}'.format))
+    if args.sortie:
+        points.to_csv(args.sortie, index = False)
@@ -0,0 +1,80 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import shapely
+from shapely.geometry import shape
+
+from chargement import DOSSIER_CACHE, FICHIER_ACCIDENTS, charger_accidents, empreinte_fichier
+
+##### Affectation des accidents aux quartiers (jointure spatiale) #####
+
+# Propriété GeoJSON donnant le nom du quartier / de l'IRIS
+PROPRIETE_NOM = 'nom'
+
+
+def charger_quartiers(chemin, propriete_nom = PROPRIETE_NOM):
+    """Lit un GeoJSON de polygones : renvoie (noms, géométries shapely)."""
+    with open(chemin, encoding = 'utf-8') as f:
+        collection = json.load(f)
+    noms, polygones = [], []
+    for i, entite in enumerate(collection['features']):
+        noms.append(str((entite.get('properties') or {}).get(propriete_nom, i)))
+        polygones.append(shape(entite['geometry']))
+    return noms, np.array(polygones, dtype = object)
+
+
+def affecter_quartiers(longitude, latitude, polygones):
+    """Indice du polygone contenant chaque point (-1 hors de tout polygone).
+
+    L'index STRtree est construit une seule fois, puis tous les points sont testés en un appel vectorisé :
+    seuls les polygones dont le rectangle englobant contient le point sont testés exactement.
+    """
+    points = shapely.points(np.asarray(longitude, dtype = np.float64), np.asarray(latitude, dtype = np.float64))
+    arbre = shapely.STRtree(polygones)
+    indices_points, indices_polygones = arbre.query(points, predicate = 'intersects')
+
+    # Un point sur la frontière commune de deux polygones est affecté à l'un des deux
+    quartier = np.full(len(points), -1, dtype = np.int32)
+    quartier[indices_points] = indices_polygones
+    return quartier
+
+
+def affecter_quartiers_cache(longitude, latitude, chemin_quartiers, dossier_cache = DOSSIER_CACHE):
+    """affecter_quartiers() avec cache disque, par fichier de polygones et par jeu de coordonnées."""
+    longitude = np.ascontiguousarray(longitude, dtype = np.float32)
+    latitude = np.ascontiguousarray(latitude, dtype = np.float32)
+    empreinte_points = hashlib.sha256(longitude.tobytes() + latitude.tobytes()).hexdigest()[:16]
+    nom = os.path.splitext(os.path.basename(chemin_quartiers))[0]
+    fichier_cache = os.path.join(dossier_cache, f"quartiers-{nom}-{empreinte_fichier(chemin_quartiers)}-{empreinte_points}.npy")
+    if os.path.exists(fichier_cache):
+        return np.load(fichier_cache)
+
+    _, polygones = charger_quartiers(chemin_quartiers)
+    quartier = affecter_quartiers(longitude, latitude, polygones)
+    os.makedirs(dossier_cache, exist_ok = True)
+    np.save(fichier_cache, quartier)
+    return quartier
+
+
+def compter_par_quartier(quartier, nb_quartiers):
+    """Nombre d'accidents de chaque quartier (les points hors quartier sont ignorés)."""
+    return np.bincount(quartier[quartier >= 0], minlength = nb_quartiers)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Jointure spatiale des accidents avec des quartiers GeoJSON, avec mesure du débit")
+    parser.add_argument('quartiers', help = "fichier GeoJSON des polygones")
+    parser.add_argument('fichier', nargs = '?', default = FICHIER_ACCIDENTS)
+    args = parser.parse_args()
+
+    accident = charger_accidents(args.fichier)
+    noms, polygones = charger_quartiers(args.quartiers)
+    debut = time.perf_counter()
+    quartier = affecter_quartiers(accident['longitude'], accident['latitude'], polygones)
+    duree = time.perf_counter() - debut
+    print(f"{len(quartier)} points × {len(polygones)} polygones en {duree:.3f} s ({len(quartier) / duree:,.0f} points/s), "
+          f"{(quartier < 0).sum()} hors quartier")
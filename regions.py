@@ -0,0 +1,90 @@
+import json
+import multiprocessing
+import os
+import time
+from functools import partial
+
+from chargement import FILTRES, charger_accidents, pic_memoire_mo
+from pipeline import Pipeline, empreinte_chemin
+from Projet_final import VALIDATION, analyseur, etapes, fichier_html, verifier_options
+
+##### Tableau de bord de plusieurs régions, en parallèle #####
+
+# Jeu de données complet, chargé une seule fois par le processus principal. Avec fork, les processus de calcul
+# en héritent sans copie (pages partagées tant qu'elles ne sont pas modifiées) ; sinon chacun relit l'instantané.
+_DONNEES = None
+
+
+def charger_regions(chemin):
+    """Liste des régions d'un fichier JSON : [{"nom": ..., "centre": [latitude, longitude], "filtre": "..."}, ...].
+    Le filtre est une expression pandas sur les colonnes des accidents (toutes les lignes sans filtre)."""
+    with open(chemin, encoding = 'utf-8') as f:
+        regions = json.load(f)
+    for region in regions:
+        if 'nom' not in region or len(region.get('centre', ())) != 2:
+            raise ValueError(f"Région invalide (nom et centre [latitude, longitude] attendus) : {region}")
+    return regions
+
+
+def _initialiser(fichier, filtres):
+    global _DONNEES
+    if _DONNEES is None:
+        _DONNEES = charger_accidents(fichier, **filtres)
+
+
+def generer_region(region, options):
+    """Écrit le tableau de bord d'une région à partir du jeu de données partagé. Renvoie (nom, fichier, durée, pic RSS,
+    erreur) : une région en échec renvoie son erreur au lieu de l'envoyer au pool, qui arrêterait toutes les autres."""
+    debut = time.perf_counter()
+    options = dict(options, region = region['nom'], centre = tuple(region['centre']), filtre = region.get('filtre'),
+                   sortie = os.path.join(options['dossier_sortie'], fichier_html(region['nom'])), afficher = False)
+    try:
+        pipeline = Pipeline(etapes(options), options, utiliser_cache = not options['sans_cache'], bavard = False,
+                            resultats = {'donnees': _DONNEES})
+        pipeline.executer(['sortie'])
+    except Exception as erreur:
+        return region['nom'], None, time.perf_counter() - debut, pic_memoire_mo(), f"{type(erreur).__name__}: {erreur}"
+    return region['nom'], options['sortie'], time.perf_counter() - debut, pic_memoire_mo(), None
+
+
+def generer_regions(regions, options, processus = None):
+    """Écrit le tableau de bord de chaque région dans un pool de processus partageant le même jeu de données."""
+    global _DONNEES
+    debut = time.perf_counter()
+    # Filtres de chargement et bornes de validation : le jeu partagé est celui que lirait chaque région
+    filtres = {option: options[option] for option in FILTRES + VALIDATION}
+    _DONNEES = charger_accidents(options['fichier'], **filtres)
+    # Empreinte du fichier source calculée une fois ici, héritée par les processus de calcul
+    empreinte_chemin(options['fichier'])
+    # Chaque région construit ses graphiques : Bokeh est importé une fois ici plutôt que dans chaque processus
+    import figures
+    os.makedirs(options['dossier_sortie'], exist_ok = True)
+    print(f"{len(_DONNEES)} accidents chargés en {time.perf_counter() - debut:.2f} s")
+
+    methodes = multiprocessing.get_all_start_methods()
+    contexte = multiprocessing.get_context('fork' if 'fork' in methodes else None)
+    fichiers, echecs = [], []
+    with contexte.Pool(processus, initializer = _initialiser, initargs = (options['fichier'], filtres)) as pool:
+        for nom, sortie, duree, rss, erreur in pool.imap_unordered(partial(generer_region, options = options), regions):
+            if erreur is not None:
+                print(f"  {nom:<25} {duree:>7.2f} s  ÉCHEC : {erreur}")
+                echecs.append(nom)
+                continue
+            print(f"  {nom:<25} {duree:>7.2f} s  pic RSS du processus {rss:>8.1f} Mo  -> {sortie}")
+            fichiers.append(sortie)
+    print(f"{len(regions)} régions en {time.perf_counter() - debut:.2f} s avec {processus or os.cpu_count()} processus"
+          + (f", {len(echecs)} en échec : {', '.join(echecs)}" if echecs else ""))
+    return fichiers
+
+
+if __name__ == "__main__":
+    parser = analyseur("Tableau de bord des accidents pour chaque région d'une liste, en parallèle")
+    parser.add_argument('regions', help = "fichier JSON des régions (nom, centre, filtre)")
+    parser.add_argument('--processus', type = int, help = "nombre de processus de calcul (par défaut : nombre de cœurs)")
+    parser.add_argument('--dossier-sortie', default = "regions", help = "dossier des fichiers HTML générés")
+    args = parser.parse_args()
+    verifier_options(parser, args)
+    if args.flux or args.entrepot:
+        parser.error("le mode régions filtre le jeu de données complet : --flux et --entrepot ne s'appliquent pas")
+
+    generer_regions(charger_regions(args.regions), vars(args), args.processus)
@@ -0,0 +1,198 @@
+import argparse
+import itertools
+import json
+import time
+
+import numpy as np
+import pandas as pd
+import shapely
+from shapely.geometry import shape
+
+from carte import coor_web_mercator_to_wgs84, coor_wgs84_to_web_mercator
+from chargement import FICHIER_ACCIDENTS, charger_accidents
+
+##### Score de risque des tronçons : accidents rattachés au tronçon le plus proche, pondérés par gravité et ancienneté #####
+
+# Propriété GeoJSON donnant le nom du tronçon ou du carrefour
+PROPRIETE_NOM = 'nom'
+
+# Distance maximale (mètres) entre un accident et son tronçon : au-delà, l'accident n'est rattaché à aucun
+DISTANCE_MAX = 30
+
+# Poids d'un accident : POIDS_ACCIDENT, plus le poids de chacune de ses victimes selon sa gravité
+POIDS_ACCIDENT = 1.0
+POIDS_GRAVITE = {'ntu': 10.0, 'nbh': 5.0, 'nbnh': 1.0}
+
+# Demi-vie (années) : le poids d'un accident est divisé par deux tous les DEMI_VIE ans avant le dernier accident
+DEMI_VIE = 3.0
+
+# Tronçons classés affichés par l'onglet du tableau de bord
+NB_TRONCONS = 200
+
+# Points rattachés à la fois (la mémoire des paires point / segment candidat ne dépend que de ce nombre)
+BLOC_RATTACHEMENT = 1 << 16
+
+
+def charger_reseau(chemin, propriete_nom = PROPRIETE_NOM):
+    """Lit un GeoJSON de tronçons (LineString, MultiLineString) et de carrefours (Point) : renvoie (noms, géométries
+    shapely). Les LineString et les Point sont construits en un appel vectorisé par type, les autres un à un."""
+    with open(chemin, encoding = 'utf-8') as f:
+        entites = json.load(f)['features']
+    noms = [str((entite.get('properties') or {}).get(propriete_nom, i)) for i, entite in enumerate(entites)]
+    types = np.array([entite['geometry']['type'] for entite in entites])
+    geometries = np.empty(len(entites), dtype = object)
+
+    lignes = np.flatnonzero(types == 'LineString')
+    if len(lignes):
+        coordonnees = [entites[i]['geometry']['coordinates'] for i in lignes]
+        sommets = np.array(list(itertools.chain.from_iterable(coordonnees)), dtype = np.float64)[:, :2]
+        geometries[lignes] = shapely.linestrings(sommets, indices = np.repeat(np.arange(len(lignes)), [len(c) for c in coordonnees]))
+    points = np.flatnonzero(types == 'Point')
+    if len(points):
+        geometries[points] = shapely.points(np.array([entites[i]['geometry']['coordinates'][:2] for i in points], dtype = np.float64))
+    for i in np.flatnonzero((types != 'LineString') & (types != 'Point')):
+        geometries[i] = shape(entites[i]['geometry'])
+    return noms, geometries
+
+
+def projeter(geometries):
+    """Géométries WGS84 projetées en Web Mercator (tous les sommets en un seul appel)."""
+    return shapely.transform(geometries, lambda sommets: np.column_stack(coor_wgs84_to_web_mercator(sommets[:, 0], sommets[:, 1])))
+
+
+def segments(troncons):
+    """Segments élémentaires des tronçons : extrémités (a, b) de chaque paire de sommets consécutifs d'une même partie,
+    et tronçon de chaque segment. Un point (carrefour) est un segment de longueur nulle."""
+    parties, troncon_partie = shapely.get_parts(troncons, return_index = True)
+    sommets, partie = shapely.get_coordinates(parties, return_index = True)
+    suivants = np.flatnonzero(partie[1:] == partie[:-1])
+    nb_sommets = np.bincount(partie, minlength = len(parties))
+    seuls = (np.cumsum(nb_sommets) - nb_sommets)[nb_sommets == 1]
+    debuts = np.concatenate([suivants, seuls])
+    fins = np.concatenate([suivants + 1, seuls])
+    return sommets[debuts], sommets[fins], troncon_partie[partie[debuts]].astype(np.int32)
+
+
+def rattacher(x, y, troncons, distance_max):
+    """Indice du tronçon le plus proche de chaque point (-1 au-delà de distance_max), dans les unités de x et y.
+
+    Un index STRtree des rectangles englobants des segments élémentaires est construit une seule fois, puis interrogé
+    en un appel par bloc de points avec le carré de côté 2 × distance_max centré sur chaque point : seuls les segments
+    candidats qu'il renvoie sont mesurés, par un calcul vectorisé de la distance d'un point à un segment. À égalité
+    de distance, le tronçon de plus petit indice est retenu.
+    """
+    a, b, troncon_segment = segments(troncons)
+    arbre = shapely.STRtree(shapely.box(np.minimum(a[:, 0], b[:, 0]), np.minimum(a[:, 1], b[:, 1]),
+                                        np.maximum(a[:, 0], b[:, 0]), np.maximum(a[:, 1], b[:, 1])))
+    direction = b - a
+    longueur2 = (direction ** 2).sum(axis = 1)
+
+    troncon = np.full(len(x), -1, dtype = np.int32)
+    for debut in range(0, len(x), BLOC_RATTACHEMENT):
+        px = np.asarray(x[debut:debut + BLOC_RATTACHEMENT], dtype = np.float64)
+        py = np.asarray(y[debut:debut + BLOC_RATTACHEMENT], dtype = np.float64)
+        i, j = arbre.query(shapely.box(px - distance_max, py - distance_max, px + distance_max, py + distance_max))
+
+        # Projection du point sur le segment, bornée à ses extrémités (position 0 pour un segment de longueur nulle)
+        ex, ey = px[i] - a[j, 0], py[i] - a[j, 1]
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            t = np.clip((ex * direction[j, 0] + ey * direction[j, 1]) / longueur2[j], 0, 1)
+        t[longueur2[j] == 0] = 0
+        distance2 = (ex - t * direction[j, 0]) ** 2 + (ey - t * direction[j, 1]) ** 2
+
+        proches = distance2 <= distance_max ** 2
+        i, candidat, distance2 = i[proches], troncon_segment[j[proches]], distance2[proches]
+        ordre = np.lexsort((candidat, distance2, i))
+        premiers = ordre[np.r_[True, i[ordre][1:] != i[ordre][:-1]]] if len(ordre) else ordre
+        troncon[debut + i[premiers]] = candidat[premiers]
+    return troncon
+
+
+def scorer(troncon, jours, gravites, nb_troncons, demi_vie = DEMI_VIE, reference = None):
+    """Score de chaque tronçon : somme, sur ses accidents, de (POIDS_ACCIDENT + somme des POIDS_GRAVITE × victimes)
+    × 0,5 ^ (âge / demi_vie), l'âge en années étant compté depuis le jour `reference` (par défaut le dernier accident).
+    `jours` sont les dates en jours depuis le 1er janvier 1970. Renvoie un DataFrame indexé par tronçon : score, nb,
+    sommes des gravités et dernier accident (tronçons sans accident compris)."""
+    if reference is None:
+        reference = jours.max() if len(jours) else 0
+    poids = POIDS_ACCIDENT + sum(POIDS_GRAVITE[colonne] * np.asarray(valeurs, dtype = np.float64) for colonne, valeurs in gravites.items())
+    poids *= 0.5 ** ((reference - jours) / (365.25 * demi_vie))
+
+    rattaches = troncon >= 0
+    indices = troncon[rattaches]
+    dernier = np.full(nb_troncons, np.iinfo(np.int64).min)
+    np.maximum.at(dernier, indices, jours[rattaches])
+    scores = pd.DataFrame({
+        'score': np.bincount(indices, weights = poids[rattaches], minlength = nb_troncons),
+        'nb': np.bincount(indices, minlength = nb_troncons),
+        **{colonne: np.bincount(indices, weights = valeurs[rattaches], minlength = nb_troncons).astype(np.int64) for colonne, valeurs in gravites.items()},
+    })
+    # Le plus petit int64 est NaT : pas de dernier accident pour les tronçons sans accident
+    scores['dernier_accident'] = dernier.astype('datetime64[D]')
+    return scores
+
+
+def rattacher_accidents(accident, troncons, distance_max = DISTANCE_MAX):
+    """Tronçon (Web Mercator) le plus proche de chaque accident, à moins de distance_max mètres : renvoie les indices
+    (-1 sans tronçon) et le rapport des mètres aux unités Web Mercator, pris à la latitude médiane des accidents."""
+    latitude = accident['latitude'].to_numpy(dtype = np.float64)
+    x, y = coor_wgs84_to_web_mercator(accident['longitude'].to_numpy(dtype = np.float64), latitude)
+    # Les distances Web Mercator sont dilatées de 1 / cos(latitude)
+    echelle = np.cos(np.radians(np.median(latitude))) if len(latitude) else 1.0
+    return rattacher(x, y, troncons, distance_max / echelle), echelle
+
+
+def classer_troncons(accident, troncon, noms, troncons, echelle, demi_vie = DEMI_VIE):
+    """Tronçons classés par score de risque décroissant, puis par nombre d'accidents (ceux sans accident rattaché
+    sont omis). Colonnes : rang, troncon (indice dans le fichier), nom, score, nb, ntu, nbh, nbnh, dernier_accident,
+    longueur_m, x, y (centre de gravité, Web Mercator), longitude, latitude."""
+    jours = accident['date'].to_numpy().astype('datetime64[D]').astype(np.int64)
+    scores = scorer(troncon, jours, {colonne: accident[colonne].to_numpy() for colonne in POIDS_GRAVITE}, len(troncons), demi_vie)
+
+    scores.insert(0, 'nom', noms)
+    scores['longueur_m'] = shapely.length(troncons) * echelle
+    centres = shapely.get_coordinates(shapely.centroid(troncons))
+    scores['x'], scores['y'] = centres[:, 0], centres[:, 1]
+    scores['longitude'], scores['latitude'] = coor_web_mercator_to_wgs84(scores['x'].to_numpy(), scores['y'].to_numpy())
+    scores = scores[scores['nb'] > 0].rename_axis('troncon').reset_index()
+    scores = scores.sort_values(['score', 'nb'], ascending = False, kind = 'stable', ignore_index = True)
+    scores.insert(0, 'rang', np.arange(1, len(scores) + 1))
+    return scores
+
+
+def risque_troncons(accident, chemin_reseau, demi_vie = DEMI_VIE, distance_max = DISTANCE_MAX, propriete_nom = PROPRIETE_NOM):
+    """Classement des tronçons d'un fichier GeoJSON (voir classer_troncons) et leurs géométries Web Mercator."""
+    noms, geometries = charger_reseau(chemin_reseau, propriete_nom)
+    troncons = projeter(geometries)
+    troncon, echelle = rattacher_accidents(accident, troncons, distance_max)
+    return classer_troncons(accident, troncon, noms, troncons, echelle, demi_vie), troncons
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Score de risque des tronçons d'un réseau GeoJSON, avec mesure du rattachement au plus proche tronçon")
+    parser.add_argument('reseau', help = "fichier GeoJSON des tronçons (LineString) et carrefours (Point)")
+    parser.add_argument('fichier', nargs = '?', default = FICHIER_ACCIDENTS)
+    parser.add_argument('--demi-vie', type = float, default = DEMI_VIE, help = "demi-vie du poids des accidents, en années")
+    parser.add_argument('--distance-max', type = float, default = DISTANCE_MAX, help = "distance maximale au tronçon, en mètres")
+    parser.add_argument('--nombre', type = int, default = 20, help = "tronçons affichés")
+    parser.add_argument('--sortie', help = "fichier CSV de tous les tronçons classés")
+    args = parser.parse_args()
+
+    accident = charger_accidents(args.fichier)
+    debut = time.perf_counter()
+    noms, geometries = charger_reseau(args.reseau)
+    troncons = projeter(geometries)
+    lecture = time.perf_counter()
+    troncon, echelle = rattacher_accidents(accident, troncons, args.distance_max)
+    rattachement = time.perf_counter()
+    scores = classer_troncons(accident, troncon, noms, troncons, echelle, args.demi_vie)
+    fin = time.perf_counter()
+
+    print(f"Réseau de {len(troncons):,} tronçons lu et projeté en {lecture - debut:.2f} s")
+    print(f"{len(accident):,} accidents rattachés en {rattachement - lecture:.2f} s ({len(accident) / (rattachement - lecture):,.0f} accidents/s, "
+          f"index compris), {(troncon < 0).sum():,} à plus de {args.distance_max:g} m de tout tronçon")
+    print(f"{len(scores):,} tronçons avec accident scorés et classés en {fin - rattachement:.2f} s")
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(scores.drop(columns = ['troncon', 'x', 'y']).head(args.nombre).to_string(index = False, float_format = '{:.5f}'.format))
+    if args.sortie:
+        scores.to_csv(args.sortie, index = False)
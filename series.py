@@ -0,0 +1,109 @@
+import argparse
+import time
+
+import numpy as np
+
+from cube import LIBELLES_AXES, MESURES, cumuler_categories
+from vehicules import classer_vehicules
+
+##### Séries temporelles des accidents : comptes par jour, puis par semaine ISO, mois et année #####
+
+# Niveaux de l'onglet d'évolution, du plus grossier au plus fin
+NIVEAUX = ('annee', 'mois', 'semaine', 'jour')
+
+
+def premier_jour(annee):
+    """1er janvier d'une année, en jours depuis le 1er janvier 1970."""
+    return int((np.datetime64(f"{annee}-01-01", 'D') - np.datetime64(0, 'D')).astype(np.int64))
+
+
+class SerieJournaliere:
+    """Tableau dense (mesure, jour, categorie) des accidents de chaque jour des années couvertes, sur les mêmes mesures
+    et le même axe des catégories que le cube ; les jours sans accident valent 0. Les séries s'additionnent."""
+
+    def __init__(self, annee_min, valeurs):
+        self.annee_min = annee_min
+        self.valeurs = valeurs
+
+    @property
+    def jours(self):
+        """Jour (depuis le 1er janvier 1970) de chaque case de l'axe des jours."""
+        debut = premier_jour(self.annee_min)
+        return np.arange(debut, debut + self.valeurs.shape[1])
+
+    def fusionner(self, autre):
+        """Série de la réunion de deux ensembles d'accidents distincts (axes des jours alignés)."""
+        if autre.valeurs.shape[1] == 0:
+            return self
+        if self.valeurs.shape[1] == 0:
+            return autre
+        debut = premier_jour(min(self.annee_min, autre.annee_min))
+        fin = max(serie.jours[-1] for serie in (self, autre)) + 1
+        valeurs = np.zeros((self.valeurs.shape[0], fin - debut, self.valeurs.shape[2]), dtype = self.valeurs.dtype)
+        for serie in (self, autre):
+            decalage = premier_jour(serie.annee_min) - debut
+            valeurs[:, decalage:decalage + serie.valeurs.shape[1]] += serie.valeurs
+        return SerieJournaliere(min(self.annee_min, autre.annee_min), valeurs)
+
+    def niveaux(self, mesures = MESURES):
+        """Séries de chaque niveau de NIVEAUX, cumulées à partir des comptes journaliers (sans relire les accidents).
+
+        Renvoie {niveau: (debuts, valeurs)} : le premier jour de chaque période (en jours depuis le 1er janvier 1970)
+        et les valeurs (mesure, periode, categorie). Les semaines ISO commencent le lundi : celles qui chevauchent le
+        début ou la fin des années couvertes ne sont que partiellement comptées.
+        """
+        jours = self.jours
+        dates = jours.astype('datetime64[D]')
+        cles = {
+            'annee': dates.astype('datetime64[Y]').astype('datetime64[D]').astype(np.int64),
+            'mois': dates.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64),
+            # Le 1er janvier 1970 est un jeudi : (jour + 3) % 7 est le rang du jour dans sa semaine, lundi compris
+            'semaine': jours - (jours + 3) % 7,
+            'jour': jours,
+        }
+        valeurs = self.valeurs[[MESURES.index(mesure) for mesure in mesures]]
+        resultat = {}
+        for niveau in NIVEAUX:
+            # Clés croissantes : chaque période est une tranche contiguë de jours
+            debuts, positions = np.unique(cles[niveau], return_index = True)
+            resultat[niveau] = (debuts, np.add.reduceat(valeurs, positions, axis = 1, dtype = np.int64) if len(positions) else valeurs.astype(np.int64))
+        return resultat
+
+
+def serie_vide():
+    return SerieJournaliere(0, np.zeros((len(MESURES), 0, len(LIBELLES_AXES['categorie'])), dtype = np.int32))
+
+
+def construire_serie(accident, codes_classes = None):
+    """Construit la série journalière en un seul passage, comme le cube : l'indice de chaque accident est son jour."""
+    if codes_classes is None:
+        codes_classes = classer_vehicules(accident)
+    if len(accident) == 0:
+        return serie_vide()
+    annee = accident['annee'].to_numpy()
+    annee_min, annee_max = int(annee.min()), int(annee.max())
+    debut = premier_jour(annee_min)
+    jour = accident['date'].to_numpy().astype('datetime64[D]').astype(np.int64) - debut
+
+    gravites = {colonne: accident[colonne].to_numpy() for colonne in ('ntu', 'nbh', 'nbnh')}
+    valeurs = cumuler_categories(jour, np.zeros(len(jour), dtype = np.int64), premier_jour(annee_max + 1) - debut, 1, codes_classes, gravites)
+    return SerieJournaliere(annee_min, valeurs[..., 0])
+
+
+if __name__ == "__main__":
+    from chargement import FICHIER_ACCIDENTS, charger_accidents
+
+    parser = argparse.ArgumentParser(description = "Séries temporelles des accidents (année, mois, semaine ISO, jour) et coût de leur calcul")
+    parser.add_argument('fichier', nargs = '?', default = FICHIER_ACCIDENTS)
+    args = parser.parse_args()
+
+    accident = charger_accidents(args.fichier)
+    debut = time.perf_counter()
+    serie = construire_serie(accident)
+    construction = time.perf_counter() - debut
+    debut = time.perf_counter()
+    niveaux = serie.niveaux(['nb', 'ntu', 'nbh', 'nbnh'])
+    cumul = time.perf_counter() - debut
+    print(f"Série journalière de {len(accident):,} accidents en {construction:.3f} s, niveaux cumulés en {cumul * 1000:.1f} ms")
+    for niveau, (debuts, valeurs) in niveaux.items():
+        print(f"  {niveau:<8} {len(debuts):>6} périodes, {valeurs.size:>9,} valeurs")
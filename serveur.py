@@ -0,0 +1,158 @@
+import argparse
+import sys
+import warnings
+from functools import partial
+
+from bokeh.io import curdoc
+from bokeh.layouts import column, row
+from bokeh.models import ColumnDataSource, Div, HoverTool, RangeSlider, Select, TabPanel, Tabs
+from bokeh.palettes import Reds8
+from bokeh.plotting import figure
+from bokeh.transform import linear_cmap, log_cmap
+
+from agregats import USAGERS
+from carte import coor_wgs84_to_web_mercator
+from chargement import FICHIER_ACCIDENTS
+from filtrage import GRAVITES, JOURS_SEMAINE, TAILLE_CELLULE, Filtre, executeur, jeu_partage
+from vehicules import CATEGORIES, NON_SPECIFIE
+
+##### Tableau de bord servi par bokeh serve, filtres appliqués côté serveur #####
+#
+#   bokeh serve serveur.py --args --fichier accidents_corporels.csv
+#
+# Ce script est exécuté pour chaque session : le jeu de données, le cache des filtres et les threads de
+# calcul sont partagés entre les sessions par le module filtrage. Seuls les agrégats filtrés sont envoyés.
+
+TOUS = 'Tous'
+
+LIBELLES_USAGERS = {'velo': 'Vélo', 'pieton': 'Piéton'}
+
+# Centre des cartes : Rennes
+CENTRE = (48.1119800, -1.6742900)
+
+parser = argparse.ArgumentParser(description = "Tableau de bord avec filtres côté serveur (bokeh serve serveur.py --args ...)")
+parser.add_argument('--fichier', default = FICHIER_ACCIDENTS, help = "fichier CSV des accidents")
+args, _ = parser.parse_known_args(sys.argv[1:])
+
+jeu = jeu_partage(args.fichier)
+document = curdoc()
+
+##### Filtres #####
+
+choix_annees = RangeSlider(title = "Années", start = jeu.annees[0], end = max(jeu.annees[1], jeu.annees[0] + 1), value = jeu.annees, step = 1)
+choix_categorie = Select(title = "Type de véhicule", value = TOUS, options = [TOUS] + [categorie for categorie in CATEGORIES if categorie != NON_SPECIFIE])
+choix_usager = Select(title = "Usager", value = TOUS, options = [TOUS] + [LIBELLES_USAGERS[usager] for usager in USAGERS])
+choix_jour = Select(title = "Jour de la semaine", value = TOUS, options = [TOUS] + JOURS_SEMAINE)
+choix_gravite = Select(title = "Gravité minimale", value = GRAVITES[0], options = GRAVITES)
+
+
+def filtre_courant():
+    usagers = {libelle: usager for usager, libelle in LIBELLES_USAGERS.items()}
+    return Filtre(int(choix_annees.value[0]), int(choix_annees.value[1]),
+                  None if choix_categorie.value == TOUS else choix_categorie.value,
+                  usagers.get(choix_usager.value),
+                  None if choix_jour.value == TOUS else choix_jour.value,
+                  GRAVITES.index(choix_gravite.value))
+
+
+##### Graphiques (sources remplies par les agrégats du filtre) #####
+
+source_vehicules = ColumnDataSource(data = dict(categorie = [], nb = []))
+p_vehicules = figure(title = "Accidents en fonction du véhicule", x_range = [categorie for categorie in CATEGORIES if categorie != NON_SPECIFIE],
+                     height = 450, toolbar_location = None, tools = "", y_axis_label = "Nombre de véhicules")
+p_vehicules.vbar(x = 'categorie', top = 'nb', width = 0.9, color = '#922B21', source = source_vehicules)
+p_vehicules.add_tools(HoverTool(tooltips = [('Véhicule', '@categorie'), ('Nombre', '@nb')]))
+p_vehicules.xaxis.major_label_orientation = 45
+p_vehicules.xgrid.grid_line_color = None
+
+heures = [f'{h:02d}' for h in range(24)]
+source_heatmap = ColumnDataSource(data = dict(jsem = [], heure = [], nb = []))
+couleurs_heatmap = linear_cmap('nb', ["#75968f", "#a5bab7", "#c9d9d3", "#e2e2e2", "#dfccce", "#ddb7b1", "#cc7878", "#933b41", "#550b1d"], low = 0, high = 1)
+p_heatmap = figure(title = "Accidents par jour de la semaine et heure", x_range = JOURS_SEMAINE, y_range = list(reversed(heures)),
+                   x_axis_location = "above", width = 600, height = 600, tools = "hover", toolbar_location = None,
+                   tooltips = [('Heure/Jour', '@heure @jsem'), ('Nombre', '@nb')])
+p_heatmap.rect(x = 'jsem', y = 'heure', width = 1, height = 1, source = source_heatmap, fill_color = couleurs_heatmap, line_color = None)
+p_heatmap.grid.grid_line_color = None
+p_heatmap.axis.major_label_text_font_size = "7px"
+
+source_annees = ColumnDataSource(data = dict(annee = [], nb = [], ntu = [], nbh = [], nbnh = []))
+p_evolution = figure(title = "Evolution des accidents au cours du temps", x_axis_label = 'Année', y_axis_label = "Nombre d'accidents", height = 450)
+p_evolution.line(x = 'annee', y = 'nb', source = source_annees, line_color = '#922B21', line_width = 3)
+p_evolution.add_tools(HoverTool(tooltips = [('Année', '@annee'), ('Accidents', '@nb'), ('Tués', '@ntu'),
+                                            ('Blessés hospitalisés', '@nbh'), ('Blessés', '@nbnh')]))
+
+x_centre, y_centre = coor_wgs84_to_web_mercator(CENTRE[1], CENTRE[0])
+source_cellules = ColumnDataSource(data = dict(x = [], y = [], nb = []))
+couleurs_cellules = log_cmap('nb', Reds8[::-1], low = 1, high = 2)
+p_carte = figure(title = f"Accidents par carré de {TAILLE_CELLULE} m", x_axis_type = "mercator", y_axis_type = "mercator",
+                 x_range = (x_centre - 10000, x_centre + 10000), y_range = (y_centre - 10000, y_centre + 10000), active_scroll = "wheel_zoom")
+p_carte.add_tile("CartoDB Positron")
+rendu_cellules = p_carte.rect(x = 'x', y = 'y', width = TAILLE_CELLULE, height = TAILLE_CELLULE, source = source_cellules,
+                              line_color = None, fill_alpha = 0.7, fill_color = couleurs_cellules)
+p_carte.add_tools(HoverTool(renderers = [rendu_cellules], tooltips = [('Accidents', '@nb')]))
+
+etat = Div()
+
+# Dernier résultat affiché dans la session
+dernier = {'lignes': 0}
+
+
+##### Mise à jour #####
+
+def texte_etat(resultat):
+    metriques = jeu.metriques()
+    return (f"<b>{resultat['lignes']:,}</b> accidents sur {jeu.lignes:,} &nbsp;|&nbsp; cache des filtres : "
+            f"{metriques['taux_succes']:.0%} de succès ({metriques['succes']} / {metriques['requetes']}), "
+            f"{metriques['taille']} / {metriques['taille_max']} entrées, calcul moyen {metriques['calcul_moyen_ms']:.1f} ms")
+
+
+def afficher(filtre, resultat):
+    # Réponse périmée : l'utilisateur a changé de filtre pendant le calcul
+    if filtre != filtre_courant():
+        return
+    source_vehicules.data = resultat['vehicules']
+    source_heatmap.data = resultat['heatmap']
+    source_annees.data = resultat['annees']
+    source_cellules.data = resultat['cellules']
+    couleurs_heatmap.transform.high = max(int(resultat['heatmap']['nb'].max()), 1)
+    couleurs_cellules.transform.high = max(int(resultat['cellules']['nb'].max(initial = 0)), 2)
+    dernier['lignes'] = resultat['lignes']
+    etat.text = texte_etat(resultat)
+
+
+def afficher_erreur(filtre, erreur):
+    if filtre == filtre_courant():
+        etat.text = f"<b>Erreur</b> pendant le calcul du filtre : {type(erreur).__name__}: {erreur}"
+
+
+def recevoir(filtre, futur):
+    """Fin du calcul d'un filtre : une erreur du thread de calcul est signalée (avertissement et état) au lieu d'être perdue."""
+    erreur = futur.exception()
+    if erreur is not None:
+        warnings.warn(f"Calcul du filtre {filtre} impossible : {type(erreur).__name__}: {erreur}")
+        document.add_next_tick_callback(partial(afficher_erreur, filtre, erreur))
+    else:
+        document.add_next_tick_callback(partial(afficher, filtre, futur.result()))
+
+
+def filtrer(attr, old, new):
+    """Calcul (ou lecture dans le cache) dans un thread de calcul, affichage au prochain tour de la boucle de la session."""
+    filtre = filtre_courant()
+    futur = executeur().submit(jeu.agregats, filtre)
+    futur.add_done_callback(partial(recevoir, filtre))
+
+
+choix_annees.on_change('value_throttled', filtrer)
+for choix in (choix_categorie, choix_usager, choix_jour, choix_gravite):
+    choix.on_change('value', filtrer)
+
+afficher(filtre_courant(), jeu.agregats(filtre_courant()))
+# Métriques du cache (communes à toutes les sessions) rafraîchies périodiquement
+document.add_periodic_callback(lambda: setattr(etat, 'text', texte_etat(dernier)), 5000)
+
+onglets = Tabs(tabs = [TabPanel(child = p_vehicules, title = "Type de véhicule"),
+                       TabPanel(child = p_evolution, title = "Evolution des accidents"),
+                       TabPanel(child = p_heatmap, title = "Jour et heure"),
+                       TabPanel(child = p_carte, title = "Cartographie des accidents")])
+document.add_root(column(row(choix_annees, choix_categorie, choix_usager, choix_jour, choix_gravite), etat, onglets))
+document.title = "Accidents de la route : filtres côté serveur"
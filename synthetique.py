@@ -0,0 +1,157 @@
+import argparse
+import json
+import time
+
+import numpy as np
+import pandas as pd
+
+from vehicules import CLASSES_VEHICULES, COLONNES_VEHICULES
+
+##### Générateur d'accidents synthétiques (même format que accidents_corporels.csv) #####
+
+ANNEES = (2012, 2022)
+
+JOURS_SEMAINE = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi', 'Samedi', 'Dimanche']
+
+# Poids relatifs : plus d'accidents en semaine (surtout le vendredi) et aux heures de pointe
+POIDS_JOURS = [1.0, 1.05, 1.05, 1.1, 1.25, 0.8, 0.55]
+POIDS_MOIS = [0.8, 0.8, 0.9, 0.95, 1.05, 1.1, 0.95, 0.75, 1.05, 1.15, 1.1, 1.0]
+POIDS_HEURES = [0.4, 0.3, 0.25, 0.2, 0.2, 0.4, 1.0, 2.2, 3.2, 1.8, 1.4, 1.6, 1.9, 1.7, 1.6, 1.9, 2.5, 3.1, 2.9, 1.9, 1.2, 0.9, 0.7, 0.5]
+
+# Part de chaque catégorie de véhicule, répartie uniformément entre ses libellés
+PARTS_CATEGORIES = {'Voiture': 0.55, 'Deux-roues motorisé': 0.16, 'Transport en commun': 0.03, 'Poids lourd': 0.06,
+                    'Vélo': 0.12, 'Autre': 0.04, 'Engin personnel motorisé': 0.025, 'Engin spécial': 0.005}
+
+# Part des véhicules au libellé absent de la table des classes
+PART_INCONNUS = 0.01
+
+# Loi du nombre de véhicules impliqués (1 à 6)
+PARTS_NB_VEHICULES = [0.27, 0.62, 0.08, 0.02, 0.007, 0.003]
+
+# Centre de Rennes et rayon approximatif de la rocade, en degrés
+CENTRE = (48.1119800, -1.6742900)
+RAYON_ROCADE = 0.045
+
+PART_PIETON = 0.15
+
+TAILLE_BLOC_GENERATION = 500_000
+
+# Réseau routier synthétique : longueur des tronçons (mètres) et part des carrefours (points)
+LONGUEURS_TRONCONS = (30, 150)
+PART_CARREFOURS = 0.2
+
+# Mètres par degré de latitude
+METRES_PAR_DEGRE = 111_320
+
+
+def _probabilites_libelles():
+    libelles, probabilites = [], []
+    for categorie, valeurs in CLASSES_VEHICULES.items():
+        libelles += valeurs
+        probabilites += [PARTS_CATEGORIES[categorie] * (1 - PART_INCONNUS) / len(valeurs)] * len(valeurs)
+    libelles.append('Véhicule non référencé')
+    probabilites.append(PART_INCONNUS)
+    probabilites = np.array(probabilites)
+    return np.array(libelles, dtype = object), probabilites / probabilites.sum()
+
+
+def tirer_coordonnees(n, rng):
+    """Latitudes et longitudes des accidents : centre-ville dense, anneau de la rocade et fond diffus."""
+    zone = rng.choice(3, n, p = [0.55, 0.3, 0.15])
+    angle = rng.uniform(0, 2 * np.pi, n)
+    rayon = np.select([zone == 0, zone == 1], [np.abs(rng.normal(0, 0.012, n)), RAYON_ROCADE + rng.normal(0, 0.002, n)],
+                      rng.uniform(0, 2.5 * RAYON_ROCADE, n))
+    return CENTRE[0] + rayon * np.sin(angle), CENTRE[1] + 1.5 * rayon * np.cos(angle)
+
+
+def generer_accidents(n, rng):
+    """DataFrame de n accidents synthétiques aux colonnes et formats du fichier source."""
+    # Dates : poids par mois et jour de la semaine
+    jours = pd.date_range(f"{ANNEES[0]}-01-01", f"{ANNEES[1]}-12-31", freq = 'D')
+    poids = np.array(POIDS_MOIS)[jours.month - 1] * np.array(POIDS_JOURS)[jours.dayofweek]
+    tirage = rng.choice(len(jours), n, p = poids / poids.sum())
+    heures = rng.choice(24, n, p = np.array(POIDS_HEURES) / sum(POIDS_HEURES))
+    minutes = rng.integers(0, 60, n)
+
+    accidents = pd.DataFrame({
+        'date': np.asarray(jours.strftime('%Y-%m-%d'), dtype = object)[tirage],
+        'heure': np.array([f'{h:02d}:{m:02d}' for h in range(24) for m in range(60)], dtype = object)[heures * 60 + minutes],
+        'jsem': np.array(JOURS_SEMAINE, dtype = object)[jours.dayofweek[tirage]],
+    })
+
+    # Véhicules : les colonnes au-delà du nombre de véhicules impliqués restent vides
+    libelles, probabilites = _probabilites_libelles()
+    nb_vehicules = rng.choice(len(PARTS_NB_VEHICULES), n, p = PARTS_NB_VEHICULES) + 1
+    velo = np.zeros(n, dtype = bool)
+    for i, colonne in enumerate(COLONNES_VEHICULES):
+        tires = rng.choice(len(libelles), n, p = probabilites)
+        presents = nb_vehicules > i
+        valeurs = libelles[tires]
+        valeurs[~presents] = None
+        accidents[colonne] = valeurs
+        velo |= presents & np.isin(valeurs, CLASSES_VEHICULES['Vélo'])
+
+    latitude, longitude = tirer_coordonnees(n, rng)
+    accidents['Geo Point'] = [f'{lat:.6f}, {lon:.6f}' for lat, lon in zip(latitude, longitude)]
+
+    accidents['velo'] = np.where(velo, 'Oui', 'Non')
+    accidents['pieton'] = np.where(rng.random(n) < PART_PIETON, 'Oui', 'Non')
+
+    # Gravité : tués rares, blessés hospitalisés et non hospitalisés
+    accidents['ntu'] = rng.binomial(1, 0.01, n)
+    accidents['nbh'] = rng.poisson(0.25, n)
+    accidents['nbnh'] = rng.poisson(0.9, n)
+    return accidents
+
+
+def ecrire_accidents(chemin, n, graine = 0, taille_bloc = TAILLE_BLOC_GENERATION):
+    """Écrit n accidents synthétiques dans un CSV ';', par blocs pour borner la mémoire. Le tirage dépend de la graine seule."""
+    rng = np.random.default_rng(graine)
+    for debut in range(0, n, taille_bloc):
+        bloc = generer_accidents(min(taille_bloc, n - debut), rng)
+        bloc.to_csv(chemin, sep = ';', index = False, header = debut == 0, mode = 'w' if debut == 0 else 'a')
+    return chemin
+
+
+def ecrire_reseau(chemin, n, graine = 0):
+    """Écrit un réseau routier synthétique de n entités GeoJSON (propriété 'nom') réparties uniformément sur la zone
+    des accidents : des tronçons droits (LineString) d'orientation et de longueur aléatoires, et des carrefours (Point)."""
+    rng = np.random.default_rng(graine)
+    latitude = CENTRE[0] + rng.uniform(-2.5, 2.5, n) * RAYON_ROCADE
+    longitude = CENTRE[1] + 1.5 * rng.uniform(-2.5, 2.5, n) * RAYON_ROCADE
+    angle = rng.uniform(0, np.pi, n)
+    demi_longueur = rng.uniform(*LONGUEURS_TRONCONS, n) / 2 / METRES_PAR_DEGRE
+    dlat = demi_longueur * np.sin(angle)
+    dlon = demi_longueur * np.cos(angle) / np.cos(np.radians(latitude))
+    carrefour = (rng.random(n) < PART_CARREFOURS).tolist()
+
+    # Coordonnées arrondies au micro-degré, comme celles des accidents
+    lon, lat, lon0, lat0, lon1, lat1 = (np.round(valeurs, 6).tolist() for valeurs in
+                                        (longitude, latitude, longitude - dlon, latitude - dlat, longitude + dlon, latitude + dlat))
+    entites = []
+    for i in range(n):
+        if carrefour[i]:
+            geometrie = {'type': 'Point', 'coordinates': [lon[i], lat[i]]}
+        else:
+            geometrie = {'type': 'LineString', 'coordinates': [[lon0[i], lat0[i]], [lon1[i], lat1[i]]]}
+        entites.append({'type': 'Feature', 'properties': {'nom': f"{'Carrefour' if carrefour[i] else 'Tronçon'} {i}"}, 'geometry': geometrie})
+    with open(chemin, 'w', encoding = 'utf-8') as f:
+        json.dump({'type': 'FeatureCollection', 'features': entites}, f, ensure_ascii = False, separators = (',', ':'))
+    return chemin
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Génère un fichier d'accidents synthétiques au format de accidents_corporels.csv")
+    parser.add_argument('lignes', type = int, help = "nombre d'accidents (de tronçons avec --reseau)")
+    parser.add_argument('fichier', help = "fichier CSV à écrire (GeoJSON avec --reseau)")
+    parser.add_argument('--graine', type = int, default = 0)
+    parser.add_argument('--reseau', action = 'store_true', help = "générer un réseau routier de tronçons et carrefours")
+    args = parser.parse_args()
+
+    debut = time.perf_counter()
+    if args.reseau:
+        ecrire_reseau(args.fichier, args.lignes, args.graine)
+        print(f"{args.lignes} tronçons et carrefours écrits dans {args.fichier} en {time.perf_counter() - debut:.1f} s")
+    else:
+        ecrire_accidents(args.fichier, args.lignes, args.graine)
+        print(f"{args.lignes} accidents écrits dans {args.fichier} en {time.perf_counter() - debut:.1f} s")
@@ -0,0 +1,45 @@
+import os
+
+import pandas as pd
+
+##### Tables des agrégats, exportées sans la pile graphique (mode --export-agregats) #####
+
+# Formats d'export et extension de leurs fichiers
+FORMATS = {'csv': '.csv', 'parquet': '.parquet', 'json': '.json'}
+
+
+def tables_agregats(agregats, points_chauds, risque = None):
+    """Tables exportées : accidents par type de véhicule, heatmap jour / heure, totaux par année et points chauds
+    de chaque carte (colonne 'usager' en tête), dans l'ordre des graphiques, puis le classement des tronçons par
+    score de risque si `risque` est donné (voir risque.classer_troncons)."""
+    vehicules = agregats['vehicules']
+    points = []
+    for usager, points_usager in points_chauds.items():
+        points_usager = points_usager.copy()
+        points_usager.insert(0, 'usager', usager)
+        points.append(points_usager)
+    tables = {
+        'vehicules': pd.DataFrame({'categorie': vehicules.index, 'nb': vehicules.to_numpy()}),
+        'heatmap': agregats['heatmap'],
+        'annees': agregats['annees'],
+        'points_chauds': pd.concat(points, ignore_index = True),
+    }
+    if risque is not None:
+        tables['risque'] = risque['troncons']
+    return tables
+
+
+def exporter_tables(tables, dossier, format = 'csv'):
+    """Écrit chaque table dans dossier/<nom>.<extension du format> et renvoie les chemins écrits."""
+    os.makedirs(dossier, exist_ok = True)
+    chemins = []
+    for nom, table in tables.items():
+        chemin = os.path.join(dossier, nom + FORMATS[format])
+        if format == 'csv':
+            table.to_csv(chemin, index = False)
+        elif format == 'parquet':
+            table.to_parquet(chemin, index = False)
+        else:
+            table.to_json(chemin, orient = 'records', force_ascii = False, indent = 1)
+        chemins.append(chemin)
+    return chemins
@@ -0,0 +1,190 @@
+import argparse
+import os
+import time
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:
+    pa = None
+
+##### Validation des lignes du CSV source et mise en quarantaine des lignes invalides #####
+
+# Période acceptée par défaut (années incluses) : du début des séries nationales à l'année en cours
+ANNEES = (2005, date.today().year)
+
+# Emprise acceptée par défaut pour les coordonnées : rectangles (latitude min, latitude max, longitude min,
+# longitude max) de la France métropolitaine (Corse comprise) et des départements d'outre-mer
+EMPRISE = (
+    (41.3, 51.2, -5.3, 9.7),
+    (15.8, 16.6, -61.9, -60.9),
+    (14.3, 14.9, -61.3, -60.8),
+    (2.1, 5.8, -54.7, -51.6),
+    (-21.4, -20.8, 55.2, 55.9),
+    (-13.1, -12.6, 44.9, 45.4),
+)
+
+# Codes des motifs de rejet, dans l'ordre où ils sont listés dans la colonne 'motif' de la quarantaine
+MOTIFS = {
+    'date': "date absente ou invalide (AAAA-MM-JJ attendu)",
+    'heure': "heure absente ou invalide (HH:MM attendu, heure de 0 à 23)",
+    'coordonnees': "Geo Point absent ou illisible (\"latitude, longitude\" attendu)",
+    'emprise': "coordonnées hors de l'emprise acceptée",
+    'annee': "année hors de la période acceptée",
+    'gravite': "ntu, nbh ou nbnh absent, non entier ou négatif",
+}
+
+# Geo Point valide : deux nombres décimaux séparés par une virgule
+MOTIF_COORDONNEES = r'^\s*(?P<latitude>[-+]?[0-9]*\.?[0-9]+)\s*,\s*(?P<longitude>[-+]?[0-9]*\.?[0-9]+)\s*$'
+
+# Ligne du fichier (en-tête compris, à partir de 1) de la première ligne de données
+PREMIERE_LIGNE = 2
+
+
+def _convertir(valeurs, conversion):
+    """Applique une conversion vectorisée à une colonne et renvoie un tableau NumPy. Sur une colonne catégorielle,
+    seules les modalités (quelques milliers de dates, 1440 heures...) sont converties, puis reportées par les codes."""
+    if isinstance(valeurs.dtype, pd.CategoricalDtype):
+        # Le code -1 (valeur absente) désigne la dernière case, manquante
+        modalites = conversion(pd.Series(list(valeurs.cat.categories.astype(str)) + [None], dtype = 'string'))
+        return np.asarray(modalites)[valeurs.cat.codes.to_numpy()]
+    return np.asarray(conversion(valeurs))
+
+
+def _nombres(valeurs):
+    return pd.to_numeric(valeurs, errors = 'coerce').to_numpy(dtype = np.float64, na_value = np.nan)
+
+
+def _coordonnees(valeurs):
+    """(latitude, longitude) d'une colonne Geo Point, NaN si la valeur est absente ou illisible. Avec pyarrow,
+    découpage et conversion sont faits en C++ ; sinon str.partition passe par Python ligne à ligne."""
+    if pa is None:
+        morceaux = valeurs.str.partition(',')
+        return _nombres(morceaux[0]), _nombres(morceaux[2])
+    champs = pc.extract_regex(pa.array(valeurs.array, type = pa.large_string()), MOTIF_COORDONNEES)
+    return tuple(pc.fill_null(pc.cast(pc.struct_field(champs, [i]), pa.float64()), np.nan).to_numpy(zero_copy_only = False) for i in (0, 1))
+
+
+def _dates(valeurs):
+    return pd.to_datetime(valeurs, format = '%Y-%m-%d', errors = 'coerce').to_numpy()
+
+
+def _heures(valeurs):
+    return pd.to_datetime(valeurs, format = '%H:%M', errors = 'coerce').dt.hour.to_numpy(dtype = np.float64, na_value = np.nan)
+
+
+def valider(brut, emprise = EMPRISE, annees = ANNEES):
+    """Convertit les colonnes d'un bloc lu avec le schéma de chargement et sépare les lignes invalides : les
+    coordonnées doivent tomber dans l'un des rectangles de `emprise`, l'année dans la période `annees`.
+
+    Chaque colonne est convertie en un seul passage vectorisé, les valeurs illisibles devenant manquantes au lieu
+    d'interrompre la lecture. Renvoie (accident, quarantaine) : les lignes valides avec les colonnes dérivées
+    (annee, mois, heure, latitude, longitude, gravités en entiers), et les lignes rejetées telles qu'elles ont été
+    lues, avec leur numéro de ligne dans le fichier et les codes de MOTIFS séparés par '|'. Le bloc brut est modifié.
+    """
+    date = _convertir(brut['date'], _dates)
+    annee = date.astype('datetime64[Y]').astype(np.int64) + 1970
+    heure = _convertir(brut['heure'], _heures)
+    latitude, longitude = _coordonnees(brut['Geo Point'])
+    gravites = {colonne: _convertir(brut[colonne], _nombres) for colonne in ('ntu', 'nbh', 'nbnh')}
+
+    lisibles = ~(np.isnan(latitude) | np.isnan(longitude))
+    with np.errstate(invalid = 'ignore'):
+        anomalies = {
+            'date': np.isnat(date),
+            'heure': np.isnan(heure),
+            'coordonnees': ~lisibles,
+            'emprise': lisibles & ~np.logical_or.reduce([(latitude >= lat_min) & (latitude <= lat_max) & (longitude >= lon_min) & (longitude <= lon_max)
+                                                         for lat_min, lat_max, lon_min, lon_max in emprise]),
+            'annee': ~np.isnat(date) & ((annee < annees[0]) | (annee > annees[1])),
+            'gravite': np.logical_or.reduce([~(valeurs >= 0) | (valeurs != np.floor(valeurs)) for valeurs in gravites.values()]),
+        }
+    rejet = np.logical_or.reduce(list(anomalies.values()))
+
+    # Quarantaine : lignes brutes, numéro de ligne et motifs (calculés sur les seules lignes rejetées)
+    masques = pd.DataFrame({code: masque[rejet] for code, masque in anomalies.items()})
+    quarantaine = brut.loc[rejet].copy()
+    motifs = (masques @ pd.Series([code + '|' for code in MOTIFS], index = list(MOTIFS))).str.rstrip('|') if rejet.any() else pd.Series([], dtype = object)
+    quarantaine.insert(0, 'motif', motifs.to_numpy())
+    quarantaine.insert(0, 'ligne', brut.index[rejet] + PREMIERE_LIGNE)
+
+    # Colonnes converties en place (comme le bloc lu n'est plus utilisé), sans copie quand tout est valide
+    garder = ~rejet
+    accident = brut
+    accident.pop('Geo Point')
+    if rejet.any():
+        accident = accident.loc[garder].copy()
+    accident['date'] = date[garder]
+    accident['annee'] = annee[garder].astype('int16')
+    accident['mois'] = (date[garder].astype('datetime64[M]').astype(np.int64) % 12 + 1).astype('int8')
+    accident['heure'] = heure[garder].astype('int8')
+    accident['latitude'] = latitude[garder].astype('float32')
+    accident['longitude'] = longitude[garder].astype('float32')
+    for colonne, valeurs in gravites.items():
+        accident[colonne] = valeurs[garder].astype('int16')
+    return accident, quarantaine
+
+
+def ajouter_options_validation(parser):
+    """Options de ligne de commande des bornes de validation (voir options_validation)."""
+    parser.add_argument('--annees-valides', type = int, nargs = 2, metavar = ('DEBUT', 'FIN'),
+                        help = f"années acceptées à la lecture du CSV, les autres lignes vont en quarantaine (par défaut {ANNEES[0]}-{ANNEES[1]})")
+    parser.add_argument('--emprise', type = float, nargs = 4, action = 'append', metavar = ('LAT_MIN', 'LAT_MAX', 'LON_MIN', 'LON_MAX'),
+                        help = "rectangle des coordonnées acceptées, répétable (par défaut France métropolitaine et outre-mer)")
+
+
+def options_validation(args):
+    """Bornes de validation des options (valeurs par défaut sinon), en arguments nommés des fonctions de lecture du CSV."""
+    return {'annees_valides': tuple(args.annees_valides or ANNEES),
+            'emprise': tuple(tuple(rectangle) for rectangle in args.emprise) if args.emprise else EMPRISE}
+
+
+def chemin_quarantaine(chemin):
+    """Fichier de quarantaine d'un CSV source, à côté de lui."""
+    return os.path.splitext(chemin)[0] + "_quarantaine.csv"
+
+
+def ecrire_quarantaine(chemin, quarantaine, ajouter = False):
+    """Écrit (ou complète, avec ajouter) la quarantaine d'un CSV source, au même format que lui plus 'ligne' et 'motif'.
+    Une lecture sans rejet supprime la quarantaine d'une lecture précédente."""
+    fichier = chemin_quarantaine(chemin)
+    if len(quarantaine) == 0:
+        if not ajouter and os.path.exists(fichier):
+            os.remove(fichier)
+        return None
+    entete = not (ajouter and os.path.exists(fichier))
+    quarantaine.to_csv(fichier, sep = ";", index = False, mode = 'w' if entete else 'a', header = entete)
+    return fichier
+
+
+def resumer(quarantaine):
+    """Nombre de lignes rejetées pour chaque motif (une ligne peut en avoir plusieurs)."""
+    codes = quarantaine['motif'].str.split('|').explode()
+    return codes.value_counts().reindex(list(MOTIFS), fill_value = 0)
+
+
+if __name__ == "__main__":
+    from chargement import lire_brut
+
+    parser = argparse.ArgumentParser(description = "Validation du CSV des accidents : lignes rejetées par motif et coût de la validation")
+    parser.add_argument('fichier')
+    ajouter_options_validation(parser)
+    args = parser.parse_args()
+    bornes = options_validation(args)
+
+    debut = time.perf_counter()
+    brut = lire_brut(args.fichier)
+    lecture = time.perf_counter() - debut
+    debut = time.perf_counter()
+    accident, quarantaine = valider(brut, bornes['emprise'], bornes['annees_valides'])
+    validation = time.perf_counter() - debut
+    print(f"{len(brut):,} lignes lues en {lecture:.2f} s, validées en {validation:.2f} s : "
+          f"{len(accident):,} gardées, {len(quarantaine):,} en quarantaine")
+    for code, nombre in resumer(quarantaine).items():
+        print(f"  {code:<12} {nombre:>9,}  {MOTIFS[code]}")
+    if len(quarantaine):
+        print(f"Quarantaine : {ecrire_quarantaine(args.fichier, quarantaine)}")
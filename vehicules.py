@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+##### Table de correspondance des classes de véhicule #####
+
+# Libellés bruts du fichier d'accidents regroupés par grande catégorie
+CLASSES_VEHICULES = {
+    'Voiture': ['VL', 'Véhicule de tourisme (VT)', 'Voiturette'],
+    'Deux-roues motorisé': ['cyclomoteur', 'Scooter <= 50 cm3', 'motocyclette > 125 cm3', 'motocyclette >50<=125 cm3', 'Scooter  > 50 <= 125 cm3', 'Scooter > 125 cm3', 'Moto ou sidecar > 125 cm3', 'Moto ou sidecar  > 50 <= 125 cm3', 'Cyclomoteur <=50 cm3', '3 RM > 125 cm3', '3 RM  > 50 <= 125 cm3'],
+    'Transport en commun': ['Autobus', 'Autocar'],
+    'Poids lourd': ['VU seul 1,5T < PTAC <=3,5T', 'PL seul PTAC > 7,5T', 'PL + remorque(s)', 'PL seul 3,5 < PTAC <=7,5t', 'Tracteur routier + semi-remorque', 'tracteur routier seul', 'PL > 3,5T + remorque'],
+    'Vélo': ['Bicyclette', 'Vélo par assistance électrique'],
+    'Autre': ['Tracteur agricole', 'Autre engin de déplacement personnel (EDP) sans moteur', 'Indéterminable', 'Autre véhicule'],
+    'Engin personnel motorisé': ['quad léger <=50 cm3', 'Nouvel engin de déplacement personnel (EDP) à moteur', 'voiturette / quad à moteur carrossé', 'quad lourd > 50 cm3'],
+    'Engin spécial': ['Engin spécial'],
+}
+
+# Catégorie attribuée à tout libellé absent de la table (ou manquant)
+NON_SPECIFIE = 'Non spécifié'
+
+COLONNES_VEHICULES = [f'vehicule{i}' for i in range(1, 7)]
+
+CATEGORIES = list(CLASSES_VEHICULES) + [NON_SPECIFIE]
+
+LIBELLES = [libelle for libelles in CLASSES_VEHICULES.values() for libelle in libelles]
+
+# Type catégoriel commun aux six colonnes : le code d'un libellé est sa position dans LIBELLES, -1 s'il est inconnu
+TYPE_LIBELLES = pd.CategoricalDtype(LIBELLES)
+
+# Code du libellé -> code de la catégorie. La dernière case est lue par le code -1 et renvoie 'Non spécifié'.
+TABLE_CLASSES = np.array([CATEGORIES.index(classe) for classe, libelles in CLASSES_VEHICULES.items() for _ in libelles]
+                         + [CATEGORIES.index(NON_SPECIFIE)], dtype=np.int8)
+
+
+def classer_vehicules(accident):
+    """Renvoie le tableau (n, 6) des codes de catégorie (indices dans CATEGORIES) de vehicule1..vehicule6."""
+    codes_libelles = np.column_stack([accident[col].astype(TYPE_LIBELLES).cat.codes.to_numpy() for col in COLONNES_VEHICULES])
+    return TABLE_CLASSES[codes_libelles]
+
+
+def compter_classes(codes):
+    """Nombre de véhicules par catégorie, dans l'ordre de première apparition en parcourant les colonnes une à une."""
+    codes_plats = codes.ravel(order='F')
+    comptes = np.bincount(codes_plats, minlength=len(CATEGORIES))
+    presentes, premiere_position = np.unique(codes_plats, return_index=True)
+    ordre = presentes[np.argsort(premiere_position)]
+    return pd.Series(comptes[ordre], index=np.array(CATEGORIES, dtype=object)[ordre])